@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the Flask API.
+
+Starts a local upstream stub (bench/stub_server.py) and the app
+(bench/serve_app.py) as subprocesses, then measures throughput and
+p50/p95/p99 latency per endpoint at several concurrency levels and dive-log
+sizes. Nothing leaves the machine: Stormglass, Open-Meteo and Windguru are
+all served by the stub with a configurable latency.
+
+Results are written as JSON so runs can be compared between releases.
+
+Examples:
+    python bench/run_bench.py
+    python bench/run_bench.py --latency-ms 120 --concurrency 1,8,32 --dive-sizes 1000,50000
+    python bench/run_bench.py --endpoints predict,dives_get --requests 500 --out bench/results/v2.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+FEATURES = ["swell_height", "swell_period", "wind_speed", "wind_dir", "tide_height", "turbidity", "chlorophyll"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def train_bench_model(model_dir: str) -> None:
+    """Train a model on synthetic data so the benchmark does not depend on local artifacts."""
+    import data_generator
+    import train_model
+
+    df = data_generator.generate_data(2000, seed=42)
+    if "chlorophyll" not in df.columns:
+        df["chlorophyll"] = np.random.default_rng(42).uniform(0.1, 3.0, len(df))
+    csv_path = os.path.join(model_dir, "bench_training.csv")
+    df.to_csv(csv_path, index=False)
+    train_model.train(csv_path, os.path.join(model_dir, "dive_visibility_model.pkl"), features=FEATURES)
+
+
+def site_coords(n_sites: int):
+    """Distinct coordinates on a small grid; more sites -> more upstream cache misses."""
+    return [(round(49.0 + 0.05 * (i // 10), 2), round(-2.5 + 0.05 * (i % 10), 2)) for i in range(n_sites)]
+
+
+def endpoint_specs(stub_url: str, sites):
+    """name -> (method, path, payload factory taking the request index)."""
+    def at(i):
+        lat, lon = sites[i % len(sites)]
+        return {"lat": lat, "lon": lon, "region": "GLOBAL"}
+
+    return {
+        "predict": ("POST", "/predict", at),
+        "predict_stormglass": ("POST", "/predict_stormglass", at),
+        "predict_windguru": ("POST", "/predict_windguru", lambda i: {"url": f"{stub_url}/windguru.json"}),
+        "weather": ("POST", "/weather", at),
+        "dives_get": ("GET", "/dives", None),
+        "dives_post": ("POST", "/dives", lambda i: {**at(i), "visibility": 5 + i % 10, "notes": "bench"}),
+    }
+
+
+def run_load(base_url, method, path, payload_fn, n_requests, concurrency, warmup=5):
+    """Fire n_requests with `concurrency` worker threads; returns latencies (s), errors, wall time."""
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        kwargs = {"timeout": 60}
+        if payload_fn is not None:
+            kwargs["json"] = payload_fn(i)
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, base_url + path, **kwargs)
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    for i in range(warmup):
+        one(i)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(warmup, warmup + n_requests)))
+    wall = time.perf_counter() - wall_start
+    latencies = np.array([r[0] for r in results])
+    errors = sum(1 for r in results if not r[1])
+    return latencies, errors, wall
+
+
+def summarize(latencies, errors, wall):
+    ms = latencies * 1000.0
+    return {
+        "requests": int(len(latencies)),
+        "errors": int(errors),
+        "wall_s": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark the visibility API against a local upstream stub")
+    p.add_argument("--latency-ms", type=float, default=50.0, help="Stub upstream latency per call")
+    p.add_argument("--jitter-ms", type=float, default=0.0, help="Extra uniform random stub latency")
+    p.add_argument("--concurrency", default="1,4,16", help="Comma-separated client concurrency levels")
+    p.add_argument("--dive-sizes", default="100,10000", help="Comma-separated dive-log sizes to seed")
+    p.add_argument("--requests", type=int, default=200, help="Requests per endpoint and concurrency level")
+    p.add_argument("--sites", type=int, default=20, help="Distinct coordinates cycled through by location endpoints")
+    p.add_argument("--endpoints", default="predict,predict_stormglass,predict_windguru,dives_get,dives_post",
+                   help="Comma-separated subset of: predict, predict_stormglass, predict_windguru, weather, dives_get, dives_post")
+    p.add_argument("--out", default=None, help="JSON output path (default bench/results/bench-<timestamp>.json)")
+    p.add_argument("--keep-workdir", action="store_true", help="Do not delete the temporary working directory")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    concurrencies = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    dive_sizes = [int(n) for n in args.dive_sizes.split(",") if n.strip()]
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="visibility-bench-")
+    model_dir = os.path.join(workdir, "model")
+    os.makedirs(model_dir)
+    print(f"Working directory: {workdir}")
+    train_bench_model(model_dir)
+
+    stub_port = _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "stub_server.py"), "--port", str(stub_port),
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms)],
+        stdout=subprocess.DEVNULL,
+    )
+    results = []
+    try:
+        _wait_for(f"{stub_url}/windguru.json")
+        sites = site_coords(args.sites)
+        specs = endpoint_specs(stub_url, sites)
+        unknown = [e for e in endpoints if e not in specs]
+        if unknown:
+            raise SystemExit(f"Unknown endpoints: {unknown}")
+
+        for dive_size in dive_sizes:
+            app_port = _free_port()
+            base_url = f"http://127.0.0.1:{app_port}"
+            env = {
+                **os.environ,
+                "VISIBILITY_DB_PATH": os.path.join(workdir, f"bench_{dive_size}.db"),
+                "VISIBILITY_MODEL_DIR": model_dir,
+                "STORMGLASS_API_KEY": "bench",
+                "STORMGLASS_API_ROOT": f"{stub_url}/v2",
+                "STORMGLASS_CACHE_DIR": os.path.join(workdir, f"sg_cache_{dive_size}"),
+                "OPEN_METEO_URL": f"{stub_url}/v1/forecast",
+                "WINDGURU_JSON_URL": f"{stub_url}/windguru.json",
+                # POST /dives would otherwise schedule model refits mid-run
+                "RETRAIN_ON_DIVES": "false",
+                # Cache warming and heatmap refreshes would compete with the measured requests
+                "BACKGROUND_JOBS": "false",
+            }
+            app_proc = subprocess.Popen(
+                [sys.executable, os.path.join(BENCH_DIR, "serve_app.py"), "--port", str(app_port),
+                 "--seed-dives", str(dive_size)],
+                env=env,
+                cwd=workdir,
+                stdout=subprocess.DEVNULL,
+            )
+            try:
+                _wait_for(f"{base_url}/dives", timeout=120)
+                for name in endpoints:
+                    method, path, payload_fn = specs[name]
+                    for concurrency in concurrencies:
+                        latencies, errors, wall = run_load(base_url, method, path, payload_fn, args.requests, concurrency)
+                        row = {
+                            "endpoint": name,
+                            "method": method,
+                            "path": path,
+                            "concurrency": concurrency,
+                            "dive_log_size": dive_size,
+                            **summarize(latencies, errors, wall),
+                        }
+                        results.append(row)
+                        print(
+                            f"{name:20s} dives={dive_size:<7d} c={concurrency:<3d} "
+                            f"{row['throughput_rps']:>9} rps  p50={row['p50_ms']:>9.2f}ms  "
+                            f"p95={row['p95_ms']:>9.2f}ms  p99={row['p99_ms']:>9.2f}ms  errors={errors}"
+                        )
+            finally:
+                app_proc.terminate()
+                app_proc.wait(timeout=30)
+    finally:
+        stub.terminate()
+        stub.wait(timeout=30)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out_path = args.out or os.path.join(
+        BENCH_DIR, "results", f"bench-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub_latency_ms": args.latency_ms,
+            "stub_jitter_ms": args.jitter_ms,
+            "requests_per_level": args.requests,
+            "sites": args.sites,
+            "concurrency": concurrencies,
+            "dive_sizes": dive_sizes,
+        },
+        "results": results,
+    }
+    with open(out_path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {out_path}")
+    return 0 if all(r["errors"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Run the Flask app on a threaded WSGI server for benchmarks (no debug reloader),
+optionally seeding the dive log with synthetic dives first.
+
+Configuration comes from the environment (VISIBILITY_DB_PATH, VISIBILITY_MODEL_DIR,
+STORMGLASS_API_ROOT, ...); see bench/run_bench.py.
+
+Run:
+    python bench/serve_app.py --port 5050 --seed-dives 10000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def seed_dives(n, seed=0):
+    """Insert n synthetic dives around the Channel Islands in one transaction."""
+    import database_client
+
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    dives = []
+    for _ in range(n):
+        when = start + timedelta(minutes=rng.randrange(0, 6 * 365 * 24 * 60))
+        dives.append({
+            "id": str(uuid.uuid4()),
+            "lat": round(rng.uniform(48.5, 50.5), 5),
+            "lon": round(rng.uniform(-3.5, -1.0), 5),
+            "date": when.isoformat(),
+            "depth": round(rng.uniform(2, 30), 1),
+            "notes": "synthetic",
+            "tide_height": round(rng.uniform(-2, 2), 2),
+            "breath_hold_time": rng.randint(20, 180),
+            "visibility": round(rng.uniform(1, 15), 1),
+            "water_temp": round(rng.uniform(8, 20), 1),
+            "outside_temp": round(rng.uniform(5, 25), 1),
+            "created_at": when.isoformat(),
+        })
+    database_client.insert_dives(dives)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Serve the app for benchmarking")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=5050)
+    p.add_argument("--seed-dives", type=int, default=0)
+    args = p.parse_args()
+
+    if args.seed_dives:
+        seed_dives(args.seed_dives)
+
+    from werkzeug.serving import make_server
+    # Per-request access logs would dominate the measurement
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    import app as visibility_app
+
+    server = make_server(args.host, args.port, visibility_app.app, threaded=True)
+    print(f"App listening on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the upstream APIs used by the app, for offline benchmarks.
+
+Serves:
+    GET /v2/weather/point   Stormglass weather (one hour per hour in [start, end])
+    GET /v2/bio/point       Stormglass bio (chlorophyll)
+    GET /v1/forecast        Open-Meteo current weather
+    GET /windguru.json      Windguru-style JSON
+
+Every response is delayed by --latency-ms (plus optional uniform --jitter-ms)
+to mimic network round trips. Values are deterministic per lat/lon.
+
+Run:
+    python bench/stub_server.py --port 8765 --latency-ms 80
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _parse_time(value, default):
+    if not value:
+        return default
+    try:
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except ValueError:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _hours(query, fields):
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = _parse_time(query.get("start", [None])[0], now).replace(minute=0, second=0, microsecond=0)
+    end = _parse_time(query.get("end", [None])[0], start)
+    seed = f"{query.get('lat', ['0'])[0]},{query.get('lng', ['0'])[0]}"
+    rng = random.Random(seed)
+    hours = []
+    t = start
+    while t <= end and len(hours) < 24 * 10 + 1:
+        hours.append({"time": t.isoformat(), **{k: {"sg": round(fn(rng), 3)} for k, fn in fields.items()}})
+        t += timedelta(hours=1)
+    return hours
+
+
+WEATHER_FIELDS = {
+    "airTemperature": lambda r: r.uniform(5, 25),
+    "cloudCover": lambda r: r.uniform(0, 100),
+    "rain": lambda r: r.uniform(0, 2),
+    "swellDirection": lambda r: r.uniform(0, 360),
+    "swellHeight": lambda r: r.uniform(0, 2.5),
+    "swellPeriod": lambda r: r.uniform(5, 14),
+    "waterTemperature": lambda r: r.uniform(8, 20),
+    "waveDirection": lambda r: r.uniform(0, 360),
+    "waveHeight": lambda r: r.uniform(0, 3),
+    "wavePeriod": lambda r: r.uniform(3, 12),
+    "windSpeed": lambda r: r.uniform(0, 15),
+    "windDirection": lambda r: r.uniform(0, 360),
+    "seaLevel": lambda r: r.uniform(-2, 2),
+}
+BIO_FIELDS = {"chlorophyll": lambda r: r.uniform(0.1, 3.0)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency_s = 0.0
+    jitter_s = 0.0
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real providers
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency_s + random.uniform(0, self.jitter_s))
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/v2/weather/point":
+            self._send_json({"hours": _hours(query, WEATHER_FIELDS), "meta": {"source": "stub"}})
+        elif url.path == "/v2/bio/point":
+            self._send_json({"hours": _hours(query, BIO_FIELDS), "meta": {"source": "stub"}})
+        elif url.path == "/v1/forecast":
+            self._send_json({"current": {
+                "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M"),
+                "temperature_2m": 14.2,
+                "wind_speed_10m": 11.5,
+                "wind_direction_10m": 225,
+            }})
+        elif url.path == "/windguru.json":
+            self._send_json({
+                "wind_speed_knots": 12,
+                "wind_dir_deg": 220,
+                "swell_height_m": 1.1,
+                "swell_period_s": 9,
+                "tide_height_m": 0.3,
+                "turbidity": 1.2,
+            })
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+def make_server(host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0):
+    """Create (but do not start) a stub server; port 0 picks a free port."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency_s": latency_ms / 1000.0,
+        "jitter_s": jitter_ms / 1000.0,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Local stub for Stormglass/Open-Meteo/Windguru")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    args = p.parse_args()
+    server = make_server(args.host, args.port, args.latency_ms, args.jitter_ms)
+    print(f"Stub upstream listening on http://{args.host}:{server.server_port} (latency {args.latency_ms} ms)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,30 +1,14 @@
-import sqlite3
-from config import DB_PATH
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
+try:
+    from . import database_client
+except ImportError:
+    import database_client
 
-conn = sqlite3.connect("visibility.db")
-cursor = conn.cursor()
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS sites (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    site_name TEXT UNIQUE,
-    lat REAL,
-    lon REAL
-);
-""")
-
-# Insert known sites
+# Insert known sites into the app database (sites table is created by database_client)
 sites = [
     ("Bouley Bay", 49.2300, -2.0500),
     ("St Catherine", 49.2500, -2.0200)
 ]
 
-for site in sites:
-    cursor.execute("INSERT OR IGNORE INTO sites (site_name, lat, lon) VALUES (?, ?, ?)", site)
-
-conn.commit()
-conn.close()
+database_client.add_sites(sites)
 
-print("Site coordinates added.")
\ No newline at end of file
+print("Site coordinates added.")
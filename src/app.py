@@ -1,5 +1,5 @@
 import sqlite3
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template
 from dotenv import load_dotenv
 
 load_dotenv()  # take environment variables from .env.
@@ -7,13 +7,15 @@ load_dotenv()  # take environment variables from .env.
 
 
 
+import gzip
+import hashlib
 import json
+import time
 import uuid
-from datetime import datetime
-import joblib
+from datetime import datetime, timedelta, timezone
 import os
 import numpy as np
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 try:
     from . import windguru_client  # when running as a package
 except Exception:
@@ -30,12 +32,44 @@ try:
     from . import database_client
 except Exception:
     import database_client
+try:
+    from . import model_registry
+except Exception:
+    import model_registry
+try:
+    from . import metrics
+except Exception:
+    import metrics
+try:
+    from . import features
+except ImportError:
+    import features
+try:
+    from . import dive_clusters
+except Exception:
+    import dive_clusters
+try:
+    from . import heatmap
+except Exception:
+    import heatmap
+try:
+    from . import background
+except Exception:
+    import background
+try:
+    from . import cache_warmer
+except Exception:
+    import cache_warmer
+try:
+    from . import retrainer
+except Exception:
+    import retrainer
 
 
 
 
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-MODEL_DIR = os.path.join(os.path.dirname(APP_ROOT), "model")
+MODEL_DIR = os.environ.get("VISIBILITY_MODEL_DIR") or os.path.join(os.path.dirname(APP_ROOT), "model")
 # Use dive visibility model (underwater) instead of atmospheric visibility
 GLOBAL_MODEL_PATH = os.path.join(MODEL_DIR, "dive_visibility_model.pkl")
 REGIONAL_MODELS = {
@@ -43,7 +77,32 @@ REGIONAL_MODELS = {
     "UK": os.path.join(MODEL_DIR, "dive_visibility_model.pkl"),
 }
 
-# Simple storage for dives
+# Response labels of features.FEATURES (model input order); wind speed is m/s
+FEATURE_NAMES = [
+    "swell_height",
+    "swell_period",
+    "wind_speed_ms",
+    "wind_dir",
+    "tide_height",
+    "turbidity",
+    "chlorophyll",
+]
+# Upper bound on rows/points accepted by /predict/batch
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "5000"))
+# Page size bounds for GET /dives?limit=...
+MAX_DIVES_PAGE = int(os.environ.get("MAX_DIVES_PAGE", "1000"))
+# JSON bodies smaller than this are not worth gzipping
+GZIP_MIN_BYTES = 1024
+# Wall-clock budget (seconds) for the upstream lookups of a single request
+UPSTREAM_DEADLINE_S = float(os.environ.get("UPSTREAM_DEADLINE", "12"))
+
+# Worker threads for concurrent upstream fetches (weather/tide + bio, batch locations)
+upstream_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("UPSTREAM_WORKERS", "16")),
+    thread_name_prefix="upstream",
+)
+
+# Legacy JSON dive log (migrated into the SQLite dive store on startup)
 DATA_DIR = os.path.join(os.path.dirname(APP_ROOT), "data")
 DIVE_FILE = os.path.join(DATA_DIR, "dives.json")
 
@@ -64,37 +123,43 @@ app = Flask(
 )
 
 
-def _ensure_data_file():
-    try:
-        os.makedirs(DATA_DIR, exist_ok=True)
-        if not os.path.exists(DIVE_FILE):
-            with open(DIVE_FILE, "w", encoding="utf-8") as f:
-                json.dump([], f)
-    except Exception:
-        pass
+# One-shot import of the legacy JSON dive log into the SQLite dive store
+try:
+    database_client.migrate_dives_from_json(DIVE_FILE)
+except Exception as e:
+    print(f"Warning: Could not migrate {DIVE_FILE} to the dive store: {e}")
+
+# Models are loaded lazily on first use, shared between regions that point at the
+# same artifact, and hot-reloaded when the files change on disk.
+models = model_registry.ModelRegistry(
+    {"GLOBAL": GLOBAL_MODEL_PATH, **REGIONAL_MODELS},
+    check_interval=float(os.environ.get("MODEL_RELOAD_INTERVAL", "10")),
+)
 
 
-def load_dives():
-    _ensure_data_file()
-    try:
-        with open(DIVE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return []
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
 
 
-def save_dives(dives):
-    _ensure_data_file()
-    with open(DIVE_FILE, "w", encoding="utf-8") as f:
-        json.dump(dives, f, ensure_ascii=False, indent=2)
+@app.after_request
+def _record_request_latency(response):
+    start = getattr(g, "request_start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            endpoint=endpoint,
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
 
-# Load available models at startup (global + known regional)
-models: dict[str, object] = {}
-if os.path.exists(GLOBAL_MODEL_PATH):
-    models["GLOBAL"] = joblib.load(GLOBAL_MODEL_PATH)
-for region, path in REGIONAL_MODELS.items():
-    if os.path.exists(path):
-        models[region.upper()] = joblib.load(path)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus text exposition of request, stage, upstream and cache metrics
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/")
@@ -121,7 +186,7 @@ def dives_page():
 def predict():
     data = request.get_json() or {}
     region = str(data.get("region", "GLOBAL")).upper()
-    model = models.get(region) or models.get("GLOBAL")
+    model = models.get(region)
     if model is None:
         return jsonify({"error": "Model not found. Train the model first: see README."}), 500
     
@@ -136,13 +201,19 @@ def predict():
         try:
             lat = float(lat)
             lon = float(lon)
-            # Fetch Stormglass weather/tide data for this location
-            raw_sg_data = stormglass_client.get_weather_and_tide(lat, lon)
+            # Fetch Stormglass weather/tide and bio/chlorophyll data concurrently
+            deadline = time.monotonic() + UPSTREAM_DEADLINE_S
+            weather_future = upstream_pool.submit(
+                metrics.timed_call, "/predict", "stormglass_weather", stormglass_client.get_weather_and_tide, lat, lon
+            )
+            bio_future = upstream_pool.submit(
+                metrics.timed_call, "/predict", "stormglass_bio", stormglass_client.get_bio_data, lat, lon
+            )
+            raw_sg_data = weather_future.result(timeout=max(0.0, deadline - time.monotonic()))
             stormglass_data = raw_sg_data["hours"][0]
             
-            # Try to fetch bio/chlorophyll data
             try:
-                bio_data = stormglass_client.get_bio_data(lat, lon)
+                bio_data = bio_future.result(timeout=max(0.0, deadline - time.monotonic()))
                 if bio_data and bio_data.get("hours"):
                     chlorophyll_val = bio_data["hours"][0].get("chlorophyll", {}).get("sg")
                     if chlorophyll_val is not None:
@@ -150,90 +221,41 @@ def predict():
                         # Update database with chlorophyll value
                         timestamp = stormglass_data.get("time")
                         if timestamp:
-                            database_client.update_chlorophyll(lat, lon, timestamp, chlorophyll)
+                            with metrics.STAGE_SECONDS.time(endpoint="/predict", stage="update_chlorophyll"):
+                                database_client.update_chlorophyll(lat, lon, timestamp, chlorophyll)
+            except FutureTimeoutError:
+                print("Warning: Could not fetch chlorophyll data: timed out")
             except Exception as e:
                 print(f"Warning: Could not fetch chlorophyll data: {e}")
             
             data_source = "hybrid"
+        except FutureTimeoutError:
+            print("Warning: Could not fetch Stormglass data: timed out")
         except Exception as e:
             # If Stormglass fetch fails, continue with manual input only
             print(f"Warning: Could not fetch Stormglass data: {e}")
             pass
     
-    try:
-        # Convert wind speed provided in knots to meters/second for the model
-        KNOT_TO_MS = 0.514444
-        
-        # If Stormglass data available, use it as defaults, allow user overrides
-        if stormglass_data:
-            swell_height = float(data.get("swell_height") or stormglass_data["swellHeight"]["sg"])
-            swell_period = float(data.get("swell_period") or stormglass_data["swellPeriod"]["sg"])
-            
-            # Wind speed: Stormglass provides in m/s, user provides in knots
-            if data.get("wind_speed"):
-                wind_speed_knots = float(data["wind_speed"])
-                wind_speed_ms = wind_speed_knots * KNOT_TO_MS
-            else:
-                wind_speed_ms = float(stormglass_data["windSpeed"]["sg"])
-            
-            wind_dir = float(data.get("wind_dir") or stormglass_data["windDirection"]["sg"])
-            tide_height = float(data.get("tide_height") or stormglass_data["seaLevel"]["sg"])
-            
-            # Chlorophyll: use user value or fetched value
-            if data.get("chlorophyll"):
-                chlorophyll_val = float(data["chlorophyll"])
-            elif chlorophyll is not None:
-                chlorophyll_val = chlorophyll
-            elif stormglass_data.get("chlorophyll", {}).get("sg") is not None:
-                chlorophyll_val = float(stormglass_data["chlorophyll"]["sg"])
-            else:
-                chlorophyll_val = 0.5  # Default moderate chlorophyll level (mg/m³)
-            
-            # Turbidity: use user value or estimate from conditions
-            if data.get("turbidity"):
-                turbidity = float(data["turbidity"])
-            else:
-                turbidity = 1.0 + 0.15 * max(0, wind_speed_ms - 5.0) + (1 if tide_height < 0 else 0)
-                turbidity = min(10.0, max(0.2, turbidity))
-        else:
-            # Pure manual input
-            wind_speed_knots = float(data["wind_speed"])
-            wind_speed_ms = wind_speed_knots * KNOT_TO_MS
-            swell_height = float(data["swell_height"])
-            swell_period = float(data["swell_period"])
-            wind_dir = float(data.get("wind_dir", 0.0))
-            tide_height = float(data["tide_height"])
-            turbidity = float(data.get("turbidity", 1.0))
-            chlorophyll_val = float(data.get("chlorophyll", 0.5))
-        
-        features = [
-            swell_height,
-            swell_period,
-            wind_speed_ms,
-            wind_dir,
-            tide_height,
-            turbidity,
-            chlorophyll_val,
-        ]
-    except Exception as e:
-        return jsonify({"error": f"Invalid input: {e}"}), 400
-
-    X = np.array(features).reshape(1, -1)
-    pred = model.predict(X)[0]
+    features_start = time.perf_counter()
+    # User values win over fetched chlorophyll, which wins over the Stormglass hour
+    columns = features.manual_columns([data])
+    if stormglass_data:
+        base = features.stormglass_columns([stormglass_data])
+        if chlorophyll is not None:
+            base["chlorophyll"] = np.array([chlorophyll])
+        columns = features.overlay(base, columns)
+    X, errors = features.build_matrix(columns, 1)
+    if errors[0]:
+        return jsonify({"error": f"Invalid input: {errors[0]}"}), 400
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - features_start, endpoint="/predict", stage="features")
+    with metrics.STAGE_SECONDS.time(endpoint="/predict", stage="model_predict"):
+        pred = model.predict(X)[0]
     
     response = {
         "visibility_m": float(pred),
         "region": region,
         "data_source": data_source,
-        "features": {
-            "swell_height": swell_height,
-            "swell_period": swell_period,
-            "wind_speed_ms": wind_speed_ms,
-            "wind_dir": wind_dir,
-            "tide_height": tide_height,
-            "turbidity": turbidity,
-            "chlorophyll": chlorophyll_val,
-        }
+        "features": _feature_dict(X[0]),
     }
     
     return jsonify(response)
@@ -246,7 +268,7 @@ def predict_windguru():
     payload = request.get_json() or {}
     url = payload.get("url") or os.environ.get("WINDGURU_JSON_URL")
     region = str(payload.get("region", "GLOBAL")).upper()
-    model = models.get(region) or models.get("GLOBAL")
+    model = models.get(region)
     if model is None:
         return jsonify({"error": "Model not found. Train the model first: see README."}), 500
     raw = None
@@ -262,46 +284,21 @@ def predict_windguru():
         if not url:
             return jsonify({"error": "Missing 'url' to fetch Windguru JSON. Provide in request or set WINDGURU_JSON_URL env."}), 400
         try:
-            raw = windguru_client.fetch_windguru_json(url)
+            with metrics.STAGE_SECONDS.time(endpoint="/predict_windguru", stage="windguru_fetch"):
+                raw = windguru_client.fetch_windguru_json(url)
             mapped = windguru_client.map_features(raw)
         except Exception as e:
             return jsonify({"error": f"Failed to fetch/map Windguru data: {e}"}), 502
 
-    # Fill defaults if missing
-    def dval(x: Optional[float], default: float) -> float:
-        return float(default if x is None else x)
-
-    swell_height = dval(mapped.get("swell_height"), 1.0)
-    swell_period = dval(mapped.get("swell_period"), 10.0)
-    wind_speed = dval(mapped.get("wind_speed"), 5.0)  # already m/s
-    wind_dir = dval(mapped.get("wind_dir"), 180.0)
-    tide_height = dval(mapped.get("tide_height"), 0.0)
-    turbidity = dval(mapped.get("turbidity"), 1.0)
-    chlorophyll = dval(mapped.get("chlorophyll"), 0.5)
-
-    X = np.array([[
-        swell_height,
-        swell_period,
-        wind_speed,
-        wind_dir,
-        tide_height,
-        turbidity,
-        chlorophyll,
-    ]])
-    pred = model.predict(X)[0]
+    # Every Windguru field is optional: defaults and estimated turbidity fill the gaps
+    X, _ = features.build_matrix(features.windguru_columns([mapped]), 1, required=())
+    with metrics.STAGE_SECONDS.time(endpoint="/predict_windguru", stage="model_predict"):
+        pred = model.predict(X)[0]
     return jsonify({
         "visibility_m": float(pred),
         "region": region,
         "source": "windguru",
-        "features": {
-            "swell_height": swell_height,
-            "swell_period": swell_period,
-            "wind_speed_ms": wind_speed,
-            "wind_dir": wind_dir,
-            "tide_height": tide_height,
-            "turbidity": turbidity,
-            "chlorophyll": chlorophyll,
-        },
+        "features": _feature_dict(X[0]),
         "raw": raw,
     })
 
@@ -344,55 +341,27 @@ def predict_stormglass():
         return jsonify({"error": "Missing or invalid 'lat'/'lon'"}), 400
 
     region = str(payload.get("region", "GLOBAL")).upper()
-    model = models.get(region) or models.get("GLOBAL")
+    model = models.get(region)
     if model is None:
         return jsonify({"error": "Model not found. Train the model first: see README."}), 500
 
     try:
-        raw_data = stormglass_client.get_weather_and_tide(lat, lon)
+        with metrics.STAGE_SECONDS.time(endpoint="/predict_stormglass", stage="stormglass_weather"):
+            raw_data = stormglass_client.get_weather_and_tide(lat, lon)
         # First hour of data
         sg_data = raw_data["hours"][0]
 
-        # Stormglass provides wind speed in m/s, which is what the model expects
-        wind_speed_ms = float(sg_data["windSpeed"]["sg"])
-        swell_height = float(sg_data["swellHeight"]["sg"])
-        swell_period = float(sg_data["swellPeriod"]["sg"])
-        wind_dir = float(sg_data["windDirection"]["sg"])
-        # seaLevel is tide height
-        tide_height = float(sg_data["seaLevel"]["sg"])
-        
-        # Estimate turbidity from wind and tide
-        turbidity = 1.0 + 0.15 * max(0, wind_speed_ms - 5.0) + (1 if tide_height < 0 else 0)
-        turbidity = min(10.0, max(0.2, turbidity))
-        
-        # Use default chlorophyll if not available
-        chlorophyll = 0.5
-
-        features = [
-            swell_height,
-            swell_period,
-            wind_speed_ms,
-            wind_dir,
-            tide_height,
-            turbidity,
-            chlorophyll,
-        ]
-        X = np.array(features).reshape(1, -1)
-        prediction = model.predict(X)[0]
+        X, errors = features.build_matrix(features.stormglass_columns([sg_data]), 1)
+        if errors[0]:
+            raise ValueError(errors[0])
+        with metrics.STAGE_SECONDS.time(endpoint="/predict_stormglass", stage="model_predict"):
+            prediction = model.predict(X)[0]
 
         return jsonify({
             "visibility_m": float(prediction),
             "region": region,
             "source": "stormglass",
-            "features": {
-                "swell_height": swell_height,
-                "swell_period": swell_period,
-                "wind_speed_ms": wind_speed_ms,
-                "wind_dir": wind_dir,
-                "tide_height": tide_height,
-                "turbidity": turbidity,
-                "chlorophyll": chlorophyll,
-            },
+            "features": _feature_dict(X[0]),
             "raw": sg_data,
         })
 
@@ -400,10 +369,488 @@ def predict_stormglass():
         return jsonify({"error": f"Failed to get prediction from Stormglass: {e}"}), 502
 
 
+def _parse_time(value):
+    """Parse an ISO-8601 timestamp (Stormglass or user supplied) to an aware datetime."""
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _conditions_at(lat, lon, times, now_hour):
+    """
+    Stormglass hours for one location at each of `times` (UTC hours; None is
+    the current hour): current conditions, the forecast window for later
+    hours and stored history for earlier ones. Returns ({time: hour},
+    {time: error message}).
+    """
+    found, failed = {}, {}
+    if None in times:
+        try:
+            hours = stormglass_client.get_weather_and_tide(lat, lon)["hours"]
+            if not hours:
+                raise ValueError("No hourly data returned")
+            found[None] = hours[0]
+        except Exception as e:
+            failed[None] = f"Failed to fetch Stormglass data: {e}"
+    future = [t for t in times if t is not None and t > now_hour]
+    if future:
+        days = -(-(max(future) - now_hour) // timedelta(days=1))
+        try:
+            window = stormglass_client.get_forecast(lat, lon, days)["hours"]
+            by_hour = {_parse_time(h["time"]): h for h in window if h.get("time")}
+            for t in future:
+                if t in by_hour:
+                    found[t] = by_hour[t]
+                else:
+                    failed[t] = f"No forecast conditions for {t.isoformat()}"
+        except Exception as e:
+            for t in future:
+                failed[t] = f"Failed to fetch Stormglass forecast: {e}"
+    for t in times:
+        if t is not None and t < now_hour:
+            stored = stormglass_client.get_stored_hour(lat, lon, t)
+            if stored:
+                found[t] = stored["hours"][0]
+            else:
+                failed[t] = f"No stored conditions for {t.isoformat()}"
+    return found, failed
+
+
+def _feature_dict(row):
+    return dict(zip(FEATURE_NAMES, (float(v) for v in row)))
+
+
+def _stormglass_hours_matrix(hours):
+    """Feature matrix and times of the Stormglass hours with complete conditions
+    (hours missing required values are skipped rather than failing a window)."""
+    X, errors = features.build_matrix(features.stormglass_columns(hours), len(hours))
+    keep = [e is None for e in errors]
+    return X[keep], [h.get("time") for h, ok in zip(hours, keep) if ok]
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    # Accept JSON: { "region": "UK", "rows": [ {swell_height, swell_period, wind_speed, ...}, ... ] }
+    # Or by location: { "region": "UK", "points": [ {"lat": .., "lon": .., "time": "..."}, ... ] }
+    # All valid rows are scored with a single model.predict call.
+    payload = request.get_json() or {}
+    region = str(payload.get("region", "GLOBAL")).upper()
+    model = models.get(region)
+    if model is None:
+        return jsonify({"error": "Model not found. Train the model first: see README."}), 500
+
+    rows = payload.get("rows")
+    points = payload.get("points")
+    items = rows if rows is not None else points
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Provide a non-empty 'rows' or 'points' list"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large: {len(items)} > {MAX_BATCH_SIZE}"}), 400
+
+    results = [{} for _ in items]
+    # Row indices and their raw conditions, turned into one feature matrix below
+    candidates = []
+    error_prefix = "Invalid input"
+
+    if rows is not None:
+        for i, row in enumerate(rows):
+            if isinstance(row, dict):
+                candidates.append(i)
+            else:
+                results[i]["error"] = "Invalid input: each row must be an object"
+        columns = features.manual_columns([rows[i] for i in candidates])
+    else:
+        # Look up each distinct location once (concurrently): the current hour,
+        # forecast hours and stored past hours its points ask for
+        now_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        horizon = now_hour + timedelta(days=stormglass_client.MAX_FORECAST_DAYS)
+        locations = {}
+        for i, point in enumerate(points):
+            try:
+                lat = float(point.get("lat"))
+                lon = float(point.get("lon"))
+            except (AttributeError, TypeError, ValueError):
+                results[i]["error"] = "Missing or invalid 'lat'/'lon'"
+                continue
+            results[i].update({"lat": lat, "lon": lon})
+            when = None
+            if point.get("time") is not None:
+                try:
+                    when = _parse_time(point["time"]).astimezone(timezone.utc)
+                except (TypeError, ValueError):
+                    results[i]["error"] = "Invalid 'time': expected an ISO-8601 timestamp"
+                    continue
+                when = when.replace(minute=0, second=0, microsecond=0)
+                if when > horizon:
+                    results[i]["error"] = (
+                        f"'time' is beyond the {stormglass_client.MAX_FORECAST_DAYS}-day forecast window"
+                    )
+                    continue
+                if when == now_hour:
+                    when = None
+            locations.setdefault((lat, lon), []).append((i, when))
+
+        deadline = time.monotonic() + UPSTREAM_DEADLINE_S
+        futures = {
+            loc: upstream_pool.submit(
+                metrics.timed_call, "/predict/batch", "stormglass_weather", _conditions_at,
+                *loc, {when for _, when in wanted}, now_hour,
+            )
+            for loc, wanted in locations.items()
+        }
+        selected_hours = []
+        for loc, wanted in locations.items():
+            try:
+                remaining = max(0.0, deadline - time.monotonic())
+                found, failed = futures[loc].result(timeout=remaining)
+            except FutureTimeoutError:
+                for i, _ in wanted:
+                    results[i]["error"] = "Failed to fetch Stormglass data: timed out"
+                continue
+            for i, when in wanted:
+                if when not in found:
+                    results[i]["error"] = failed.get(when, "No conditions available")
+                    continue
+                candidates.append(i)
+                selected_hours.append(found[when])
+                results[i]["time"] = found[when].get("time")
+        columns = features.stormglass_columns(selected_hours)
+        error_prefix = "Invalid conditions"
+
+    X, errors = features.build_matrix(columns, len(candidates))
+    feature_index = []
+    for i, error in zip(candidates, errors):
+        if error:
+            results[i]["error"] = f"{error_prefix}: {error}"
+        else:
+            feature_index.append(i)
+    X = X[[e is None for e in errors]]
+
+    if feature_index:
+        with metrics.STAGE_SECONDS.time(endpoint="/predict/batch", stage="model_predict"):
+            preds = model.predict(X)
+        for i, row, pred in zip(feature_index, X, preds):
+            results[i]["visibility_m"] = float(pred)
+            results[i]["features"] = _feature_dict(row)
+
+    return jsonify({
+        "region": region,
+        "count": len(feature_index),
+        "predictions": results,
+    })
+
+
+@app.route("/forecast", methods=["POST"])
+def forecast():
+    # Accept JSON: { "lat": <float>, "lon": <float>, "days": 7, "region": "UK" }
+    # One Stormglass range request, one model.predict over every returned hour.
+    payload = request.get_json() or {}
+    try:
+        lat = float(payload.get("lat"))
+        lon = float(payload.get("lon"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid 'lat'/'lon'"}), 400
+    try:
+        days = int(payload.get("days", 7))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid 'days'"}), 400
+
+    region = str(payload.get("region", "GLOBAL")).upper()
+    model = models.get(region)
+    if model is None:
+        return jsonify({"error": "Model not found. Train the model first: see README."}), 500
+
+    try:
+        with metrics.STAGE_SECONDS.time(endpoint="/forecast", stage="stormglass_forecast"):
+            hours = stormglass_client.get_forecast(lat, lon, days)["hours"]
+    except Exception as e:
+        return jsonify({"error": f"Failed to get forecast from Stormglass: {e}"}), 502
+
+    X, times = _stormglass_hours_matrix(hours)
+    if not times:
+        return jsonify({"error": "Stormglass returned no usable hours"}), 502
+
+    with metrics.STAGE_SECONDS.time(endpoint="/forecast", stage="model_predict"):
+        preds = model.predict(X)
+    return jsonify({
+        "lat": lat,
+        "lon": lon,
+        "region": region,
+        "source": "stormglass",
+        "hours": [
+            {"time": t, "visibility_m": float(p), "features": _feature_dict(row)}
+            for t, row, p in zip(times, X, preds)
+        ],
+    })
+
+
+def _dive_filters(args):
+    """Parse GET /dives filters into query_dives() keyword arguments (ValueError on bad input)."""
+    filters = {}
+    for key in ("date_from", "date_to"):
+        if args.get(key):
+            bound = _parse_time(args[key])
+            if key == "date_to" and len(args[key].strip()) == 10:
+                # A bare date includes the whole day
+                bound += timedelta(days=1) - timedelta(seconds=1)
+            filters[key] = bound
+    for key in ("min_visibility", "max_visibility"):
+        if args.get(key):
+            filters[key] = float(args[key])
+
+    bbox = None
+    if args.get("bbox"):
+        # min_lon,min_lat,max_lon,max_lat (Leaflet's LatLngBounds.toBBoxString order)
+        parts = [float(v) for v in args["bbox"].split(",")]
+        if len(parts) != 4:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        bbox = parts
+    if args.get("site"):
+        site = database_client.get_site(args["site"])
+        if site is None:
+            raise LookupError(f"Unknown site '{args['site']}'")
+        radius_km = float(args.get("site_radius_km") or 1.0)
+        dlat = radius_km / 111.32
+        dlon = radius_km / (111.32 * max(np.cos(np.radians(site["lat"])), 1e-6))
+        site_box = [site["lon"] - dlon, site["lat"] - dlat, site["lon"] + dlon, site["lat"] + dlat]
+        if bbox is not None:
+            # Intersect with an explicit bbox
+            site_box = [max(bbox[0], site_box[0]), max(bbox[1], site_box[1]),
+                        min(bbox[2], site_box[2]), min(bbox[3], site_box[3])]
+        bbox = site_box
+    if bbox is not None:
+        filters["bbox"] = bbox
+    return filters
+
+
+def _dive_log_etag():
+    """Weak ETag for a dive-log read: the change counters of the log and the
+    sites table (site= filters, clusters) plus the query string."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    digest = hashlib.sha1(f"{request.path}?{query}".encode("utf-8")).hexdigest()[:12]
+    return f'W/"{database_client.dive_log_version(include_sites=True)}-{digest}"'
+
+
+def _not_modified(etag):
+    resp = Response(status=304)
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def _etag_matches(etag):
+    header = request.headers.get("If-None-Match", "")
+    candidates = {t.strip() for t in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def _json_body_response(payload, etag=None):
+    """JSON response with an ETag and gzip when the client accepts it."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    resp = Response(body, mimetype="application/json")
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("Accept-Encoding", "").lower():
+        resp.set_data(gzip.compress(body, compresslevel=5))
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    if etag:
+        resp.headers["ETag"] = etag
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+# Heatmap job: region whose model scores the grid, and refresh cadence
+# (seconds, 0 disables the background job)
+HEATMAP_REGION = (os.environ.get("HEATMAP_REGION") or "GLOBAL").upper()
+HEATMAP_INTERVAL_S = float(os.environ.get("HEATMAP_INTERVAL", "3600"))
+heatmap_store = heatmap.HeatmapStore()
+
+
+def refresh_heatmap():
+    """Rebuild the visibility heatmap from the cached forecasts of the known
+    sites inside the grid (grid centre if there are none) with one predict.
+    Never calls Stormglass: sites without a cached or stored forecast are skipped."""
+    model = models.get(HEATMAP_REGION)
+    if model is None:
+        raise RuntimeError("Model not found. Train the model first: see README.")
+    sites = database_client.sites_in_bbox(heatmap.HEATMAP_BBOX)
+    if not sites:
+        min_lon, min_lat, max_lon, max_lat = heatmap.HEATMAP_BBOX
+        sites = [{"site_name": "grid centre", "lat": (min_lat + max_lat) / 2, "lon": (min_lon + max_lon) / 2}]
+
+    anchors = []
+    for site in sites:
+        forecast = stormglass_client.get_stored_forecast(site["lat"], site["lon"], heatmap.HEATMAP_DAYS)
+        if forecast is None:
+            print(f"Warning: Heatmap skipped {site['site_name']}: no cached forecast")
+            continue
+        X, times = _stormglass_hours_matrix(forecast["hours"])
+        if times:
+            anchors.append({"lat": site["lat"], "lon": site["lon"], "times": times, "features": X})
+
+    with metrics.STAGE_SECONDS.time(endpoint="heatmap_job", stage="model_predict"):
+        result = heatmap.build_heatmap(model.predict, anchors, angular=(FEATURE_NAMES.index("wind_dir"),))
+    heatmap.save(result)
+    heatmap_store.set(result)
+
+
+heatmap_job = background.PeriodicJob("heatmap", refresh_heatmap, HEATMAP_INTERVAL_S)
+
+
+@app.route("/heatmap", methods=["GET"])
+def heatmap_meta():
+    # Grid bounds, overlay bounds and forecast hours of the latest heatmap
+    meta = heatmap_store.meta()
+    if meta is None:
+        return jsonify({"error": "Heatmap has not been generated yet"}), 404
+    meta["job"] = heatmap_job.describe()
+    return jsonify(meta)
+
+
+@app.route("/heatmap/<int:index>.<fmt>", methods=["GET"])
+def heatmap_slice(index, fmt):
+    # Forecast hour `index` (see GET /heatmap "times") as a PNG overlay or a JSON grid.
+    # Served from memory; never runs the model.
+    try:
+        if fmt == "png":
+            resp = Response(heatmap_store.png(index), mimetype="image/png")
+        elif fmt == "json":
+            values = heatmap_store.grid(index)
+            resp = jsonify({
+                "time": heatmap_store.meta()["times"][index],
+                "values": np.round(values.astype(float), 2).tolist(),
+            })
+        else:
+            return jsonify({"error": "Format must be png or json"}), 404
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    resp.headers["Cache-Control"] = "public, max-age=300"
+    return resp
+
+
+# Pre-fetches Stormglass conditions for every known site (see cache_warmer.py)
+site_warmer = cache_warmer.CacheWarmer()
+warm_job = background.PeriodicJob(
+    "cache_warm",
+    lambda: site_warmer.run_cycle(wait=warm_job.wait),
+    cache_warmer.CACHE_WARM_INTERVAL_S,
+)
+
+
+# Refits the global model in the background when dives with a visibility are
+# logged or edited (see retrainer.py). Created by start_background_jobs(), so
+# only the process running the jobs refits; other processes reload the
+# published model through the registry.
+dive_retrainer = None
+retrain_watch_job = background.PeriodicJob(
+    "retrain_watch",
+    lambda: dive_retrainer.watch(database_client.dive_log_version()),
+    retrainer.RETRAIN_DEBOUNCE_S,
+)
+
+
+def _schedule_retrain(dive):
+    if dive_retrainer is not None and dive.get("visibility") not in (None, ""):
+        dive_retrainer.notify()
+
+
+def start_background_jobs():
+    """Start the periodic jobs that keep precomputed data and caches fresh."""
+    if cache_warmer.CACHE_WARM_INTERVAL_S > 0:
+        warm_job.start()
+    if HEATMAP_INTERVAL_S > 0:
+        # Let the first warming pass fill the forecast cache the heatmap reads
+        heatmap_job.initial_delay = 60.0 if cache_warmer.CACHE_WARM_INTERVAL_S > 0 else 0.0
+        heatmap_job.start()
+    global dive_retrainer
+    if retrainer.RETRAIN_ENABLED and dive_retrainer is None:
+        dive_retrainer = retrainer.Retrainer(GLOBAL_MODEL_PATH, on_published=lambda: models.reload("GLOBAL"))
+        retrain_watch_job.start()
+
+
+@app.route("/jobs", methods=["GET"])
+def jobs_status():
+    # Status of the background jobs (last run, duration, error)
+    return jsonify({
+        "cache_warm": {**warm_job.describe(), "last_cycle": site_warmer.last_cycle},
+        "heatmap": heatmap_job.describe(),
+        "retrain": dive_retrainer.describe() if dive_retrainer is not None else {"enabled": False},
+    })
+
+
 @app.route("/dives", methods=["GET"])
 def get_dives():
-    dives = load_dives()
-    return jsonify(dives)
+    # Query params (all optional):
+    #   limit, cursor        page size and the next_cursor of the previous page
+    #   fields=id,lat,lon    columns to return
+    #   date_from, date_to   inclusive ISO dates/timestamps
+    #   bbox=min_lon,min_lat,max_lon,max_lat
+    #   min_visibility, max_visibility
+    #   site=<name> [site_radius_km=1]   dives near a site from the sites table
+    # Without limit/cursor the response is a plain array of every matching dive;
+    # with them it is {"dives": [...], "next_cursor": "..." | null}.
+    args = request.args
+    paged = "limit" in args or "cursor" in args
+
+    # The ETag covers the dive log version and the query, so an unchanged log
+    # is answered with 304 before touching dive_log.
+    etag = _dive_log_etag()
+    if _etag_matches(etag):
+        return _not_modified(etag)
+
+    try:
+        filters = _dive_filters(args)
+        limit = None
+        if paged:
+            limit = min(max(int(args.get("limit") or MAX_DIVES_PAGE), 1), MAX_DIVES_PAGE)
+        after = int(args["cursor"]) if args.get("cursor") else None
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    fields = None
+    if args.get("fields"):
+        fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in database_client.DIVE_COLUMNS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    dives, next_cursor = database_client.query_dives(fields=fields, after=after, limit=limit, **filters)
+    if paged:
+        return _json_body_response({"dives": dives, "next_cursor": next_cursor}, etag)
+    return _json_body_response(dives, etag)
+
+
+@app.route("/dives/clusters", methods=["GET"])
+def dive_clusters_view():
+    # Query: bbox=min_lon,min_lat,max_lon,max_lat (the map viewport) and zoom=<0..22>.
+    # Dives inside the viewport are found through the R*Tree index and grouped
+    # into on-screen clusters with visibility stats; known sites in view are
+    # listed alongside.
+    etag = _dive_log_etag()
+    if _etag_matches(etag):
+        return _not_modified(etag)
+    try:
+        bbox = [float(v) for v in request.args["bbox"].split(",")]
+        if len(bbox) != 4:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        zoom = int(request.args.get("zoom", "12"))
+        if not 0 <= zoom <= 22:
+            raise ValueError("zoom must be between 0 and 22")
+    except KeyError:
+        return jsonify({"error": "Missing 'bbox'"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    ids, lats, lons, vis = database_client.dive_points_in_bbox(bbox)
+    return _json_body_response({
+        "zoom": zoom,
+        "bbox": bbox,
+        "total": len(ids),
+        "clusters": dive_clusters.cluster_points(ids, lats, lons, vis, zoom),
+        "sites": database_client.sites_in_bbox(bbox),
+    }, etag)
 
 
 @app.route("/dives", methods=["POST"])
@@ -440,64 +887,68 @@ def add_dive():
         "created_at": datetime.utcnow().isoformat(),
     }
 
-    dives = load_dives()
-    dives.append(dive)
-    save_dives(dives)
+    database_client.insert_dive(dive)
+    _schedule_retrain(dive)
     return jsonify(dive), 201
 
 
+@app.route("/dives/<dive_id>", methods=["GET"])
+def get_dive(dive_id):
+    dive = database_client.get_dive(dive_id)
+    if dive is None:
+        return jsonify({"error": "Dive not found"}), 404
+    return jsonify(dive)
+
+
 @app.route("/dives/<dive_id>", methods=["PUT"])
 def update_dive(dive_id):
     payload = request.get_json() or {}
-    dives = load_dives()
-    
-    # Find the dive to update
-    dive_index = None
-    for i, d in enumerate(dives):
-        if d.get("id") == dive_id:
-            dive_index = i
-            break
-    
-    if dive_index is None:
-        return jsonify({"error": "Dive not found"}), 404
-    
+
     # Update fields if provided
-    dive = dives[dive_index]
+    fields = {}
     if "lat" in payload:
         try:
-            dive["lat"] = float(payload["lat"])
+            fields["lat"] = float(payload["lat"])
         except (ValueError, TypeError):
             return jsonify({"error": "Invalid lat"}), 400
     if "lon" in payload:
         try:
-            dive["lon"] = float(payload["lon"])
+            fields["lon"] = float(payload["lon"])
         except (ValueError, TypeError):
             return jsonify({"error": "Invalid lon"}), 400
-    if "date" in payload:
-        dive["date"] = payload["date"]
-    if "depth" in payload:
-        dive["depth"] = payload["depth"]
-    if "notes" in payload:
-        dive["notes"] = payload["notes"]
-    if "tide_height" in payload:
-        dive["tide_height"] = payload["tide_height"]
-    if "breath_hold_time" in payload:
-        dive["breath_hold_time"] = payload["breath_hold_time"]
-    if "visibility" in payload:
-        dive["visibility"] = payload["visibility"]
-    if "water_temp" in payload:
-        dive["water_temp"] = payload["water_temp"]
-    if "outside_temp" in payload:
-        dive["outside_temp"] = payload["outside_temp"]
-    
-    dive["updated_at"] = datetime.utcnow().isoformat()
-    
-    dives[dive_index] = dive
-    save_dives(dives)
+    for key in ("date", "depth", "notes", "tide_height", "breath_hold_time",
+                "visibility", "water_temp", "outside_temp"):
+        if key in payload:
+            fields[key] = payload[key]
+
+    fields["updated_at"] = datetime.utcnow().isoformat()
+
+    dive = database_client.update_dive(dive_id, fields)
+    if dive is None:
+        return jsonify({"error": "Dive not found"}), 404
+    _schedule_retrain(dive)
     return jsonify(dive), 200
 
 
+# Background jobs run in every process that serves the app (flask run,
+# bench/serve_app.py, a WSGI server) unless BACKGROUND_JOBS=false, e.g. for all
+# but one worker of a multi-process server. Under the debug reloader only the
+# serving child (WERKZEUG_RUN_MAIN=true) runs them, never the file watcher.
+BACKGROUND_JOBS = (os.environ.get("BACKGROUND_JOBS") or "true").strip().lower() not in {"false", "0", "no"}
+
+
+def _should_start_background_jobs():
+    return BACKGROUND_JOBS and (not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true")
+
+
+if __name__ != "__main__" and _should_start_background_jobs():
+    start_background_jobs()
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5000"))
     host = os.environ.get("HOST", "127.0.0.1")
+    # app.run(debug=True) below always uses the reloader, so only its child starts the jobs
+    if BACKGROUND_JOBS and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_jobs()
     app.run(host=host, port=port, debug=True)
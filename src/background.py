@@ -0,0 +1,72 @@
+"""
+Periodic background jobs for the Flask app (daemon threads).
+
+Usage:
+    job = PeriodicJob("heatmap", refresh_heatmap, interval=3600)
+    job.start()
+    ...
+    job.stop()
+"""
+import threading
+import time
+
+
+class PeriodicJob:
+    """Runs `fn()` every `interval` seconds on a daemon thread, starting after
+    `initial_delay`. Exceptions are logged and the schedule continues."""
+
+    def __init__(self, name, fn, interval, initial_delay=0.0):
+        self.name = name
+        self.fn = fn
+        self.interval = float(interval)
+        self.initial_delay = float(initial_delay)
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"job-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait(self, seconds):
+        """Sleep inside a run; returns True if the job is being stopped."""
+        return self._stop.wait(seconds)
+
+    def run_once(self):
+        start = time.perf_counter()
+        try:
+            self.fn()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Warning: Background job '{self.name}' failed: {e}")
+        finally:
+            self.last_run = time.time()
+            self.last_duration = time.perf_counter() - start
+
+    def _run(self):
+        if self._stop.wait(self.initial_delay):
+            return
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+    def describe(self):
+        return {
+            "interval_s": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_run": self.last_run,
+            "last_duration_s": self.last_duration,
+            "last_error": self.last_error,
+        }
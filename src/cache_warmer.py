@@ -0,0 +1,122 @@
+"""
+Pre-fetches Stormglass conditions for every known site so interactive
+requests are cache hits.
+
+Each cycle walks the `sites` table and calls the cached Stormglass lookups
+(weather/tide, bio, forecast) for each site. The calls are spaced evenly over
+the first half of the cycle, and never closer than CACHE_WARM_MIN_SPACING
+seconds, so a growing site list never turns into a burst against the
+provider's quota. Because the file cache is daily, only the first cycle of
+each UTC day reaches the API; later cycles refill the per-hour memory cache
+from disk.
+
+Runs inside the app (started with `python src/app.py`) or as a companion
+worker that fills the shared file cache and database:
+
+    python src/cache_warmer.py            # loop forever
+    python src/cache_warmer.py --once     # a single cycle, e.g. from cron
+"""
+import argparse
+import os
+import threading
+import time
+
+try:
+    from . import database_client, metrics, stormglass_client
+except ImportError:
+    import database_client
+    import metrics
+    import stormglass_client
+
+# Cycle length in seconds (0 disables the in-app job)
+CACHE_WARM_INTERVAL_S = float(os.environ.get("CACHE_WARM_INTERVAL", "1800"))
+CACHE_WARM_MIN_SPACING_S = float(os.environ.get("CACHE_WARM_MIN_SPACING", "2"))
+CACHE_WARM_KINDS = [k.strip() for k in (os.environ.get("CACHE_WARM_KINDS") or "weather,bio,forecast").split(",") if k.strip()]
+CACHE_WARM_FORECAST_DAYS = int(os.environ.get("CACHE_WARM_FORECAST_DAYS", "7"))
+
+WARM_TASKS = metrics.Counter(
+    "visibility_cache_warm_total",
+    "Site cache-warming lookups by kind and outcome.",
+    ["kind", "outcome"],
+)
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return False
+
+
+class CacheWarmer:
+    """Warms the Stormglass caches for every site returned by `sites_fn()`."""
+
+    def __init__(self, sites_fn=None, kinds=None, interval=CACHE_WARM_INTERVAL_S,
+                 min_spacing=CACHE_WARM_MIN_SPACING_S, forecast_days=CACHE_WARM_FORECAST_DAYS):
+        self.sites_fn = sites_fn or database_client.list_sites
+        self.kinds = list(kinds or CACHE_WARM_KINDS)
+        self.interval = float(interval)
+        self.min_spacing = float(min_spacing)
+        self.forecast_days = forecast_days
+        self.last_cycle = None
+        self._lock = threading.Lock()
+
+    def _lookup(self, kind, lat, lon):
+        if kind == "weather":
+            return stormglass_client.get_weather_and_tide(lat, lon)
+        if kind == "bio":
+            return stormglass_client.get_bio_data(lat, lon)
+        if kind == "forecast":
+            return stormglass_client.get_forecast(lat, lon, self.forecast_days)
+        raise ValueError(f"Unknown cache-warming kind '{kind}'")
+
+    def spacing(self, n_tasks):
+        """Seconds between lookups: spread over half a cycle, at least min_spacing."""
+        if n_tasks <= 1:
+            return 0.0
+        return max(self.min_spacing, 0.5 * self.interval / n_tasks)
+
+    def run_cycle(self, wait=None):
+        """
+        Warm every (site, kind) once. `wait(seconds)` sleeps between lookups and
+        returns True to abort the cycle (PeriodicJob.wait when run in the app).
+        Returns a summary dict.
+        """
+        wait = wait or _sleep
+        with self._lock:
+            sites = self.sites_fn()
+            tasks = [(site, kind) for site in sites for kind in self.kinds]
+            spacing = self.spacing(len(tasks))
+            summary = {"sites": len(sites), "ok": 0, "failed": 0, "started_at": time.time()}
+            for i, (site, kind) in enumerate(tasks):
+                if i and wait(spacing):
+                    break
+                try:
+                    self._lookup(kind, site["lat"], site["lon"])
+                    summary["ok"] += 1
+                    WARM_TASKS.inc(kind=kind, outcome="ok")
+                except Exception as e:
+                    summary["failed"] += 1
+                    WARM_TASKS.inc(kind=kind, outcome="error")
+                    print(f"Warning: Cache warming {kind} for {site.get('site_name')} failed: {e}")
+            summary["duration_s"] = round(time.time() - summary["started_at"], 3)
+            self.last_cycle = summary
+            return summary
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Pre-fetch Stormglass conditions for every known site")
+    p.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+    p.add_argument("--interval", type=float, default=CACHE_WARM_INTERVAL_S or 1800, help="Seconds between cycles")
+    args = p.parse_args()
+
+    warmer = CacheWarmer(interval=args.interval)
+    while True:
+        summary = warmer.run_cycle()
+        print(f"Warmed {summary['ok']} lookup(s) for {summary['sites']} site(s), "
+              f"{summary['failed']} failed, in {summary['duration_s']}s")
+        if args.once:
+            return 0 if summary["failed"] == 0 else 1
+        time.sleep(max(0.0, args.interval - summary["duration_s"]))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+"""
+Cassette store for recording upstream HTTP responses and replaying them offline.
+
+A cassette is one JSON file holding the status, headers and body of a GET.
+Files are grouped by endpoint and location:
+
+    <CASSETTE_DIR>/<host>/<path>/<location key>/<window key>.json
+
+Location key: endpoint parameters with coordinates rounded to 2 decimals
+(lat/lng/latitude/longitude), excluding time and credential parameters.
+Window key: the start/end parameters truncated to the hour.
+
+A replay of a window that was never recorded raises CassetteNotFound. With
+UPSTREAM_REPLAY_FALLBACK=true it serves the newest recording for the same
+location instead, labelled with an X-Cassette-Fallback header. Credential
+query parameters (tokens, keys) are never written to a cassette.
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+CASSETTE_DIR = os.environ.get("UPSTREAM_CASSETTE_DIR") or os.path.join(os.path.dirname(APP_ROOT), "data", "cassettes")
+
+# Serve the newest recording for a location when the exact window is missing
+REPLAY_FALLBACK = (os.environ.get("UPSTREAM_REPLAY_FALLBACK") or "false").strip().lower() in {"true", "1", "yes"}
+
+COORD_PARAMS = {"lat", "lng", "lon", "latitude", "longitude"}
+TIME_PARAMS = {"start", "end"}
+# Query parameters whose name contains one of these are credentials
+CREDENTIAL_MARKERS = ("token", "key", "secret", "password", "auth", "signature")
+
+
+class CassetteNotFound(LookupError):
+    """Raised in replay mode when no recording matches a request."""
+
+
+def _hour(value) -> str:
+    try:
+        dt = datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return str(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H")
+
+
+def _is_credential(name) -> bool:
+    name = str(name).lower()
+    return any(marker in name for marker in CREDENTIAL_MARKERS)
+
+
+def _redact_url(url) -> str:
+    """`url` without credential query parameters."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_credential(k)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _normalize(url, params):
+    parts = urlsplit(url)
+    items = dict(parse_qsl(parts.query))
+    items.update({k: v for k, v in (params or {}).items() if v is not None})
+    location, window = {}, {}
+    for key, value in items.items():
+        if _is_credential(key):
+            continue
+        if key in COORD_PARAMS:
+            try:
+                location[key] = f"{float(value):.2f}"
+            except (TypeError, ValueError):
+                location[key] = str(value)
+        elif key in TIME_PARAMS:
+            window[key] = _hour(value)
+        else:
+            location[key] = str(value)
+    return parts, location, window
+
+
+def _digest(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _safe(segment: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", segment).strip("_") or "root"
+
+
+def cassette_paths(url, params=None):
+    """(location directory, exact cassette file) for a request."""
+    parts, location, window = _normalize(url, params)
+    endpoint_dir = os.path.join(CASSETTE_DIR, _safe(parts.netloc), _safe(parts.path))
+    location_dir = os.path.join(endpoint_dir, _digest(location))
+    return location_dir, os.path.join(location_dir, _digest(window) + ".json")
+
+
+def record(url, params, response: requests.Response) -> str:
+    """Store a live response; returns the cassette path."""
+    location_dir, path = cassette_paths(url, params)
+    os.makedirs(location_dir, exist_ok=True)
+    payload = {
+        "url": _redact_url(url),
+        "params": {k: str(v) for k, v in (params or {}).items() if not _is_credential(k)},
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "status_code": response.status_code,
+        "headers": {"Content-Type": response.headers.get("Content-Type", "application/json")},
+        "body": response.text,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def replay(url, params=None) -> requests.Response:
+    """Build a Response from the cassette for the exact request window (or, with
+    REPLAY_FALLBACK, the newest recording for the location)."""
+    location_dir, path = cassette_paths(url, params)
+    fallback = False
+    if not os.path.exists(path):
+        described = f"{_redact_url(url)} {_normalize(url, params)[2] or ''}".rstrip()
+        if not REPLAY_FALLBACK:
+            raise CassetteNotFound(
+                f"No recorded response for {described} in {CASSETTE_DIR} "
+                "(set UPSTREAM_REPLAY_FALLBACK=true to use the newest recording for this location)"
+            )
+        try:
+            candidates = [os.path.join(location_dir, f) for f in os.listdir(location_dir) if f.endswith(".json")]
+        except FileNotFoundError:
+            candidates = []
+        if not candidates:
+            raise CassetteNotFound(f"No recorded response for {described} in {CASSETTE_DIR}")
+        path = max(candidates, key=os.path.getmtime)
+        fallback = True
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+
+    resp = requests.Response()
+    resp.status_code = payload["status_code"]
+    resp._content = payload["body"].encode("utf-8")
+    resp.headers.update(payload.get("headers") or {})
+    resp.encoding = "utf-8"
+    resp.url = payload.get("url", _redact_url(url))
+    if fallback:
+        # The body is for another time window; say which one
+        recorded = {k: v for k, v in (payload.get("params") or {}).items() if k in TIME_PARAMS}
+        resp.headers["X-Cassette-Fallback"] = json.dumps({"recorded_at": payload.get("recorded_at"), **recorded})
+        print(f"Warning: Replaying {os.path.basename(path)} recorded for another window ({recorded or 'unknown'})")
+    return resp
@@ -0,0 +1,194 @@
+"""
+Column-oriented files for training data and condition history.
+
+Two on-disk formats:
+
+    npy      a directory with one `<column>.npy` file per column plus
+             `_meta.json`. Columns are written in streamed chunks and read
+             back with np.load(mmap_mode="r"), so readers map only the
+             columns they ask for.
+    parquet  a single Parquet file with one row group per chunk (requires
+             the optional `pyarrow` package).
+
+A directory of `part-NNNNN` npy directories or `part-NNNNN.parquet` files
+(e.g. from data_generator.py) is read as one dataset, parts in order.
+
+Usage:
+    with ColumnarWriter("data/train_npy", ["a", "b"]) as w:
+        for chunk in chunks:          # DataFrames
+            w.write(chunk)
+    cols = read_columns("data/train_npy", ["a"])   # {"a": memmap}
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:  # optional dependency
+    pa = pq = None
+    HAS_PYARROW = False
+
+META_FILE = "_meta.json"
+DEFAULT_FORMAT = "parquet" if HAS_PYARROW else "npy"
+
+
+def dataset_parts(path: str):
+    """Sorted part paths of a partitioned dataset directory ([] if not one)."""
+    if not os.path.isdir(path) or os.path.exists(os.path.join(path, META_FILE)):
+        return []
+    return [os.path.join(path, p) for p in sorted(os.listdir(path)) if p.startswith("part-") and not p.endswith(".tmp")]
+
+
+def detect_format(path: str) -> str:
+    """
+    'dataset' for a directory of parts, 'npy' for a column directory,
+    'parquet' for .parquet files, else 'csv'.
+    """
+    if os.path.isdir(path):
+        return "dataset" if dataset_parts(path) else "npy"
+    if path.endswith((".parquet", ".pq")):
+        return "parquet"
+    return "csv"
+
+
+class _NpyColumn:
+    """Appends values to a .npy file whose header is rewritten with the final length."""
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._fh = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        np.lib.format.write_array_header_1_0(
+            self._fh, {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (self.rows,)}
+        )
+
+    def append(self, values):
+        arr = np.ascontiguousarray(values, dtype=self.dtype)
+        self._fh.write(arr.tobytes())
+        self.rows += arr.shape[0]
+
+    def close(self):
+        # The 1-D header is 128 bytes for any realistic length, so it can be
+        # rewritten in place once the row count is known
+        self._fh.seek(0)
+        self._write_header()
+        if self._fh.tell() != 128:
+            raise RuntimeError(f"Unexpected .npy header size in {self.path}")
+        self._fh.close()
+
+
+class ColumnarWriter:
+    """
+    Streams DataFrame chunks into a columnar file without holding the whole
+    dataset. Columns are stored as float64 unless `dtypes` says otherwise.
+    The output appears atomically on close().
+    """
+
+    def __init__(self, path, columns, fmt=None, dtypes=None):
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt or ("parquet" if path.endswith((".parquet", ".pq")) else "npy")
+        self.dtypes = {c: np.dtype((dtypes or {}).get(c, np.float64)) for c in self.columns}
+        self.rows = 0
+        self._tmp = path + ".tmp"
+        if self.fmt == "parquet":
+            if not HAS_PYARROW:
+                raise ImportError("Parquet output requires pyarrow (pip install pyarrow); use fmt='npy'")
+            self._schema = pa.schema([(c, pa.from_numpy_dtype(self.dtypes[c])) for c in self.columns])
+            self._writer = pq.ParquetWriter(self._tmp, self._schema)
+        elif self.fmt == "npy":
+            shutil.rmtree(self._tmp, ignore_errors=True)
+            os.makedirs(self._tmp)
+            self._files = {c: _NpyColumn(os.path.join(self._tmp, f"{c}.npy"), self.dtypes[c]) for c in self.columns}
+        else:
+            raise ValueError(f"Unsupported columnar format '{self.fmt}'")
+
+    def write(self, chunk: pd.DataFrame):
+        if len(chunk) == 0:
+            return
+        if self.fmt == "parquet":
+            arrays = [pa.array(chunk[c].to_numpy(dtype=self.dtypes[c])) for c in self.columns]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        else:
+            for c in self.columns:
+                self._files[c].append(chunk[c].to_numpy(dtype=self.dtypes[c]))
+        self.rows += len(chunk)
+
+    def close(self):
+        if self.fmt == "parquet":
+            self._writer.close()
+            os.replace(self._tmp, self.path)
+            return self.rows
+        for f in self._files.values():
+            f.close()
+        with open(os.path.join(self._tmp, META_FILE), "w", encoding="utf-8") as fh:
+            json.dump({"rows": self.rows, "columns": self.columns,
+                       "dtypes": {c: str(d) for c, d in self.dtypes.items()}}, fh, indent=2)
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self._tmp, self.path)
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.fmt == "npy":
+            for f in self._files.values():
+                f._fh.close()
+            shutil.rmtree(self._tmp, ignore_errors=True)
+        else:
+            self._writer.close()
+            os.remove(self._tmp)
+        return False
+
+
+def list_columns(path: str):
+    fmt = detect_format(path)
+    if fmt == "dataset":
+        return list_columns(dataset_parts(path)[0])
+    if fmt == "npy":
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as fh:
+            return json.load(fh)["columns"]
+    if fmt == "parquet":
+        if not HAS_PYARROW:
+            raise ImportError("Reading Parquet requires pyarrow")
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_columns(path: str, columns=None, mmap=True) -> dict:
+    """
+    {column: 1-D array} for the requested columns only (all if None).
+    npy columns are memory-mapped read-only unless mmap=False; the parts
+    of a dataset are concatenated into memory.
+    """
+    fmt = detect_format(path)
+    available = list_columns(path)
+    columns = list(columns or available)
+    missing = [c for c in columns if c not in available]
+    if missing:
+        raise ValueError(f"Missing required columns in data: {missing}")
+    if fmt == "dataset":
+        parts = [read_columns(p, columns, mmap) for p in dataset_parts(path)]
+        return {c: np.concatenate([part[c] for part in parts]) for c in columns}
+    if fmt == "npy":
+        mode = "r" if mmap else None
+        return {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode=mode) for c in columns}
+    if fmt == "parquet":
+        table = pq.read_table(path, columns=columns, memory_map=mmap)
+        return {c: table.column(c).to_numpy() for c in columns}
+    df = pd.read_csv(path, usecols=columns)
+    return {c: df[c].to_numpy() for c in columns}
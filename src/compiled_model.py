@@ -0,0 +1,181 @@
+"""
+Compact, array-backed form of the trained visibility pipeline
+(SimpleImputer -> StandardScaler -> RandomForestRegressor) for low-latency
+serving without sklearn's per-call validation and per-estimator dispatch.
+
+All trees are concatenated into flat node arrays. A few rows are walked tree
+by tree in plain Python; larger batches walk every row level by level with
+NumPy. Imputation and scaling are stored alongside the trees
+and applied as a single vectorized step, exactly as sklearn does (scaled
+values are cast to float32 before comparing with the split thresholds), so
+predictions match the sklearn pipeline bit for bit.
+
+Usage:
+    compiled = compile_pipeline(pipeline)
+    save_compiled(compiled, "model/dive_visibility_model.compiled.npz")
+    model = CompiledForest.load("model/dive_visibility_model.compiled.npz")
+    model.predict(X)
+"""
+import os
+import tempfile
+
+import numpy as np
+
+COMPILED_SUFFIX = ".compiled.npz"
+
+
+def compiled_path_for(model_path: str) -> str:
+    """model/foo.pkl -> model/foo.compiled.npz"""
+    return os.path.splitext(model_path)[0] + COMPILED_SUFFIX
+
+
+def compile_pipeline(pipeline) -> dict:
+    """
+    Flatten a fitted imputer/scaler/forest pipeline into plain NumPy arrays.
+    Raises ValueError for pipelines this engine cannot reproduce exactly.
+    """
+    steps = [step for _, step in getattr(pipeline, "steps", [("model", pipeline)])]
+    *transforms, forest = steps
+    estimators = getattr(forest, "estimators_", None)
+    if not estimators or getattr(forest, "n_outputs_", 1) != 1:
+        raise ValueError("Final step must be a fitted single-output tree ensemble")
+
+    n_features = forest.n_features_in_
+    fill = np.full(n_features, np.nan)
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    for step in transforms:
+        name = type(step).__name__
+        if name == "SimpleImputer":
+            stats = np.asarray(step.statistics_, dtype=np.float64)
+            if stats.shape != (n_features,) or np.isnan(stats).any():
+                raise ValueError("SimpleImputer dropped or could not fill a feature")
+            fill = stats
+        elif name == "StandardScaler":
+            if step.mean_ is not None:
+                mean = np.asarray(step.mean_, dtype=np.float64)
+            if step.scale_ is not None:
+                scale = np.asarray(step.scale_, dtype=np.float64)
+        else:
+            raise ValueError(f"Unsupported pipeline step: {name}")
+
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in estimators:
+        tree = est.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        own = np.arange(offset, offset + n)
+        # Leaves point at themselves so extra iterations of the walk are no-ops
+        left.append(np.where(is_leaf, own, tree.children_left + offset))
+        right.append(np.where(is_leaf, own, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        value.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    return {
+        "fill": fill,
+        "mean": mean,
+        "scale": scale,
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.asarray(max_depth, dtype=np.int32),
+    }
+
+
+def save_compiled(compiled: dict, path: str) -> None:
+    """Write atomically so a running app never loads a half-written file. The
+    temp file name is unique, so concurrent writers never clobber each other."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            np.savez(fh, **compiled)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CompiledForest:
+    """Drop-in replacement for the pipeline's `predict` built from compile_pipeline()."""
+
+    # Up to this many rows are walked tree by tree in plain Python, which beats
+    # NumPy's per-call overhead for single-site requests.
+    SCALAR_ROWS = 4
+
+    def __init__(self, arrays):
+        self.fill = np.asarray(arrays["fill"], dtype=np.float64)
+        self.mean = np.asarray(arrays["mean"], dtype=np.float64)
+        self.scale = np.asarray(arrays["scale"], dtype=np.float64)
+        left = np.asarray(arrays["left"])
+        right = np.asarray(arrays["right"])
+        self.feature = np.asarray(arrays["feature"])
+        self.threshold = np.asarray(arrays["threshold"])
+        self.value = np.asarray(arrays["value"])
+        self.roots = np.asarray(arrays["roots"])
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features_in_ = self.fill.shape[0]
+        # children[2 * node + go_right] -> next node
+        self.children = np.stack([left, right], axis=1).ravel()
+        # List copies for the scalar path
+        self._left = left.tolist()
+        self._right = right.tolist()
+        self._feature = self.feature.tolist()
+        self._threshold = self.threshold.tolist()
+        self._value = self.value.tolist()
+        self._roots = self.roots.tolist()
+        self._is_leaf = (left == np.arange(left.shape[0])).tolist()
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledForest":
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledForest":
+        return cls(compile_pipeline(pipeline))
+
+    def _transform(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, expected {self.n_features_in_}")
+        X = np.where(np.isnan(X), self.fill, X)
+        return ((X - self.mean) / self.scale).astype(np.float32)
+
+    def _predict_row(self, row) -> float:
+        left, right, feature, threshold = self._left, self._right, self._feature, self._threshold
+        is_leaf = self._is_leaf
+        total = 0.0
+        for node in self._roots:
+            while not is_leaf[node]:
+                node = left[node] if row[feature[node]] <= threshold[node] else right[node]
+            total += self._value[node]
+        return total / len(self._roots)
+
+    def predict(self, X) -> np.ndarray:
+        X = self._transform(X)
+        n_rows, n_features = X.shape
+        if n_rows <= self.SCALAR_ROWS:
+            return np.array([self._predict_row(row) for row in X.tolist()])
+
+        n_trees = self.roots.shape[0]
+        flat = X.ravel()
+        row_offset = np.repeat(np.arange(n_rows) * n_features, n_trees)
+        nodes = np.tile(self.roots, n_rows)
+        for _ in range(self.max_depth):
+            go_right = flat[row_offset + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+        # Sequential sum in tree order, as RandomForestRegressor accumulates
+        return self.value[nodes].reshape(n_rows, n_trees).cumsum(axis=1)[:, -1] / n_trees
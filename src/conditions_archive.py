@@ -0,0 +1,214 @@
+"""
+Columnar archive of the hourly Stormglass history.
+
+Hours from `stormglass_data` are copied into one partition per site and
+calendar month (UTC):
+
+    <STORMGLASS_ARCHIVE_DIR>/site=<lat>_<lon>/<YYYY-MM>/     .npy columns
+    <STORMGLASS_ARCHIVE_DIR>/site=<lat>_<lon>/<YYYY-MM>.parquet  (with pyarrow)
+
+Each partition holds `timestamp` (int64 epoch seconds, sorted) plus one
+float64 column per Stormglass field (see columnar.py). Readers pick
+partitions by site and month, memory-map only the requested columns and cut
+the time range by binary search on `timestamp`, so scanning years of hours
+never loads the SQLite table row by row.
+
+Archiving is idempotent: re-running merges hours into existing partitions.
+With a retention period, archived hours older than it are then deleted from
+SQLite, where only recent conditions are needed for serving:
+
+    python src/conditions_archive.py                     # archive everything
+    python src/conditions_archive.py --retention-days 90 # and prune SQLite
+"""
+import argparse
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import columnar, database_client
+except ImportError:
+    import columnar
+    import database_client
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.environ.get("STORMGLASS_ARCHIVE_DIR") or os.path.join(os.path.dirname(APP_ROOT), "data", "stormglass_archive")
+# Days of history kept in SQLite after archiving (0 keeps everything)
+RETENTION_DAYS = int(os.environ.get("STORMGLASS_RETENTION_DAYS", "0"))
+
+FIELDS = list(database_client.STORMGLASS_FIELDS)
+COLUMNS = ["timestamp"] + FIELDS
+DTYPES = {"timestamp": np.int64}
+
+# Coordinates as written by site_dir(): repr(float), which may use an exponent (1e-05)
+_COORD = r"-?[\d.]+(?:e[+-]?\d+)?"
+_SITE_RE = re.compile(rf"^site=({_COORD})_({_COORD})$")
+_MONTH_RE = re.compile(r"^(\d{4}-\d{2})(\.parquet)?$")
+
+
+def site_dir(lat, lon, root=ARCHIVE_DIR):
+    # repr keeps the exact stored coordinates, which are join keys downstream
+    return os.path.join(root, f"site={float(lat)!r}_{float(lon)!r}")
+
+
+def partition_path(lat, lon, month, fmt=columnar.DEFAULT_FORMAT, root=ARCHIVE_DIR):
+    name = f"{month}.parquet" if fmt == "parquet" else month
+    return os.path.join(site_dir(lat, lon, root), name)
+
+
+def to_epoch(values):
+    """ISO timestamps -> int64 epoch seconds (unparseable values become NaN)."""
+    parsed = pd.to_datetime(values, utc=True, errors="coerce", format="ISO8601")
+    return pd.Series(parsed.dt.as_unit("s").astype("int64"), index=parsed.index).where(parsed.notna())
+
+
+def _epoch(value):
+    """Datetime or ISO string (naive = UTC) -> epoch seconds; None stays None."""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.timestamp())
+
+
+def partitions(root=ARCHIVE_DIR):
+    """[(lat, lon, "YYYY-MM", path)] for every stored partition."""
+    found = []
+    if not os.path.isdir(root):
+        return found
+    for site in sorted(os.listdir(root)):
+        m = _SITE_RE.match(site)
+        if not m:
+            continue
+        for entry in sorted(os.listdir(os.path.join(root, site))):
+            mm = _MONTH_RE.match(entry)
+            if mm:
+                found.append((float(m.group(1)), float(m.group(2)), mm.group(1), os.path.join(root, site, entry)))
+    return found
+
+
+def _write_partition(path, rows, fmt):
+    """Merge `rows` (COLUMNS frame) into the partition at `path`, newest values winning."""
+    if os.path.exists(path):
+        existing = pd.DataFrame(columnar.read_columns(path, COLUMNS, mmap=False))
+        rows = pd.concat([existing, rows], ignore_index=True)
+    rows = rows.drop_duplicates("timestamp", keep="last").sort_values("timestamp")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with columnar.ColumnarWriter(path, COLUMNS, fmt=fmt, dtypes=DTYPES) as writer:
+        writer.write(rows)
+    return len(rows)
+
+
+def archive(until=None, root=ARCHIVE_DIR, fmt=columnar.DEFAULT_FORMAT):
+    """
+    Copy stored hours before `until` (ISO string, default: everything) into
+    the archive, one month of the table at a time. Returns the number of
+    hours read from SQLite.
+    """
+    where, params = "", []
+    if until is not None:
+        where, params = " WHERE timestamp < ?", [until]
+    with database_client.connection() as conn:
+        months = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT substr(timestamp, 1, 7) FROM stormglass_data{where} ORDER BY 1", params
+        ).fetchall()]
+    total = 0
+    for month in months:
+        clauses = ["timestamp LIKE ?"] + (["timestamp < ?"] if until is not None else [])
+        with database_client.connection() as conn:
+            sg = pd.read_sql_query(
+                f"SELECT lat, lon, timestamp, {', '.join(FIELDS)} FROM stormglass_data "
+                f"WHERE {' AND '.join(clauses)}",
+                conn,
+                params=[month + "%"] + params,
+            )
+        if sg.empty:
+            continue
+        sg["timestamp"] = to_epoch(sg["timestamp"])
+        sg = sg.dropna(subset=["timestamp"])
+        sg[FIELDS] = sg[FIELDS].apply(pd.to_numeric, errors="coerce")
+        for (lat, lon), rows in sg.groupby(["lat", "lon"]):
+            _write_partition(partition_path(lat, lon, month, fmt, root), rows[COLUMNS], fmt)
+        total += len(sg)
+    return total
+
+
+def _month_range(start, end):
+    """Inclusive "YYYY-MM" bounds for partition pruning (None = open)."""
+    lo = None if start is None else datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m")
+    hi = None if end is None else datetime.fromtimestamp(end, timezone.utc).strftime("%Y-%m")
+    return lo, hi
+
+
+def scan(lat=None, lon=None, start=None, end=None, columns=None, root=ARCHIVE_DIR, sites=None):
+    """
+    Yield one DataFrame per matching partition with `lat`, `lon`, `time`
+    (UTC) and the requested Stormglass columns (all if None). `start`/`end`
+    (datetimes or ISO strings, inclusive) and the site (`lat`/`lon`, or a
+    `sites` iterable of (lat, lon)) are pushed down to partition selection;
+    within a partition the time range is a slice of the memory-mapped columns.
+    """
+    columns = list(columns or FIELDS)
+    start, end = _epoch(start), _epoch(end)
+    lo, hi = _month_range(start, end)
+    keys = None
+    if lat is not None and lon is not None:
+        keys = {site_dir(lat, lon, root)}
+    elif sites is not None:
+        keys = {site_dir(s_lat, s_lon, root) for s_lat, s_lon in sites}
+    for p_lat, p_lon, month, path in partitions(root):
+        if keys is not None and os.path.dirname(path) not in keys:
+            continue
+        if (lo is not None and month < lo) or (hi is not None and month > hi):
+            continue
+        cols = columnar.read_columns(path, ["timestamp"] + columns)
+        ts = cols["timestamp"]
+        i = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        j = len(ts) if end is None else int(np.searchsorted(ts, end, side="right"))
+        if i >= j:
+            continue
+        frame = pd.DataFrame({c: cols[c][i:j] for c in columns})
+        frame.insert(0, "time", pd.to_datetime(np.asarray(ts[i:j]), unit="s", utc=True))
+        frame.insert(0, "lon", p_lon)
+        frame.insert(0, "lat", p_lat)
+        yield frame
+
+
+def read(lat=None, lon=None, start=None, end=None, columns=None, root=ARCHIVE_DIR, sites=None):
+    """All of scan() as one DataFrame (empty with the right columns if nothing matches)."""
+    frames = list(scan(lat, lon, start, end, columns, root, sites))
+    if not frames:
+        return pd.DataFrame(columns=["lat", "lon", "time"] + list(columns or FIELDS))
+    return pd.concat(frames, ignore_index=True)
+
+
+def prune(retention_days, now=None):
+    """Delete hours older than `retention_days` from SQLite; returns the row count."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=retention_days)).isoformat()
+    return database_client.delete_stormglass_before(cutoff)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Archive the Stormglass history into per-site monthly columnar files")
+    p.add_argument("--root", default=ARCHIVE_DIR, help="Archive directory")
+    p.add_argument("--format", choices=["npy", "parquet"], default=columnar.DEFAULT_FORMAT,
+                   help="Partition format (parquet needs pyarrow)")
+    p.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                   help="After archiving, delete hours older than this from SQLite (0 keeps everything)")
+    args = p.parse_args()
+
+    n = archive(root=args.root, fmt=args.format)
+    print(f"Archived {n} hour(s) into {len(partitions(args.root))} partition(s) under {args.root}")
+    if args.retention_days > 0:
+        deleted = prune(args.retention_days)
+        print(f"Deleted {deleted} hour(s) older than {args.retention_days} days from stormglass_data")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,13 +3,35 @@ Run:
     python src/data_generator.py --out data/visibility.csv --n 2000
     # Generate UK-specific distribution
     python src/data_generator.py --out data/visibility_uk.csv --n 2000 --region UK
+
+    # Stress-test dataset: 20M rows in 500k-row chunks on all cores, written as
+    # partitioned columnar files (part-00000, part-00001, ...) that
+    # train_model.py --data reads directly
+    python src/data_generator.py --out data/visibility_20m --n 20000000 --format npy
+    # Replace the parts of an earlier run in the same directory
+    python src/data_generator.py --out data/visibility_20m --n 1000000 --format npy --overwrite
 """
 import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 
+try:
+    from . import columnar
+except ImportError:
+    import columnar
+
+FEATURE_COLUMNS = ["swell_height", "swell_period", "wind_speed", "wind_dir", "tide_height", "turbidity", "chlorophyll"]
+PART_COLUMNS = FEATURE_COLUMNS + ["visibility", "region"]
+CHUNK_SIZE = 500000
+
 
 def generate_data(n=1000, seed=42, region="GLOBAL"):
+    """`seed` may be an int or a np.random.SeedSequence (one per chunk)."""
     rng = np.random.default_rng(seed)
     region = str(region).upper()
     # Environmental features (adjust simple ranges for UK coastal waters)
@@ -26,6 +48,9 @@ def generate_data(n=1000, seed=42, region="GLOBAL"):
         wind_dir = rng.uniform(0.0, 360.0, n)            # degrees
         tide_height = rng.uniform(-1.5, 2.5, n)          # meters
 
+    # Chlorophyll-a (mg/m3): right-skewed, with occasional plankton blooms
+    chlorophyll = rng.lognormal(0.0 if region == "UK" else -0.3, 0.6, n)
+
     # Derive turbidity (higher when wind strong or negative tide stirring sediments)
     turbidity = 1.0 + 0.15 * np.maximum(0, wind_speed - 5.0) + 0.5 * (tide_height < 0)
     turbidity += rng.normal(0, 0.2, n)
@@ -40,6 +65,7 @@ def generate_data(n=1000, seed=42, region="GLOBAL"):
         + 0.4 * swell_period
         - 0.1 * wind_speed
         - 0.8 * tide_height
+        - 1.5 * chlorophyll
     )
     visibility += rng.normal(0, 2.0, n)  # measurement noise
     visibility = np.clip(visibility, 0.5, 60.0)
@@ -51,22 +77,80 @@ def generate_data(n=1000, seed=42, region="GLOBAL"):
         "wind_dir": wind_dir,
         "tide_height": tide_height,
         "turbidity": turbidity,
+        "chlorophyll": chlorophyll,
         "visibility": visibility,
     })
     df["region"] = region
     return df
 
 
+def _generate_part(task):
+    index, n, seed, region, out_dir, fmt = task
+    df = generate_data(n, seed=seed, region=region)
+    name = f"part-{index:05d}" + (".parquet" if fmt == "parquet" else "")
+    # Fixed-width string column, so train_model.py --region can filter parts
+    dtypes = {"region": f"U{max(1, len(df['region'].iloc[0]))}"}
+    with columnar.ColumnarWriter(os.path.join(out_dir, name), PART_COLUMNS, fmt=fmt, dtypes=dtypes) as writer:
+        writer.write(df)
+    return n
+
+
+def _clear_dataset(out_dir, overwrite):
+    """Remove the parts of an earlier run in `out_dir` (FileExistsError unless `overwrite`)."""
+    if not os.path.isdir(out_dir):
+        return
+    stale = [e for e in os.listdir(out_dir) if e.startswith("part-") or e == "_dataset.json"]
+    if stale and not overwrite:
+        raise FileExistsError(f"{out_dir} already holds a generated dataset; pass overwrite=True (--overwrite) to replace it")
+    for entry in stale:
+        path = os.path.join(out_dir, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def generate_partitioned(out_dir, n, seed=42, region="GLOBAL", fmt="npy", chunk_size=CHUNK_SIZE, workers=None,
+                         overwrite=False):
+    """
+    Generate `n` rows as columnar parts of at most `chunk_size` rows, one
+    part per task on a process pool. Every part gets its own RNG stream
+    spawned from `seed`, so the output is reproducible for a given seed and
+    chunk size, and memory stays at about one chunk per worker. Parts left
+    in `out_dir` by an earlier run are refused, or removed with `overwrite`.
+    """
+    _clear_dataset(out_dir, overwrite)
+    n_parts = max(1, -(-n // chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(n_parts)
+    tasks = [(i, min(chunk_size, n - i * chunk_size), seeds[i], region, out_dir, fmt) for i in range(n_parts)]
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = sum(pool.map(_generate_part, tasks))
+    with open(os.path.join(out_dir, "_dataset.json"), "w", encoding="utf-8") as fh:
+        json.dump({"rows": rows, "parts": n_parts, "format": fmt, "seed": seed, "region": str(region).upper(),
+                   "columns": PART_COLUMNS}, fh, indent=2)
+    return rows
+
+
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--out", default="data/visibility.csv")
     p.add_argument("--n", type=int, default=2000)
     p.add_argument("--region", default="GLOBAL", help="Region label (e.g., GLOBAL or UK)")
     p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--format", choices=["csv", "npy", "parquet"], default="csv",
+                   help="csv (single file) or partitioned columnar output (parquet needs pyarrow)")
+    p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per part for columnar output")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes for columnar output (default: all cores)")
+    p.add_argument("--overwrite", action="store_true", help="Replace the parts of an earlier columnar run in --out")
     args = p.parse_args()
-    df = generate_data(args.n, seed=args.seed, region=args.region)
-    # ensure folder
-    import os
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    df.to_csv(args.out, index=False)
-    print(f"Wrote {len(df)} rows to {args.out} (region={args.region})")
+    if args.format != "csv":
+        rows = generate_partitioned(args.out, args.n, seed=args.seed, region=args.region, fmt=args.format,
+                                    chunk_size=args.chunk_size, workers=args.workers, overwrite=args.overwrite)
+        print(f"Wrote {rows} rows to {args.out} in {args.format} parts (region={args.region})")
+    else:
+        df = generate_data(args.n, seed=args.seed, region=args.region)
+        # ensure folder
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        df.to_csv(args.out, index=False)
+        print(f"Wrote {len(df)} rows to {args.out} (region={args.region})")
@@ -1,25 +1,95 @@
+import json
 import sqlite3
 import os
-from datetime import datetime
-from config import DB_PATH
-conn = sqlite3.connect(DB_PATH)
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(os.path.dirname(APP_ROOT), "data", "visibility.db")
+DB_PATH = os.environ.get("VISIBILITY_DB_PATH") or os.path.join(os.path.dirname(APP_ROOT), "data", "visibility.db")
 
+# Connection pool settings: idle connections kept for reuse, and how long a
+# writer/reader waits on a locked database before raising "database is locked".
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_S = float(os.environ.get("DB_BUSY_TIMEOUT", "5"))
+STATEMENT_CACHE_SIZE = 256
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _new_connection():
+    """Opens a connection configured for concurrent use (WAL, busy timeout)."""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_S,
+        check_same_thread=False,  # pooled connections move between worker threads
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a single writer commits
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_S * 1000)}")
     return conn
 
 
+def _ensure_initialized():
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if not _initialized:
+            initialize_db()
+            _initialized = True
+
+
+@contextmanager
+def connection():
+    """
+    Borrows a pooled connection for the duration of the block.
+    Commits on success and rolls back on error; the connection is returned to
+    the pool (its prepared-statement cache stays warm) instead of being closed.
+    """
+    _ensure_initialized()
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _new_connection()
+    try:
+        with conn:
+            yield conn
+    finally:
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def close_pool():
+    """Closes all idle pooled connections (e.g. before deleting the DB file)."""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def get_db_connection():
+    """Opens a standalone connection to the SQLite database; the caller must close it.
+    Prefer `connection()` for short queries so connections are reused."""
+    _ensure_initialized()
+    return _new_connection()
+
+
 def initialize_db():
     """Initializes the database and creates the stormglass_data table if it doesn't exist."""
-    conn = get_db_connection()
+    conn = _new_connection()
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS stormglass_data (
@@ -63,86 +133,503 @@ def initialize_db():
     for col_name, col_type in new_columns.items():
         if col_name not in existing_columns:
             cursor.execute(f"ALTER TABLE stormglass_data ADD COLUMN {col_name} {col_type}")
-    
+
+    # Dive log (replaces data/dives.json). Measurement columns are untyped so
+    # values round-trip exactly as the UI/API sent them (numbers or strings).
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dive_log (
+            id TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            date TEXT,
+            depth,
+            notes TEXT,
+            tide_height,
+            breath_hold_time,
+            visibility,
+            water_temp,
+            outside_temp,
+            created_at TEXT,
+            updated_at TEXT
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dive_log_date ON dive_log(date)")
+    # Date filters compare datetime(date): dates in any ISO spelling, offsets converted to UTC
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dive_log_datetime ON dive_log(datetime(date))")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dive_log_lat_lon ON dive_log(lat, lon)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    # Same layout as add_site_coords.py; used to resolve ?site= filters
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site_name TEXT UNIQUE,
+            lat REAL,
+            lon REAL
+        );
+    """)
+
+    _create_spatial_index(cursor)
+
+    # Change counter for the dive log, bumped by triggers on every write so
+    # GET /dives can answer If-None-Match without reading the log. The epoch
+    # changes when the database is recreated, so old ETags never match.
+    cursor.execute(
+        "INSERT OR IGNORE INTO store_meta (key, value) VALUES ('dive_log_epoch', ?)",
+        (uuid.uuid4().hex[:12],),
+    )
+    cursor.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('dive_log_version', '0')")
+    # Same for sites, which ?site= filters and /dives/clusters responses depend on
+    cursor.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('sites_version', '0')")
+    for table in ("dive_log", "sites"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            name = "dive_log_version" if table == "dive_log" else "sites_version"
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE store_meta SET value = CAST(value AS INTEGER) + 1
+                    WHERE key = '{name}';
+                END
+            """)
+
     conn.commit()
     conn.close()
 
 
-def save_stormglass_data(lat, lon, data):
-    """Saves a single record of stormglass data to the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# R*Tree indexes over dive and site coordinates, keyed by the rowid of the
+# indexed row and kept in sync by triggers. Points are stored as zero-size boxes.
+SPATIAL_TABLES = {"dive_log": "dive_log_rtree", "sites": "sites_rtree"}
+HAS_RTREE = True
 
-    # data['hours'][0] contains the relevant data
-    hour_data = data.get("hours", [{}])[0]
-    
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "timestamp": hour_data.get("time"),
-        "air_temperature": hour_data.get("airTemperature", {}).get("sg"),
-        "cloud_cover": hour_data.get("cloudCover", {}).get("sg"),
-        "rain": hour_data.get("rain", {}).get("sg"),
-        "swell_direction": hour_data.get("swellDirection", {}).get("sg"),
-        "swell_height": hour_data.get("swellHeight", {}).get("sg"),
-        "swell_period": hour_data.get("swellPeriod", {}).get("sg"),
-        "water_temperature": hour_data.get("waterTemperature", {}).get("sg"),
-        "wave_direction": hour_data.get("waveDirection", {}).get("sg"),
-        "wave_height": hour_data.get("waveHeight", {}).get("sg"),
-        "wave_period": hour_data.get("wavePeriod", {}).get("sg"),
-        "wind_speed": hour_data.get("windSpeed", {}).get("sg"),
-        "wind_direction": hour_data.get("windDirection", {}).get("sg"),
-        "tide_height": hour_data.get("seaLevel", {}).get("sg"),
-        "chlorophyll": hour_data.get("chlorophyll", {}).get("sg"),
-    }
 
-    try:
-        cursor.execute("""
-            INSERT INTO stormglass_data (
-                lat, lon, timestamp, air_temperature, cloud_cover, rain, swell_direction,
-                swell_height, swell_period, water_temperature, wave_direction, wave_height,
-                wave_period, wind_speed, wind_direction, tide_height, chlorophyll
-            ) VALUES (
-                :lat, :lon, :timestamp, :air_temperature, :cloud_cover, :rain, :swell_direction,
-                :swell_height, :swell_period, :water_temperature, :wave_direction, :wave_height,
-                :wave_period, :wind_speed, :wind_direction, :tide_height, :chlorophyll
+def _create_spatial_index(cursor):
+    """Creates/backfills the R*Tree tables; falls back to the (lat, lon) B-tree if
+    this SQLite build lacks the rtree module."""
+    global HAS_RTREE
+    for table, rtree in SPATIAL_TABLES.items():
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
             )
-        """, params)
-        conn.commit()
-    except sqlite3.IntegrityError:
-        # This will happen if a record for the same lat, lon, and timestamp already exists.
-        # We can ignore it.
-        pass
-    finally:
-        conn.close()
+        except sqlite3.OperationalError as e:
+            print(f"Warning: SQLite R*Tree unavailable, using B-tree lat/lon index: {e}")
+            HAS_RTREE = False
+            return
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table}
+            WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO {rtree} VALUES (NEW.rowid, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {rtree}_update AFTER UPDATE OF lat, lon ON {table}
+            BEGIN
+                DELETE FROM {rtree} WHERE id = OLD.rowid;
+                INSERT INTO {rtree} SELECT NEW.rowid, NEW.lat, NEW.lat, NEW.lon, NEW.lon
+                WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM {rtree} WHERE id = OLD.rowid;
+            END
+        """)
+        # Rows written before the index existed
+        cursor.execute(f"""
+            INSERT INTO {rtree}
+            SELECT rowid, lat, lat, lon, lon FROM {table}
+            WHERE lat IS NOT NULL AND lon IS NOT NULL
+              AND rowid NOT IN (SELECT id FROM {rtree})
+        """)
+
+
+def _bbox_join(table, bbox):
+    """FROM/WHERE fragment and params selecting rows of `table` inside
+    bbox = (min_lon, min_lat, max_lon, max_lat)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if HAS_RTREE:
+        rtree = SPATIAL_TABLES[table]
+        # R*Tree boxes are float32 rounded outward, so points on the bbox edge
+        # only overlap it; the exact test on the base table does the filtering
+        return (
+            f"{table} AS t JOIN {rtree} AS r ON r.id = t.rowid "
+            "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ? "
+            "AND t.lat BETWEEN ? AND ? AND t.lon BETWEEN ? AND ?",
+            [min_lat, max_lat, min_lon, max_lon] * 2,
+        )
+    return (
+        f"{table} AS t WHERE t.lat BETWEEN ? AND ? AND t.lon BETWEEN ? AND ?",
+        [min_lat, max_lat, min_lon, max_lon],
+    )
+
+
+def dive_points_in_bbox(bbox):
+    """
+    Coordinates and numeric visibility (None when missing) of every dive inside
+    bbox = (min_lon, min_lat, max_lon, max_lat), as (ids, lats, lons, visibilities).
+    """
+    source, params = _bbox_join("dive_log", bbox)
+    sql = f"""
+        SELECT t.id, t.lat, t.lon,
+               CASE WHEN t.visibility IS NULL OR TRIM(t.visibility) = '' THEN NULL
+                    ELSE CAST(t.visibility AS REAL) END
+        FROM {source}
+    """
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    if not rows:
+        return [], [], [], []
+    ids, lats, lons, vis = zip(*rows)
+    return list(ids), list(lats), list(lons), list(vis)
+
+
+def sites_in_bbox(bbox):
+    """Known sites inside bbox = (min_lon, min_lat, max_lon, max_lat)."""
+    source, params = _bbox_join("sites", bbox)
+    with connection() as conn:
+        rows = conn.execute(f"SELECT t.site_name, t.lat, t.lon FROM {source}", params).fetchall()
+    return [dict(r) for r in rows]
+
+
+# stormglass_data column -> Stormglass response parameter
+STORMGLASS_FIELDS = {
+    "air_temperature": "airTemperature",
+    "cloud_cover": "cloudCover",
+    "rain": "rain",
+    "swell_direction": "swellDirection",
+    "swell_height": "swellHeight",
+    "swell_period": "swellPeriod",
+    "water_temperature": "waterTemperature",
+    "wave_direction": "waveDirection",
+    "wave_height": "waveHeight",
+    "wave_period": "wavePeriod",
+    "wind_speed": "windSpeed",
+    "wind_direction": "windDirection",
+    "tide_height": "seaLevel",
+    "chlorophyll": "chlorophyll",
+}
+
+# Re-received hours overwrite stored values, except where the new response
+# lacks a value (e.g. chlorophyll comes from the separate bio endpoint).
+_UPSERT_STORMGLASS_SQL = f"""
+    INSERT INTO stormglass_data (lat, lon, timestamp, {', '.join(STORMGLASS_FIELDS)})
+    VALUES (:lat, :lon, :timestamp, {', '.join(':' + c for c in STORMGLASS_FIELDS)})
+    ON CONFLICT(lat, lon, timestamp) DO UPDATE SET
+        {', '.join(f"{c} = COALESCE(excluded.{c}, {c})" for c in STORMGLASS_FIELDS)}
+"""
+
+
+def _stormglass_row(lat, lon, hour_data):
+    row = {"lat": lat, "lon": lon, "timestamp": hour_data.get("time")}
+    for column, param in STORMGLASS_FIELDS.items():
+        row[column] = (hour_data.get(param) or {}).get("sg")
+    return row
+
+
+def save_stormglass_data(lat, lon, data):
+    """
+    Upserts every hour of a Stormglass response in a single transaction.
+    Returns the number of hours written.
+    """
+    rows = [_stormglass_row(lat, lon, h) for h in (data or {}).get("hours") or [] if h.get("time")]
+    if rows:
+        with connection() as conn:
+            conn.executemany(_UPSERT_STORMGLASS_SQL, rows)
+    return len(rows)
 
 def update_chlorophyll(lat, lon, timestamp, chlorophyll_value):
     """Updates the chlorophyll value for an existing record."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
+    with connection() as conn:
+        conn.execute("""
             UPDATE stormglass_data
             SET chlorophyll = ?
             WHERE lat = ? AND lon = ? AND timestamp = ?
         """, (chlorophyll_value, lat, lon, timestamp))
-        conn.commit()
-    finally:
-        conn.close()
 
 def get_latest_stormglass_data(lat, lon):
-    """Retrieves the most recent stormglass data record for a given lat/lon."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT * FROM stormglass_data
-        WHERE lat = ? AND lon = ?
-        ORDER BY timestamp DESC
-        LIMIT 1
-    """, (lat, lon))
-    record = cursor.fetchone()
-    conn.close()
-    return record
+    """
+    Retrieves the most recent stormglass record for a given lat/lon as a dict:
+    the latest hour not in the future, or the earliest stored forecast hour
+    if every stored hour is ahead of now.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT * FROM stormglass_data
+            WHERE lat = ? AND lon = ? AND timestamp <= ?
+            ORDER BY timestamp DESC
+            LIMIT 1
+        """, (lat, lon, now)).fetchone()
+        if row is None:
+            row = conn.execute("""
+                SELECT * FROM stormglass_data
+                WHERE lat = ? AND lon = ?
+                ORDER BY timestamp ASC
+                LIMIT 1
+            """, (lat, lon)).fetchone()
+    return dict(row) if row else None
+
+
+def get_stormglass_hour(lat, lon, timestamp):
+    """Returns the stored record for one exact hour as a dict, or None."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM stormglass_data WHERE lat = ? AND lon = ? AND timestamp = ?",
+            (lat, lon, timestamp),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def get_stormglass_window(lat, lon, start, end):
+    """Returns the stored records for one location with start <= timestamp <= end
+    (ISO strings in the stored format), oldest first."""
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM stormglass_data WHERE lat = ? AND lon = ? AND timestamp BETWEEN ? AND ? "
+            "ORDER BY timestamp",
+            (lat, lon, start, end),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def delete_stormglass_before(timestamp):
+    """Deletes stored hours older than the ISO `timestamp`; returns the row count."""
+    with connection() as conn:
+        return conn.execute("DELETE FROM stormglass_data WHERE timestamp < ?", (timestamp,)).rowcount
+
+
+DIVE_COLUMNS = [
+    "id", "lat", "lon", "date", "depth", "notes", "tide_height", "breath_hold_time",
+    "visibility", "water_temp", "outside_temp", "created_at", "updated_at",
+]
+# Fields a client may change through update_dive()
+DIVE_UPDATABLE_COLUMNS = [c for c in DIVE_COLUMNS if c not in ("id", "created_at")]
+
+_INSERT_DIVE_SQL = (
+    f"INSERT INTO dive_log ({', '.join(DIVE_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in DIVE_COLUMNS)})"
+)
+
+
+def _dive_params(dive):
+    return {c: dive.get(c) for c in DIVE_COLUMNS}
+
+
+def insert_dive(dive):
+    """Inserts a single dive (dict with at least id, lat, lon)."""
+    with connection() as conn:
+        conn.execute(_INSERT_DIVE_SQL, _dive_params(dive))
+
+
+def insert_dives(dives):
+    """Inserts many dives in a single transaction."""
+    with connection() as conn:
+        conn.executemany(_INSERT_DIVE_SQL, [_dive_params(d) for d in dives])
+
+
+def get_dive(dive_id):
+    """Returns a dive as a dict, or None if it does not exist (primary-key lookup)."""
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM dive_log WHERE id = ?", (dive_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_dives():
+    """Returns all dives in insertion order."""
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM dive_log ORDER BY rowid").fetchall()
+    return [dict(r) for r in rows]
+
+
+def dive_log_version(include_sites=False):
+    """Opaque token that changes whenever any dive (and, with include_sites, any
+    site) is inserted, updated or deleted."""
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT key, value FROM store_meta WHERE key IN ('dive_log_epoch', 'dive_log_version', 'sites_version')"
+        ).fetchall()
+    meta = {r["key"]: r["value"] for r in rows}
+    version = f"{meta.get('dive_log_epoch', '')}-{meta.get('dive_log_version', '0')}"
+    if include_sites:
+        version += f"-{meta.get('sites_version', '0')}"
+    return version
+
+
+def list_sites():
+    """Returns every known site (site_name, lat, lon) in insertion order."""
+    with connection() as conn:
+        rows = conn.execute("SELECT site_name, lat, lon FROM sites ORDER BY id").fetchall()
+    return [dict(r) for r in rows]
+
+
+def add_sites(sites):
+    """Inserts (site_name, lat, lon) tuples, ignoring names that already exist."""
+    with connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO sites (site_name, lat, lon) VALUES (?, ?, ?)", sites)
+
+
+def get_site(name):
+    """Returns a known site (site_name, lat, lon) by case-insensitive name, or None."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT site_name, lat, lon FROM sites WHERE site_name = ? COLLATE NOCASE",
+            (name,),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def _sql_datetime(value):
+    """Aware datetime -> UTC "YYYY-MM-DD HH:MM:SS", the format of SQLite's datetime()."""
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def query_dives(fields=None, after=None, limit=None, date_from=None, date_to=None,
+                bbox=None, min_visibility=None, max_visibility=None):
+    """
+    Returns (dives, next_cursor) in insertion order, filtered in SQL.
+
+    fields: columns to return (default all); `after`: rowid cursor from a
+    previous page; bbox: (min_lon, min_lat, max_lon, max_lat), served by
+    idx_dive_log_lat_lon; date_from/date_to: inclusive aware datetimes,
+    compared in UTC with datetime(date) (naive dive dates count as UTC) and
+    served by idx_dive_log_datetime. Rows without a visibility are excluded
+    by the visibility bounds.
+    next_cursor is None on the last page.
+    """
+    columns = [c for c in (fields or DIVE_COLUMNS) if c in DIVE_COLUMNS] or DIVE_COLUMNS
+    where, params = [], []
+    if after is not None:
+        where.append("rowid > ?")
+        params.append(int(after))
+    if date_from:
+        where.append("datetime(date) >= ?")
+        params.append(_sql_datetime(date_from))
+    if date_to:
+        where.append("datetime(date) <= ?")
+        params.append(_sql_datetime(date_to))
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        where.append("lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?")
+        params.extend([min_lat, max_lat, min_lon, max_lon])
+    if min_visibility is not None or max_visibility is not None:
+        where.append("visibility IS NOT NULL AND TRIM(visibility) <> ''")
+    if min_visibility is not None:
+        where.append("CAST(visibility AS REAL) >= ?")
+        params.append(float(min_visibility))
+    if max_visibility is not None:
+        where.append("CAST(visibility AS REAL) <= ?")
+        params.append(float(max_visibility))
+
+    sql = f"SELECT rowid AS _rowid, {', '.join(columns)} FROM dive_log"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY rowid"
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        sql += " LIMIT ?"
+        params.append(int(limit) + 1)
+
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1]["_rowid"])
+    dives = [{c: r[c] for c in columns} for r in rows]
+    return dives, next_cursor
+
+
+def iter_dives_by_time(limit, fields=None):
+    """
+    Yields lists of at most `limit` dives ordered by datetime(date) (UTC) and
+    rowid, paged on idx_dive_log_datetime, so each page covers a narrow time
+    range however the dives were inserted. Dives whose date SQLite cannot
+    parse follow in insertion order.
+    """
+    columns = [c for c in (fields or DIVE_COLUMNS) if c in DIVE_COLUMNS] or DIVE_COLUMNS
+    select = f"SELECT rowid AS _rowid, datetime(date) AS _datetime, {', '.join(columns)} FROM dive_log"
+    last = None
+    while True:
+        with connection() as conn:
+            if last is None:
+                rows = conn.execute(
+                    f"{select} WHERE datetime(date) IS NOT NULL ORDER BY datetime(date), rowid LIMIT ?",
+                    (int(limit),),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"{select} WHERE datetime(date) >= ? AND (datetime(date), rowid) > (?, ?) "
+                    "ORDER BY datetime(date), rowid LIMIT ?",
+                    (last[0], *last, int(limit)),
+                ).fetchall()
+        if not rows:
+            break
+        yield [{c: r[c] for c in columns} for r in rows]
+        last = (rows[-1]["_datetime"], rows[-1]["_rowid"])
+
+    after = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(
+                f"{select} WHERE datetime(date) IS NULL AND rowid > ? ORDER BY rowid LIMIT ?",
+                (after, int(limit)),
+            ).fetchall()
+        if not rows:
+            break
+        yield [{c: r[c] for c in columns} for r in rows]
+        after = rows[-1]["_rowid"]
+
+
+def update_dive(dive_id, fields):
+    """
+    Updates the given columns of one dive in a single statement and returns the
+    updated dive, or None if the id does not exist. Unknown keys are ignored.
+    """
+    fields = {k: v for k, v in fields.items() if k in DIVE_UPDATABLE_COLUMNS}
+    with connection() as conn:
+        if fields:
+            assignments = ", ".join(f"{k} = :{k}" for k in fields)
+            cursor = conn.execute(
+                f"UPDATE dive_log SET {assignments} WHERE id = :_id",
+                {**fields, "_id": dive_id},
+            )
+            if cursor.rowcount == 0:
+                return None
+        row = conn.execute("SELECT * FROM dive_log WHERE id = ?", (dive_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def migrate_dives_from_json(path):
+    """
+    One-shot import of the legacy dives.json log into dive_log. Runs once per
+    database (recorded in store_meta); the JSON file itself is left untouched.
+    Returns the number of dives imported.
+    """
+    with connection() as conn:
+        done = conn.execute(
+            "SELECT value FROM store_meta WHERE key = 'dives_json_migrated'"
+        ).fetchone()
+        if done:
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                dives = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            dives = []
+        rows = [_dive_params(d) for d in dives if d.get("id") and d.get("lat") is not None and d.get("lon") is not None]
+        conn.executemany(_INSERT_DIVE_SQL.replace("INSERT", "INSERT OR IGNORE", 1), rows)
+        conn.execute(
+            "INSERT INTO store_meta (key, value) VALUES ('dives_json_migrated', ?)",
+            (datetime.utcnow().isoformat(),),
+        )
+    return len(rows)
 
-# Initialize the database when this module is loaded
-initialize_db()
+# The schema is created/migrated lazily on first use (see `connection()`).
@@ -0,0 +1,106 @@
+"""
+Grid clustering of dive points for the map viewport.
+
+Points are projected to Web Mercator pixel coordinates at the requested zoom
+(256 px tiles, as Leaflet uses) and grouped into square cells of
+CLUSTER_PX pixels, so clusters keep a constant on-screen size at every
+zoom level. Each cluster carries its centroid, bounds and aggregated
+visibility statistics; from MAX_CLUSTER_ZOOM on, every dive is returned as
+its own point.
+
+Usage:
+    clusters = cluster_points(ids, lats, lons, visibilities, zoom=12)
+"""
+import numpy as np
+
+TILE_SIZE = 256
+CLUSTER_PX = 60
+MAX_CLUSTER_ZOOM = 17
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_pixels(lats, lons, zoom):
+    """Global pixel coordinates (x, y) of lat/lon arrays at `zoom`."""
+    world = TILE_SIZE * 2.0 ** zoom
+    lat = np.radians(np.clip(lats, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (np.asarray(lons) + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * world
+    return x, y
+
+
+def _round(value, digits=3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def cluster_points(ids, lats, lons, visibilities, zoom):
+    """
+    Group points into on-screen clusters at `zoom`.
+
+    visibilities may contain None for dives without a reading; they count
+    towards `count` but not towards the visibility statistics. Returns a list
+    of dicts sorted by descending count; single-dive clusters include its `id`.
+    """
+    if len(ids) == 0:
+        return []
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    vis = np.array([np.nan if v is None else v for v in visibilities], dtype=np.float64)
+
+    if zoom >= MAX_CLUSTER_ZOOM:
+        # Every dive is its own cluster
+        inverse = np.arange(len(ids))
+        n_clusters = len(ids)
+    else:
+        x, y = mercator_pixels(lats, lons, zoom)
+        cells = np.stack([np.floor(x / CLUSTER_PX), np.floor(y / CLUSTER_PX)], axis=1).astype(np.int64)
+        _, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        n_clusters = int(inverse.max()) + 1
+
+    count = np.bincount(inverse, minlength=n_clusters)
+    lat_mean = np.bincount(inverse, weights=lats, minlength=n_clusters) / count
+    lon_mean = np.bincount(inverse, weights=lons, minlength=n_clusters) / count
+
+    has_vis = ~np.isnan(vis)
+    vis_count = np.bincount(inverse, weights=has_vis, minlength=n_clusters)
+    vis_sum = np.bincount(inverse, weights=np.where(has_vis, vis, 0.0), minlength=n_clusters)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vis_mean = vis_sum / vis_count
+    vis_min = np.full(n_clusters, np.inf)
+    vis_max = np.full(n_clusters, -np.inf)
+    np.minimum.at(vis_min, inverse[has_vis], vis[has_vis])
+    np.maximum.at(vis_max, inverse[has_vis], vis[has_vis])
+
+    lat_min = np.full(n_clusters, np.inf)
+    lat_max = np.full(n_clusters, -np.inf)
+    lon_min = np.full(n_clusters, np.inf)
+    lon_max = np.full(n_clusters, -np.inf)
+    np.minimum.at(lat_min, inverse, lats)
+    np.maximum.at(lat_max, inverse, lats)
+    np.minimum.at(lon_min, inverse, lons)
+    np.maximum.at(lon_max, inverse, lons)
+
+    # Representative dive id for single-dive clusters
+    first = np.full(n_clusters, -1)
+    first[inverse[::-1]] = np.arange(len(ids))[::-1]
+
+    clusters = []
+    for c in np.argsort(-count, kind="stable"):
+        has = vis_count[c] > 0
+        cluster = {
+            "count": int(count[c]),
+            "lat": round(float(lat_mean[c]), 6),
+            "lon": round(float(lon_mean[c]), 6),
+            "bounds": [round(float(lon_min[c]), 6), round(float(lat_min[c]), 6),
+                       round(float(lon_max[c]), 6), round(float(lat_max[c]), 6)],
+            "visibility": {
+                "count": int(vis_count[c]),
+                "mean": _round(vis_mean[c]) if has else None,
+                "min": _round(vis_min[c]) if has else None,
+                "max": _round(vis_max[c]) if has else None,
+            },
+        }
+        if count[c] == 1:
+            cluster["id"] = ids[first[c]]
+        clusters.append(cluster)
+    return clusters
@@ -9,10 +9,26 @@ import sys
 import argparse
 import csv
 from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
 try:
-    from . import database_client
+    from . import columnar, conditions_archive, database_client, features
 except ImportError:
+    import columnar
+    import conditions_archive
     import database_client
+    import features
+
+FIELDNAMES = ['swell_height', 'swell_period', 'wind_speed', 'wind_dir', 'tide_height', 'turbidity', 'chlorophyll', 'visibility']
+# stormglass_data column of each model feature (turbidity is estimated)
+CONDITION_COLUMNS = {
+    'swell_height': 'swell_height',
+    'swell_period': 'swell_period',
+    'wind_speed': 'wind_speed',
+    'wind_dir': 'wind_direction',
+    'tide_height': 'tide_height',
+    'chlorophyll': 'chlorophyll',
+}
 
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(os.path.dirname(APP_ROOT), "data")
@@ -20,12 +36,9 @@ DIVE_FILE = os.path.join(DATA_DIR, "dives.json")
 
 
 def load_dives():
-    """Load dive data from JSON file."""
-    try:
-        with open(DIVE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    """Load dive data from the SQLite dive store (importing legacy dives.json once)."""
+    database_client.migrate_dives_from_json(DIVE_FILE)
+    return database_client.list_dives()
 
 
 def get_closest_stormglass_data(lat, lon, timestamp_str):
@@ -102,23 +115,11 @@ def export_training_data(output_file):
         sg_record = get_closest_stormglass_data(lat, lon, date)
         
         if sg_record:
-            # Use actual Stormglass data
-            wind_speed = sg_record['wind_speed'] or 5.0
-            tide = sg_record['tide_height'] or 0.0
-            turbidity = 1.0 + 0.15 * max(0, wind_speed - 5.0) + (0.5 if tide < 0 else 0)
-            turbidity = min(10.0, max(0.2, turbidity))
-            chlorophyll = sg_record['chlorophyll'] or 0.5
-            
-            row = {
-                'swell_height': sg_record['swell_height'] or 1.0,
-                'swell_period': sg_record['swell_period'] or 10.0,
-                'wind_speed': wind_speed,
-                'wind_dir': sg_record['wind_direction'] or 180.0,
-                'tide_height': tide,
-                'turbidity': turbidity,
-                'chlorophyll': chlorophyll,
-                'visibility': vis_value
-            }
+            # Use actual Stormglass data, with the serving defaults for gaps
+            conditions = {name: np.array([sg_record[col]], dtype=float) for name, col in CONDITION_COLUMNS.items()}
+            X, _ = features.build_matrix(conditions, 1, required=())
+            row = {name: float(value) for name, value in zip(features.FEATURES, X[0])}
+            row['visibility'] = vis_value
             training_data.append(row)
         else:
             # Use estimated values based on dive conditions
@@ -172,8 +173,7 @@ def export_training_data(output_file):
     
     # Write to CSV
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['swell_height', 'swell_period', 'wind_speed', 'wind_dir', 'tide_height', 'turbidity', 'chlorophyll', 'visibility']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
         writer.writerows(training_data)
     
@@ -181,6 +181,192 @@ def export_training_data(output_file):
     return len(training_data)
 
 
+def _to_utc(values):
+    """Parse ISO timestamps (dates, naive or offset datetimes) as UTC; invalid -> NaT."""
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors="coerce", format="mixed")
+    # Inferred resolution depends on the inputs; merge_asof needs matching units
+    return parsed.dt.as_unit("us")
+
+
+def load_stormglass_history(start=None, end=None, sites=None):
+    """
+    Load stormglass_data as a DataFrame with parsed times: the whole table, or
+    only hours between the optional aware `start`/`end` datetimes. Hours
+    pruned from SQLite are read back from the columnar archive
+    (conditions_archive.py), limited to the `sites` ((lat, lon) pairs) if
+    given; stored rows win where both have an hour.
+    """
+    sql = """
+        SELECT lat, lon, timestamp, swell_height, swell_period, wind_speed,
+               wind_direction, tide_height, chlorophyll
+        FROM stormglass_data
+    """
+    params = []
+    if start is not None and end is not None:
+        # Stored timestamps may use any offset or spelling ("Z", "+00:00", " "),
+        # so the text range is widened to whole days around the window (every
+        # spelling starts with its local date) and cut exactly once parsed
+        sql += " WHERE timestamp >= ? AND timestamp < ?"
+        params = [(start - timedelta(days=1)).strftime("%Y-%m-%d"), (end + timedelta(days=2)).strftime("%Y-%m-%d")]
+    with database_client.connection() as conn:
+        sg = pd.read_sql_query(sql, conn, params=params)
+    # Keep join keys numeric even when the table is empty
+    sg = sg.astype({"lat": float, "lon": float})
+    sg["time"] = _to_utc(sg["timestamp"])
+    sg = sg.dropna(subset=["time"])
+    if start is not None and end is not None:
+        sg = sg[sg["time"].between(pd.Timestamp(start), pd.Timestamp(end))]
+
+    columns = [c for c in sg.columns if c not in ("lat", "lon", "timestamp", "time")]
+    archived = conditions_archive.read(start=start, end=end, columns=columns, sites=sites)
+    if archived.empty:
+        return sg
+    archived["time"] = archived["time"].dt.as_unit("us")
+    sg = pd.concat([sg.drop(columns=["timestamp"]), archived], ignore_index=True)
+    return sg.drop_duplicates(["lat", "lon", "time"], keep="first")
+
+
+def join_dives_to_conditions(dives_df, sg_df, tolerance_hours=6):
+    """
+    Attach the nearest Stormglass record (same lat/lon, within +/- tolerance) to
+    every dive with a single sorted merge instead of one SQL query per dive.
+    Unmatched dives keep NaN condition columns and `matched == False`.
+    """
+    dives_df = dives_df.copy()
+    dives_df["_order"] = np.arange(len(dives_df))
+    sg_df = sg_df.drop(columns=["timestamp"], errors="ignore").copy()
+    sg_df["matched"] = True
+    merged = pd.merge_asof(
+        dives_df.sort_values("time"),
+        sg_df.sort_values("time"),
+        on="time",
+        by=["lat", "lon"],
+        direction="nearest",
+        tolerance=pd.Timedelta(hours=tolerance_hours),
+    )
+    merged["matched"] = merged["matched"].eq(True)
+    return merged.sort_values("_order").drop(columns="_order").reset_index(drop=True)
+
+
+def build_training_frame(merged):
+    """Vectorized equivalent of the per-dive feature rules in export_training_data()."""
+    matched = merged["matched"].to_numpy()
+    vis = merged["visibility"].to_numpy(dtype=float)
+
+    # Matched rows: Stormglass conditions through the shared feature builder
+    conditions = {name: merged[col].astype(float).to_numpy() for name, col in CONDITION_COLUMNS.items()}
+    X, _ = features.build_matrix(conditions, len(merged), required=())
+    X = {name: X[:, j] for j, name in enumerate(features.FEATURES)}
+
+    # Unmatched rows: estimate conditions from the observed visibility band
+    bands = [vis >= 8, vis >= 5]
+    est_swell = np.select(bands, [0.5, 1.0], 1.5)
+    est_wind = np.select(bands, [3.0, 5.0], 8.0)
+    est_turbidity = np.select(bands, [0.5, 1.5], 3.0)
+    est_chlorophyll = np.select(bands, [0.3, 0.8], 2.0)
+    est_tide = pd.to_numeric(merged["dive_tide_height"], errors="coerce").fillna(0.0).to_numpy()
+
+    return pd.DataFrame({
+        'swell_height': np.where(matched, X['swell_height'], est_swell),
+        'swell_period': np.where(matched, X['swell_period'], 10.0),
+        'wind_speed': np.where(matched, X['wind_speed'], est_wind),
+        'wind_dir': np.where(matched, X['wind_dir'], 180.0),
+        'tide_height': np.where(matched, X['tide_height'], est_tide),
+        'turbidity': np.where(matched, X['turbidity'], est_turbidity),
+        'chlorophyll': np.where(matched, X['chlorophyll'], est_chlorophyll),
+        'visibility': vis,
+    }, columns=FIELDNAMES)
+
+
+def _prepare_dives(records):
+    """Dive records -> frame of dives with a usable lat/lon, time and visibility."""
+    dives = pd.DataFrame(records, columns=database_client.DIVE_COLUMNS)
+    dives = dives.rename(columns={"tide_height": "dive_tide_height"})
+    dives["visibility"] = pd.to_numeric(dives["visibility"], errors="coerce")
+    dives["lat"] = pd.to_numeric(dives["lat"], errors="coerce")
+    dives["lon"] = pd.to_numeric(dives["lon"], errors="coerce")
+    dives["time"] = _to_utc(dives["date"])
+    dives = dives.dropna(subset=["lat", "lon", "time", "visibility"])
+    return dives[["lat", "lon", "time", "visibility", "dive_tide_height"]]
+
+
+def _history_for(dives, tolerance_hours):
+    """Condition history covering `dives`: their time range plus the join
+    tolerance, and (from the archive) only their locations."""
+    tolerance = pd.Timedelta(hours=tolerance_hours)
+    sites = set(zip(dives["lat"], dives["lon"]))
+    return load_stormglass_history(dives["time"].min() - tolerance, dives["time"].max() + tolerance, sites)
+
+
+def build_dive_training_frame(tolerance_hours=6):
+    """
+    Training rows (FIELDNAMES columns) for every dive with a visibility, joined
+    to the nearest Stormglass conditions. Returns (frame, estimated_count);
+    the frame is empty when no dive has a visibility.
+    """
+    dives = _prepare_dives(load_dives())
+    if dives.empty:
+        return pd.DataFrame(columns=FIELDNAMES), 0
+
+    merged = join_dives_to_conditions(dives, _history_for(dives, tolerance_hours), tolerance_hours)
+    return build_training_frame(merged), int((~merged["matched"]).sum())
+
+
+def export_training_data_bulk(output_file, tolerance_hours=6):
+    """
+    Bulk export: load dives and condition history once and join them with a
+    nearest-time merge per location. Produces the same columns as
+    export_training_data() in near-linear time for large logs.
+    """
+    training, estimated_count = build_dive_training_frame(tolerance_hours)
+    if training.empty:
+        print("No dives with visibility measurements found.")
+        return 0
+    print(f"Found {len(training)} dives with visibility data.")
+
+    if estimated_count > 0:
+        print(f"  Note: {estimated_count} of {len(training)} records use estimated conditions")
+
+    training.to_csv(output_file, index=False)
+    print(f"Exported {len(training)} training records to {output_file}")
+    return len(training)
+
+
+def iter_training_chunks(chunk_size=50000, tolerance_hours=6):
+    """
+    Yield (training rows, estimated_count) per chunk of the dive log. Chunks
+    follow the dive time, not the insertion order, and each only loads the
+    condition history within its own time range (plus the tolerance), so
+    memory stays flat however long the log grows.
+    """
+    database_client.migrate_dives_from_json(DIVE_FILE)
+    for records in database_client.iter_dives_by_time(chunk_size):
+        dives = _prepare_dives(records)
+        if not dives.empty:
+            merged = join_dives_to_conditions(dives, _history_for(dives, tolerance_hours), tolerance_hours)
+            yield build_training_frame(merged), int((~merged["matched"]).sum())
+
+
+def export_training_data_stream(output_file, fmt=None, chunk_size=50000, tolerance_hours=6):
+    """
+    Streaming export to a columnar file: a directory of memory-mappable .npy
+    columns, or Parquet when pyarrow is installed (see columnar.py).
+    """
+    total = estimated = 0
+    with columnar.ColumnarWriter(output_file, FIELDNAMES, fmt=fmt) as writer:
+        for chunk, n_estimated in iter_training_chunks(chunk_size, tolerance_hours):
+            writer.write(chunk)
+            total += len(chunk)
+            estimated += n_estimated
+    if total == 0:
+        print("No dives with visibility measurements found.")
+        return 0
+    if estimated > 0:
+        print(f"  Note: {estimated} of {total} records use estimated conditions")
+    print(f"Exported {total} training records to {output_file} ({writer.fmt})")
+    return total
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Export training data from dive logs")
     parser.add_argument(
@@ -189,9 +375,33 @@ if __name__ == "__main__":
         default=os.path.join(DATA_DIR, "dive_training_data.csv"),
         help="Output CSV file path"
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Load dives and conditions once and join them in memory (fast for large logs)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "npy", "parquet"],
+        default="csv",
+        help="csv, or a streamed columnar export: npy (directory of .npy columns) or parquet (needs pyarrow)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=50000,
+        help="Dives per chunk for columnar exports"
+    )
     args = parser.parse_args()
-    
-    count = export_training_data(args.out)
+
+    if args.format != "csv":
+        out = args.out
+        if out.endswith(".csv"):
+            out = os.path.splitext(out)[0] + (".parquet" if args.format == "parquet" else "")
+        count = export_training_data_stream(out, args.format, args.chunk_size)
+        args.out = out
+    else:
+        count = export_training_data_bulk(args.out) if args.bulk else export_training_data(args.out)
     if count > 0:
         print(f"\nTo train the model with this data, run:")
         print(f"  python src/train_model.py --data {args.out} --out model/dive_visibility_model.pkl")
@@ -0,0 +1,152 @@
+"""
+Model feature matrix from raw conditions, shared by every prediction path
+(/predict, /predict_stormglass, /predict_windguru, /predict/batch, /forecast,
+the heatmap job) and by the training export, so training and serving see
+identical features.
+
+Raw conditions are first turned into columns, one float array per feature
+with NaN for missing values:
+
+    stormglass_columns(hours)    Stormglass hours ({"swellHeight": {"sg": ..}, ...}), wind in m/s
+    manual_columns(rows)         user input, wind in knots unless `wind_speed_ms` is given
+    windguru_columns(mapped)     windguru_client.map_features() dicts, wind in m/s
+
+Columns from several sources are layered with overlay() (e.g. user overrides
+on top of Stormglass), and build_matrix() fills defaults and estimates
+turbidity for all rows at once.
+"""
+import numpy as np
+import pandas as pd
+
+# Model input order (train_model.DEFAULT_FEATURES); wind_speed is m/s
+FEATURES = ["swell_height", "swell_period", "wind_speed", "wind_dir", "tide_height", "turbidity", "chlorophyll"]
+KNOT_TO_MS = 0.514444
+
+# Used for missing values that are not required
+DEFAULTS = {
+    "swell_height": 1.0,
+    "swell_period": 10.0,
+    "wind_speed": 5.0,
+    "wind_dir": 180.0,
+    "tide_height": 0.0,
+    "chlorophyll": 0.5,  # moderate chlorophyll level (mg/m³)
+}
+# Conditions a prediction cannot do without (manual, Stormglass and batch paths)
+REQUIRED = ("swell_height", "swell_period", "wind_speed", "tide_height")
+
+STORMGLASS_PARAMS = {
+    "swell_height": "swellHeight",
+    "swell_period": "swellPeriod",
+    "wind_speed": "windSpeed",
+    "wind_dir": "windDirection",
+    "tide_height": "seaLevel",
+    "chlorophyll": "chlorophyll",
+}
+
+# Turbidity added for a negative tide. The training data (data_generator.py,
+# export_training_data.py) always used 0.5; the serving paths used 1 before
+# they moved to this module, so models keep seeing the feature they were
+# trained on.
+NEGATIVE_TIDE_TURBIDITY = 0.5
+
+_WIND = FEATURES.index("wind_speed")
+_TIDE = FEATURES.index("tide_height")
+
+
+def estimate_turbidity(wind_speed, tide_height):
+    """Relative turbidity from wind (m/s) and tide (m): stronger wind and a
+    negative tide stir up sediment. Same rule as the synthetic training data
+    (see NEGATIVE_TIDE_TURBIDITY)."""
+    wind_speed = np.asarray(wind_speed, dtype=float)
+    tide_height = np.asarray(tide_height, dtype=float)
+    turbidity = 1.0 + 0.15 * np.maximum(0.0, wind_speed - 5.0) + np.where(tide_height < 0, NEGATIVE_TIDE_TURBIDITY, 0.0)
+    return np.clip(turbidity, 0.2, 10.0)
+
+
+def _floats(values):
+    """Values -> (float array, unparseable mask); None/""/NaN are missing, not unparseable."""
+    raw = pd.Series(list(values), dtype=object)
+    # where(), not replace("", None): older pandas forward-fills on replace(..., None)
+    parsed = pd.to_numeric(raw.where(raw != ""), errors="coerce").to_numpy(dtype=float)
+    present = raw.notna().to_numpy() & (raw != "").to_numpy()
+    return parsed, present & np.isnan(parsed)
+
+
+def stormglass_columns(hours):
+    """{feature: array} from Stormglass hours (source "sg")."""
+    return {
+        name: _floats([(h.get(param) or {}).get("sg") for h in hours])[0]
+        for name, param in STORMGLASS_PARAMS.items()
+    }
+
+
+def manual_columns(rows):
+    """
+    {feature: array} from user-supplied dicts. Wind speed is in knots
+    (`wind_speed`) unless `wind_speed_ms` is given. Values that are present
+    but not numbers are reported under the "_invalid" key.
+    """
+    columns, invalid = {}, {}
+    for name in FEATURES:
+        if name == "wind_speed":
+            continue
+        columns[name], invalid[name] = _floats(row.get(name) for row in rows)
+    knots, bad_knots = _floats(row.get("wind_speed") for row in rows)
+    wind_ms, bad_ms = _floats(row.get("wind_speed_ms") for row in rows)
+    columns["wind_speed"] = np.where(np.isnan(wind_ms), knots * KNOT_TO_MS, wind_ms)
+    invalid["wind_speed"] = np.where(np.isnan(wind_ms), bad_knots, bad_ms)
+    columns["_invalid"] = invalid
+    return columns
+
+
+def windguru_columns(mapped):
+    """{feature: array} from windguru_client.map_features() output (wind in m/s)."""
+    return {name: _floats(m.get(name) for m in mapped)[0] for name in FEATURES}
+
+
+def overlay(base, top):
+    """Per feature, values of `top` where present, else `base`."""
+    merged = {}
+    for name in FEATURES:
+        b, t = base.get(name), top.get(name)
+        if b is None or t is None:
+            merged[name] = t if b is None else b
+        else:
+            merged[name] = np.where(np.isnan(t), b, t)
+    invalid = {**base.get("_invalid", {}), **top.get("_invalid", {})}
+    if invalid:
+        merged["_invalid"] = invalid
+    return merged
+
+
+def build_matrix(columns, n, required=REQUIRED):
+    """
+    (X, errors): the (n, len(FEATURES)) float matrix and, per row, None or an
+    error message for rows missing a `required` feature or holding a value
+    that is not a number. Other missing values get DEFAULTS; missing
+    turbidity is estimated from the (defaulted) wind and tide.
+    """
+    X = np.empty((n, len(FEATURES)), dtype=float)
+    invalid = columns.get("_invalid", {})
+    problems = []
+    for j, name in enumerate(FEATURES):
+        col = columns.get(name)
+        col = np.full(n, np.nan) if col is None else np.asarray(col, dtype=float)
+        missing = np.isnan(col)
+        bad = invalid.get(name, np.zeros(n, dtype=bool))
+        if name in required:
+            problems.append((f"missing {name}", missing & ~bad))
+        problems.append((f"invalid {name}", bad))
+        if name != "turbidity":
+            X[:, j] = np.where(missing, DEFAULTS[name], col)
+        else:
+            turbidity = col
+    X[:, FEATURES.index("turbidity")] = np.where(
+        np.isnan(turbidity), estimate_turbidity(X[:, _WIND], X[:, _TIDE]), turbidity
+    )
+
+    errors = [None] * n
+    for message, mask in problems:
+        for i in np.flatnonzero(mask):
+            errors[i] = message if errors[i] is None else f"{errors[i]}, {message}"
+    return X, errors
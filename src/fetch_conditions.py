@@ -1,4 +1,19 @@
 #!/usr/bin/env python3
+"""
+Attach environmental conditions to logged dives (src/visibility.db).
+
+Only dives without a `conditions` row are processed, so a nightly run costs
+time in proportion to the new dives. Dives are read in batches, conditions
+are resolved once per distinct hour, and all rows are upserted on the
+unique `dive_id` in a single transaction; re-running is harmless. Dives
+whose date_time cannot be parsed are recorded in `conditions_skipped` with
+that date_time and reported once; they are selected again only after their
+date_time changes (or with --all).
+
+    python src/fetch_conditions.py                 # new dives only
+    python src/fetch_conditions.py --all           # recompute every dive
+"""
+import argparse
 import json
 import os
 import sqlite3
@@ -57,6 +72,11 @@ def get_tide_data_cached(dt_rounded):
     return tide_data
 
 
+# Columns older conditions tables may lack. ALTER TABLE cannot add a
+# CURRENT_TIMESTAMP default, so the upsert sets created_at itself.
+CONDITIONS_MIGRATIONS = [("tide_height", "REAL"), ("tide_phase", "TEXT"), ("created_at", "TEXT")]
+
+
 # Ensure DB exists and create schema if missing
 def ensure_schema(conn):
     cur = conn.cursor()
@@ -92,6 +112,33 @@ def ensure_schema(conn):
         FOREIGN KEY (dive_id) REFERENCES dives(id)
     );
     """)
+    # Dives whose date_time could not be parsed, keyed on that date_time so an
+    # edited dive is picked up again
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS conditions_skipped (
+        dive_id INTEGER PRIMARY KEY,
+        date_time TEXT,
+        reason TEXT
+    );
+    """)
+    # Tables created by init_db.py or before add_tide_column.py/add_tide_phase.py
+    columns = {r[1] for r in cur.execute("PRAGMA table_info(conditions)")}
+    for name, sql_type in CONDITIONS_MIGRATIONS:
+        if name not in columns:
+            cur.execute(f"ALTER TABLE conditions ADD COLUMN {name} {sql_type}")
+    # One conditions row per dive. Older runs inserted a row per dive on every
+    # run, so keep only the newest before the unique index can be created.
+    has_index = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_conditions_dive_id'"
+    ).fetchone()
+    if not has_index:
+        removed = cur.execute("""
+            DELETE FROM conditions
+            WHERE id NOT IN (SELECT MAX(id) FROM conditions GROUP BY dive_id)
+        """).rowcount
+        if removed:
+            print(f"Removed {removed} duplicate conditions rows")
+        cur.execute("CREATE UNIQUE INDEX idx_conditions_dive_id ON conditions(dive_id)")
     conn.commit()
 
 # Replace this stub with your real API call
@@ -106,47 +153,116 @@ def get_conditions(dt: datetime):
         "tide_phase": "rising"
     }
 
-def update_conditions():
+CONDITION_COLUMNS = ["wind_speed", "wind_dir", "wave_height", "wave_period", "tide_height", "tide_phase"]
+
+UPSERT_CONDITIONS_SQL = f"""
+    INSERT INTO conditions (dive_id, {', '.join(CONDITION_COLUMNS)}, created_at)
+    VALUES (?, {', '.join('?' for _ in CONDITION_COLUMNS)}, CURRENT_TIMESTAMP)
+    ON CONFLICT(dive_id) DO UPDATE SET
+        {', '.join(f"{c} = excluded.{c}" for c in CONDITION_COLUMNS)},
+        created_at = CURRENT_TIMESTAMP
+"""
+
+BATCH_SIZE = 500
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date_times(values):
+    """
+    Dive times as naive datetimes, each value parsed on its own (a batch may
+    mix spellings); times with a UTC offset are converted to UTC, as in
+    import_dives.py. Unparseable values become NaT.
+    """
+    return pd.to_datetime(values, errors="coerce", format="mixed", utc=True).dt.tz_convert(None)
+
+
+def resolve_conditions(date_times):
+    """Conditions for each dive time, calling get_conditions once per distinct hour."""
+    by_hour = {}
+    resolved = []
+    for dt in date_times:
+        hour = dt.floor("h")
+        if hour not in by_hour:
+            by_hour[hour] = get_conditions(hour)
+        resolved.append(by_hour[hour])
+    return resolved
+
+
+def _condition_params(dive_ids, conditions):
+    params = []
+    for dive_id, cond in zip(dive_ids, conditions):
+        cond = cond or {}
+        values = [_float(cond.get(c)) for c in CONDITION_COLUMNS[:-1]]
+        params.append((int(dive_id), *values, cond.get("tide_phase")))
+    return params
+
+
+def update_conditions(batch_size=BATCH_SIZE, refresh=False):
+    """
+    Resolve and upsert conditions for dives that have none (every dive with
+    `refresh`). Dives with an unparseable date_time get no conditions; they
+    are recorded in conditions_skipped and reported by id. Returns the number
+    of dives whose conditions were resolved.
+    """
     conn = sqlite3.connect(DB_PATH)
     try:
         ensure_schema(conn)
 
-        # Show tables for debug
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        print("TABLES:", cur.fetchall())
-
-        # If there are no dives, nothing to do
-        dives_df = pd.read_sql_query("SELECT * FROM dives", conn)
-        if dives_df.empty:
-            print("No dives found. Nothing to update.")
-            return
-
-        dives_df["date_time"] = pd.to_datetime(dives_df["date_time"])
-
-        for _, row in dives_df.iterrows():
-            cond = get_conditions(row["date_time"])
-
-            cur.execute("""
-                INSERT INTO conditions
-                (dive_id, wind_speed, wind_dir, wave_height, wave_period, tide_height, tide_phase)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                int(row["id"]),
-                float(cond.get("wind_speed", None)),
-                float(cond.get("wind_dir", None)),
-                float(cond.get("wave_height", None)),
-                float(cond.get("wave_period", None)),
-                float(cond.get("tide_height", None)),
-                cond.get("tide_phase", None)
-            ))
-        conn.commit()
-        print("Conditions updated.")
+        missing = "" if refresh else "WHERE c.dive_id IS NULL AND s.dive_id IS NULL"
+        # Ids and times only; the pending set is fixed before anything is written
+        pending = conn.execute(f"""
+            SELECT d.id, d.date_time
+            FROM dives d
+            LEFT JOIN conditions c ON c.dive_id = d.id
+            LEFT JOIN conditions_skipped s ON s.dive_id = d.id AND s.date_time IS d.date_time
+            {missing}
+            ORDER BY d.id
+        """).fetchall()
+
+        written = 0
+        unparseable = []
+        # One transaction for all batches: a failed run leaves no partial state
+        with conn:
+            for start in range(0, len(pending), batch_size):
+                batch = pd.DataFrame(pending[start:start + batch_size], columns=["id", "raw"])
+                batch["date_time"] = parse_date_times(batch["raw"])
+                bad = batch["date_time"].isna()
+                if bad.any():
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO conditions_skipped (dive_id, date_time, reason) VALUES (?, ?, ?)",
+                        [(int(i), raw, "unparseable date_time") for i, raw in zip(batch.loc[bad, "id"], batch.loc[bad, "raw"])],
+                    )
+                    unparseable.extend(int(i) for i in batch.loc[bad, "id"])
+                    batch = batch[~bad]
+                conditions = resolve_conditions(batch["date_time"])
+                conn.executemany(UPSERT_CONDITIONS_SQL, _condition_params(batch["id"], conditions))
+                conn.executemany("DELETE FROM conditions_skipped WHERE dive_id = ?", [(int(i),) for i in batch["id"]])
+                written += len(batch)
+
+        if written:
+            print(f"Conditions updated for {written} dive(s).")
+        elif not unparseable:
+            print("No dives without conditions. Nothing to update.")
+        if unparseable:
+            shown = ", ".join(str(i) for i in unparseable[:20]) + (", ..." if len(unparseable) > 20 else "")
+            print(f"Warning: {len(unparseable)} dive(s) have an unparseable date_time and were skipped: ids {shown}")
+        return written
     except Exception as e:
         print("Error in update_conditions:", e)
         raise
     finally:
         conn.close()
 
+
 if __name__ == "__main__":
-    update_conditions()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Attach conditions to dives that have none")
+    parser.add_argument("--all", action="store_true", help="Recompute conditions for every dive")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Dives resolved per batch")
+    args = parser.parse_args()
+    update_conditions(batch_size=args.batch_size, refresh=args.all)
@@ -0,0 +1,216 @@
+"""
+Precomputed visibility heatmap over a lat/lon grid.
+
+A background job (see app.refresh_heatmap) takes the cached Stormglass
+forecast of a few anchor points (the known sites inside the grid),
+interpolates their conditions onto every grid cell by inverse-distance
+weighting and scores all cells for all forecast hours with one batched
+`predict`. The result is stored as one compact array
+
+    <HEATMAP_DIR>/heatmap.npz   values[hour, row, col] (float32, row 0 = south)
+
+and served from memory, as JSON grids or PNG overlays rendered once per hour
+slice, so viewing the map never runs the model or calls an upstream API.
+"""
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+HEATMAP_DIR = os.environ.get("HEATMAP_DIR") or os.path.join(os.path.dirname(APP_ROOT), "data", "heatmap")
+HEATMAP_FILE = os.path.join(HEATMAP_DIR, "heatmap.npz")
+
+# Grid over the covered coastline: min_lon,min_lat,max_lon,max_lat (Jersey by default)
+HEATMAP_BBOX = tuple(float(v) for v in (os.environ.get("HEATMAP_BBOX") or "-2.30,49.15,-1.95,49.30").split(","))
+HEATMAP_STEP = float(os.environ.get("HEATMAP_STEP", "0.01"))  # degrees
+HEATMAP_DAYS = int(os.environ.get("HEATMAP_DAYS", "3"))
+
+# PNG colour ramp: visibility (m) -> RGB, interpolated between stops
+COLOUR_STOPS = np.array([0.0, 3.0, 6.0, 12.0])
+COLOURS = np.array([[203, 43, 62], [203, 132, 39], [238, 210, 2], [42, 173, 39]], dtype=np.float64)
+OVERLAY_ALPHA = 160
+
+
+def grid_axes(bbox=HEATMAP_BBOX, step=HEATMAP_STEP):
+    """Cell-centre latitudes (south to north) and longitudes (west to east)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lats = np.arange(min_lat + step / 2, max_lat, step)
+    lons = np.arange(min_lon + step / 2, max_lon, step)
+    return lats, lons
+
+
+def idw_weights(points_lat, points_lon, anchor_lat, anchor_lon, power=2.0):
+    """(n_points, n_anchors) inverse-distance weights, rows summing to 1."""
+    coslat = np.cos(np.radians(np.mean(anchor_lat)))
+    dlat = points_lat[:, None] - np.asarray(anchor_lat)[None, :]
+    dlon = (points_lon[:, None] - np.asarray(anchor_lon)[None, :]) * coslat
+    dist = np.hypot(dlat, dlon)
+    weights = 1.0 / np.maximum(dist, 1e-9) ** power
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def interpolate_features(weights, anchor_features, angular=()):
+    """
+    anchor_features: (n_anchors, n_hours, n_features) -> (n_hours, n_points, n_features).
+    Features listed in `angular` (degrees) are averaged as unit vectors.
+    """
+    out = np.einsum("pa,ahf->hpf", weights, anchor_features)
+    for f in angular:
+        rad = np.radians(anchor_features[:, :, f])
+        s = np.einsum("pa,ah->hp", weights, np.sin(rad))
+        c = np.einsum("pa,ah->hp", weights, np.cos(rad))
+        out[:, :, f] = np.degrees(np.arctan2(s, c)) % 360.0
+    return out
+
+
+def build_heatmap(predict, anchors, bbox=HEATMAP_BBOX, step=HEATMAP_STEP, angular=()):
+    """
+    anchors: list of {"lat", "lon", "times": [...], "features": [[...], ...]}.
+    Only forecast hours present at every anchor are used. Returns the dict
+    stored by save(), with values of shape (n_hours, n_lat, n_lon).
+    """
+    if not anchors:
+        raise ValueError("No anchor conditions to interpolate from")
+    common = set(anchors[0]["times"])
+    for a in anchors[1:]:
+        common &= set(a["times"])
+    times = [t for t in anchors[0]["times"] if t in common]
+    if not times:
+        raise ValueError("Anchors share no forecast hours")
+
+    stacked = []
+    for a in anchors:
+        by_time = dict(zip(a["times"], a["features"]))
+        stacked.append([by_time[t] for t in times])
+    anchor_features = np.asarray(stacked, dtype=np.float64)
+
+    lats, lons = grid_axes(bbox, step)
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+    weights = idw_weights(grid_lat.ravel(), grid_lon.ravel(),
+                          [a["lat"] for a in anchors], [a["lon"] for a in anchors])
+    features = interpolate_features(weights, anchor_features, angular)
+
+    n_hours, n_points, n_features = features.shape
+    preds = np.asarray(predict(features.reshape(n_hours * n_points, n_features)), dtype=np.float32)
+    return {
+        "values": preds.reshape(n_hours, len(lats), len(lons)),
+        "times": np.array(times),
+        "bbox": np.asarray(bbox, dtype=np.float64),
+        "step": np.asarray(step, dtype=np.float64),
+        "anchors": np.array([[a["lat"], a["lon"]] for a in anchors], dtype=np.float64),
+        "generated_at": np.array(datetime.now(timezone.utc).isoformat()),
+    }
+
+
+def save(heatmap, path=HEATMAP_FILE):
+    """Write atomically so readers never see a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+        np.savez(fh, **heatmap)
+    os.replace(tmp_path, path)
+
+
+def load(path=HEATMAP_FILE):
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+def _png(rgba):
+    """Encode an (h, w, 4) uint8 array as PNG (no imaging dependency needed)."""
+    height, width, _ = rgba.shape
+    raw = b"".join(b"\x00" + rgba[y].tobytes() for y in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_png(values):
+    """One pixel per grid cell, north up, coloured by predicted visibility."""
+    grid = np.flipud(np.asarray(values, dtype=np.float64))
+    rgba = np.zeros(grid.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(grid, COLOUR_STOPS, COLOURS[:, channel]).round()
+    rgba[..., 3] = np.where(np.isnan(grid), 0, OVERLAY_ALPHA)
+    return _png(rgba)
+
+
+class HeatmapStore:
+    """In-memory copy of the latest heatmap; reloads the file when another
+    process (or the job) replaces it, and caches rendered PNGs per hour."""
+
+    def __init__(self, path=HEATMAP_FILE):
+        self.path = path
+        self._heatmap = None
+        self._mtime = None
+        self._png = {}
+        self._lock = threading.Lock()
+
+    def set(self, heatmap):
+        with self._lock:
+            self._heatmap = heatmap
+            self._png = {}
+            try:
+                self._mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                self._mtime = None
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self._heatmap
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._heatmap = load(self.path)
+                        self._png = {}
+                        self._mtime = mtime
+                    except Exception as e:
+                        print(f"Warning: Could not load heatmap {self.path}: {e}")
+        return self._heatmap
+
+    def meta(self):
+        heatmap = self.get()
+        if heatmap is None:
+            return None
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in heatmap["bbox"])
+        step = float(heatmap["step"])
+        n_hours, n_lat, n_lon = heatmap["values"].shape
+        return {
+            "generated_at": str(heatmap["generated_at"]),
+            "bbox": [min_lon, min_lat, max_lon, max_lat],
+            "step": step,
+            "shape": [n_lat, n_lon],
+            # Image bounds for an overlay: outer edges of the first/last cells
+            "bounds": [[min_lat, min_lon], [min_lat + n_lat * step, min_lon + n_lon * step]],
+            "times": [str(t) for t in heatmap["times"]],
+            "anchors": heatmap["anchors"].tolist(),
+        }
+
+    def grid(self, index):
+        """Predicted visibility grid for forecast hour `index` (IndexError if out of range)."""
+        heatmap = self.get()
+        if heatmap is None:
+            raise LookupError("Heatmap has not been generated yet")
+        return heatmap["values"][index]
+
+    def png(self, index):
+        values = self.grid(index)
+        key = (self._mtime, index)
+        data = self._png.get(key)
+        if data is None:
+            data = self._png[key] = render_png(values)
+        return data
@@ -0,0 +1,65 @@
+"""
+Shared HTTP plumbing for the upstream clients (Stormglass, Open-Meteo, Windguru).
+All threads share one `requests.Session` whose connection pool holds up to
+UPSTREAM_POOL_SIZE connections per host, so keep-alive connections and TLS
+sessions survive between calls even though the dev server runs every request
+on a new thread. Every request gets a timeout.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from . import cassette, metrics
+except ImportError:
+    import cassette
+    import metrics
+
+# Timeout in seconds applied when a caller does not pass one
+DEFAULT_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "10"))
+POOL_MAXSIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", "10"))
+# live (default): call upstream; record: call upstream and save a cassette;
+# replay: serve saved cassettes only, never touching the network
+UPSTREAM_MODE = (os.environ.get("UPSTREAM_MODE") or "live").strip().lower()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get(url: str, timeout=None, **kwargs) -> requests.Response:
+    """`requests.get` over the shared session, with a default timeout.
+    Honours UPSTREAM_MODE=record|replay (see cassette.py)."""
+    host = urlsplit(url).hostname or "unknown"
+    if UPSTREAM_MODE == "replay":
+        resp = cassette.replay(url, kwargs.get("params"))
+        metrics.UPSTREAM_REQUESTS.inc(host=host, outcome="replay")
+        return resp
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        resp = get_session().get(url, timeout=DEFAULT_TIMEOUT if timeout is None else timeout, **kwargs)
+        outcome = str(resp.status_code)
+        if UPSTREAM_MODE == "record":
+            cassette.record(url, kwargs.get("params"), resp)
+        return resp
+    finally:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - start, host=host)
+        metrics.UPSTREAM_REQUESTS.inc(host=host, outcome=outcome)
@@ -1,21 +1,130 @@
+#!/usr/bin/env python3
+"""
+Bulk import of dive logs (CSV or JSONL exports) into the `dives` table.
+
+Files are streamed in chunks, so exports with hundreds of thousands of dives
+never sit in memory at once. All chunks are inserted with executemany in one
+transaction. A dive already present with the same natural key
+(date_time, site_name) is skipped, whether it is in the database or earlier
+in the same file, so re-importing a log is harmless. Rows without a usable
+date_time or missing a value the table requires (NOT NULL) are counted as
+invalid and skipped rather than failing the import.
+
+    python src/import_dives.py data/dive_log.csv
+    python src/import_dives.py export.jsonl --db src/visibility.db --chunk-size 20000
+"""
+import argparse
+import os
 import sqlite3
+import time
+
+import numpy as np
 import pandas as pd
-from config import DB_PATH
-conn = sqlite3.connect(DB_PATH)
 
+try:
+    from .fetch_conditions import ensure_schema
+except ImportError:
+    from fetch_conditions import ensure_schema
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))        # src/
+DB_PATH = os.path.join(BASE_DIR, "visibility.db")            # src/visibility.db, as fetch_conditions.py
+DEFAULT_FILE = os.path.join(os.path.dirname(BASE_DIR), "data", "dive_log.csv")
+
+IMPORT_COLUMNS = ["date_time", "site_name", "visibility_m", "notes", "max_depth_m", "breath_hold_s"]
+CHUNK_SIZE = 10000
+
+
+def ensure_import_schema(conn):
+    """The dives schema of fetch_conditions.py plus an index on the natural key."""
+    ensure_schema(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dives_natural_key ON dives(date_time, site_name)")
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """DataFrame chunks of a .csv or .jsonl/.ndjson file."""
+    if path.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(path, lines=True, chunksize=chunk_size)
+    return pd.read_csv(path, chunksize=chunk_size)
+
+
+def normalize_chunk(chunk, columns, required=("date_time",)):
+    """
+    Reformat date_time as "YYYY-MM-DD HH:MM" (as in dive_log.csv) so the
+    natural key matches across sources. Times with a UTC offset are converted
+    to UTC; naive times are kept as logged. Rows without a usable date or
+    missing a `required` column are dropped.
+    """
+    chunk = chunk.reindex(columns=columns)
+    # utc=True lets one chunk mix offsets (and naive times) without raising
+    parsed = pd.to_datetime(chunk["date_time"], errors="coerce", format="mixed", utc=True).dt.tz_convert(None)
+    # NumPy's ISO minute strings are much faster than strftime
+    minutes = np.datetime_as_string(parsed.to_numpy().astype("datetime64[m]"))
+    chunk = chunk.assign(date_time=np.char.replace(minutes, "T", " "))
+    valid = parsed.notna()
+    for column in required:
+        if column != "date_time":
+            valid &= chunk[column].replace("", None).notna()
+    chunk = chunk[valid.to_numpy()]
+    # NaN -> NULL for sqlite3
+    return chunk.astype(object).where(chunk.notna(), None)
+
+
+def import_dives(path, db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """
+    Stream `path` into dives. Returns a summary dict with rows read,
+    inserted, skipped as duplicates, invalid and throughput.
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    summary = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    try:
+        ensure_import_schema(conn)
+        # (name, notnull) per column; the table may predate ensure_schema (init_db.py)
+        table_info = {r[1]: r[3] for r in conn.execute("PRAGMA table_info(dives)")}
+        columns = [c for c in IMPORT_COLUMNS if c in table_info]
+        required = [c for c in columns if table_info[c]]
+        placeholders = ", ".join("?" for _ in columns)
+        # Inserting row by row inside executemany lets NOT EXISTS also see
+        # rows added earlier in the same import
+        sql = f"""
+            INSERT INTO dives ({', '.join(columns)})
+            SELECT {placeholders}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dives WHERE date_time = ? AND site_name IS ?
+            )
+        """
+        key = (columns.index("date_time"), columns.index("site_name"))
 
-df = pd.read_csv("dive_log.csv")
+        with conn:
+            for chunk in read_chunks(path, chunk_size):
+                if "date_time" not in chunk.columns:
+                    raise ValueError(f"{path} has no 'date_time' column")
+                rows = normalize_chunk(chunk, columns, required)
+                summary["read"] += len(chunk)
+                summary["invalid"] += len(chunk) - len(rows)
+                params = [(*r, r[key[0]], r[key[1]]) for r in rows.itertuples(index=False, name=None)]
+                before = conn.total_changes
+                conn.executemany(sql, params)
+                inserted = conn.total_changes - before
+                summary["inserted"] += inserted
+                summary["duplicates"] += len(params) - inserted
+    finally:
+        conn.close()
 
-conn = sqlite3.connect("visibility.db")
-cursor = conn.cursor()
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_s"] = round(summary["read"] / elapsed) if elapsed > 0 else None
+    return summary
 
-for _, row in df.iterrows():
-    cursor.execute("""
-        INSERT INTO dives (date_time, site_name, visibility_m, notes)
-        VALUES (?, ?, ?, ?)
-    """, (row["date_time"], row["site_name"], row["visibility_m"], row["notes"]))
 
-conn.commit()
-conn.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a CSV/JSONL dive log into the dives table")
+    parser.add_argument("path", nargs="?", default=DEFAULT_FILE, help="CSV or JSONL (.jsonl/.ndjson) dive export")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to import into")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read per chunk")
+    args = parser.parse_args()
 
-print("Dives imported successfully.")
\ No newline at end of file
+    s = import_dives(args.path, args.db, args.chunk_size)
+    print(f"Imported {s['inserted']} of {s['read']} dives "
+          f"({s['duplicates']} duplicates, {s['invalid']} invalid: no usable date_time or a required value missing) "
+          f"in {s['seconds']}s, {s['rows_per_s']} rows/s")
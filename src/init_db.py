@@ -23,10 +23,30 @@ CREATE TABLE IF NOT EXISTS conditions (
     wind_dir REAL,
     wave_height REAL,
     wave_period REAL,
+    tide_height REAL,
+    tide_phase TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (dive_id) REFERENCES dives(id)
 );
 """)
 
+# Columns an older conditions table may lack (same list as fetch_conditions.py)
+columns = {row[1] for row in cursor.execute("PRAGMA table_info(conditions)")}
+for name, sql_type in [("tide_height", "REAL"), ("tide_phase", "TEXT"), ("created_at", "TEXT")]:
+    if name not in columns:
+        cursor.execute(f"ALTER TABLE conditions ADD COLUMN {name} {sql_type}")
+
+# One conditions row per dive: keep the newest before the unique index exists
+has_index = cursor.execute(
+    "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_conditions_dive_id'"
+).fetchone()
+if not has_index:
+    cursor.execute("""
+    DELETE FROM conditions
+    WHERE id NOT IN (SELECT MAX(id) FROM conditions GROUP BY dive_id)
+    """)
+    cursor.execute("CREATE UNIQUE INDEX idx_conditions_dive_id ON conditions(dive_id)")
+
 conn.commit()
 conn.close()
 
@@ -0,0 +1,185 @@
+"""
+Minimal in-process metrics with Prometheus text exposition (served at /metrics).
+
+Counters and histograms keep one small record per label combination behind a
+lock, so an observation costs a dict lookup and a bisect. Gauges are computed
+from callbacks at scrape time.
+
+Usage:
+    REQUESTS = Counter("app_requests_total", "Requests served", ["endpoint"])
+    REQUESTS.inc(endpoint="/predict")
+    with STAGE_SECONDS.time(endpoint="/predict", stage="model_predict"):
+        ...
+    text = render()
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds: 100us .. 30s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+class Gauge:
+    """Gauge whose value(s) come from `fn()` at scrape time: a number, or a
+    dict mapping label-value tuples to numbers."""
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        _register(self)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if isinstance(value, dict):
+            for key, v in value.items():
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+        else:
+            yield f"{self.name} {_format_value(value)}"
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# Shared metrics for the prediction path
+HTTP_REQUEST_SECONDS = Histogram(
+    "visibility_http_request_duration_seconds",
+    "Flask request latency by endpoint.",
+    ["endpoint", "method", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "visibility_stage_duration_seconds",
+    "Latency of individual stages of a prediction request.",
+    ["endpoint", "stage"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "visibility_upstream_requests_total",
+    "Outbound HTTP calls to upstream providers.",
+    ["host", "outcome"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "visibility_upstream_request_duration_seconds",
+    "Latency of outbound HTTP calls to upstream providers.",
+    ["host"],
+)
+
+
+def timed_call(endpoint, stage, fn, *args, **kwargs):
+    """Call fn(*args, **kwargs), recording its duration as a stage (works inside worker threads)."""
+    with STAGE_SECONDS.time(endpoint=endpoint, stage=stage):
+        return fn(*args, **kwargs)
@@ -0,0 +1,138 @@
+"""
+Model registry for the Flask app.
+
+Regions map to model artifact paths. Each artifact is loaded once on first
+use and shared by every region that points at the same file. When the
+.pkl, .compiled.npz or .meta.json of a loaded model changes on disk, the
+next lookup (at most every `check_interval` seconds) reloads it and swaps
+the new model in atomically; requests already holding the old model finish
+with it.
+"""
+import os
+import threading
+import time
+
+import joblib
+
+try:
+    from . import compiled_model
+except ImportError:
+    import compiled_model
+
+
+def load_model(path):
+    """
+    Load a trained model. Prefer the compiled array-backed predictor exported by
+    train_model.py when it is at least as new as the pickle; fall back to joblib.
+    Set USE_COMPILED_MODEL=false to always serve the sklearn pipeline.
+    """
+    compiled_path = compiled_model.compiled_path_for(path)
+    use_compiled = (os.environ.get("USE_COMPILED_MODEL") or "true").strip().lower() not in {"false", "0", "no"}
+    if use_compiled and os.path.exists(compiled_path) and os.path.getmtime(compiled_path) >= os.path.getmtime(path):
+        try:
+            return compiled_model.CompiledForest.load(compiled_path)
+        except Exception as e:
+            print(f"Warning: Could not load compiled model {compiled_path}: {e}")
+    return joblib.load(path)
+
+
+def _signature(path):
+    """mtimes of the artifact files that make up one model (None if missing)."""
+    stem = os.path.splitext(path)[0]
+    sig = []
+    for p in (path, compiled_model.compiled_path_for(path), stem + ".meta.json"):
+        try:
+            sig.append(os.stat(p).st_mtime_ns)
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+class _Entry:
+    __slots__ = ("model", "signature", "checked_at", "loaded_at")
+
+    def __init__(self, model, signature):
+        self.model = model
+        self.signature = signature
+        self.checked_at = time.monotonic()
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """Region -> model lookup with lazy loading, path deduplication and hot reload."""
+
+    def __init__(self, paths, default_region="GLOBAL", loader=load_model, check_interval=10.0):
+        self.paths = {str(k).upper(): os.path.abspath(v) for k, v in paths.items()}
+        self.default_region = default_region.upper()
+        self.loader = loader
+        self.check_interval = check_interval
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _path_lock(self, path):
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _load(self, path):
+        """Load (or reload) `path` unless another thread just did; returns the entry or None."""
+        with self._path_lock(path):
+            entry = self._entries.get(path)
+            signature = _signature(path)
+            if signature[0] is None:
+                # Artifact missing: keep serving what we have, if anything
+                if entry is not None:
+                    entry.checked_at = time.monotonic()
+                return entry
+            if entry is not None and entry.signature == signature:
+                entry.checked_at = time.monotonic()
+                return entry
+            try:
+                model = self.loader(path)
+            except Exception as e:
+                print(f"Warning: Could not load model {path}: {e}")
+                if entry is not None:
+                    entry.checked_at = time.monotonic()
+                return entry
+            new_entry = _Entry(model, signature)
+            self._entries[path] = new_entry  # atomic swap
+            if entry is not None:
+                print(f"Reloaded model {path}")
+            return new_entry
+
+    def _model_for_path(self, path):
+        entry = self._entries.get(path)
+        if entry is None or time.monotonic() - entry.checked_at >= self.check_interval:
+            entry = self._load(path)
+        return entry.model if entry is not None else None
+
+    def get(self, region=None):
+        """Model for `region`, falling back to the default region; None if none exist."""
+        region = str(region or self.default_region).upper()
+        path = self.paths.get(region)
+        model = self._model_for_path(path) if path else None
+        if model is None and region != self.default_region:
+            default_path = self.paths.get(self.default_region)
+            if default_path:
+                model = self._model_for_path(default_path)
+        return model
+
+    def reload(self, region=None):
+        """Check the artifacts of `region` (default region if None) now instead of
+        waiting for check_interval; used after publishing a retrained model."""
+        path = self.paths.get(str(region or self.default_region).upper())
+        if path:
+            self._load(path)
+
+    def describe(self):
+        """Region -> load status, for diagnostics."""
+        out = {}
+        for region, path in self.paths.items():
+            entry = self._entries.get(path)
+            out[region] = {
+                "path": path,
+                "loaded": entry is not None,
+                "loaded_at": entry.loaded_at if entry else None,
+                "type": type(entry.model).__name__ if entry else None,
+            }
+        return out
@@ -0,0 +1,185 @@
+"""
+Incremental background retraining from the dive log.
+
+POST/PUT /dives call `notify()`, which only sets a flag and returns. A single
+worker thread waits RETRAIN_DEBOUNCE seconds for further edits, so a burst of
+logged dives costs one refit, and never refits more often than every
+RETRAIN_MIN_INTERVAL seconds. Each refit uses:
+
+    base rows    the bootstrap training CSV (RETRAIN_BASE_DATA), parsed once
+                 and kept in memory as a feature matrix
+    dive rows    every dive with a visibility, joined to Stormglass conditions
+                 (export_training_data.build_dive_training_frame)
+
+The pipeline is fitted with the hyperparameters recorded in the current
+model's .meta.json (e.g. from train_model.py --search) and written atomically
+over the served artifacts; the model registry then swaps it in. A refit is
+not evaluated, so the new .meta.json drops the rmse/r2 and search report of
+the last full training (they describe the old model) and records the refit
+under "incremental".
+
+Refitting rewrites the served model, so it is off unless RETRAIN_ON_DIVES is
+set.
+
+Only one process should refit: the app creates its Retrainer in the process
+that runs the background jobs. Dives logged through other processes are
+picked up by watch(), which polls the dive log version.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import export_training_data, train_model
+except ImportError:
+    import export_training_data
+    import train_model
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+RETRAIN_ENABLED = (os.environ.get("RETRAIN_ON_DIVES") or "false").strip().lower() in {"true", "1", "yes"}
+RETRAIN_BASE_DATA = os.environ.get("RETRAIN_BASE_DATA") or os.path.join(os.path.dirname(APP_ROOT), "data", "visibility.csv")
+RETRAIN_DEBOUNCE_S = float(os.environ.get("RETRAIN_DEBOUNCE", "30"))
+RETRAIN_MIN_INTERVAL_S = float(os.environ.get("RETRAIN_MIN_INTERVAL", "300"))
+# Skip refits with fewer rows than this (base + dives)
+RETRAIN_MIN_ROWS = int(os.environ.get("RETRAIN_MIN_ROWS", "20"))
+# Evaluation results of the previous training, not valid for a refit model
+STALE_META_KEYS = ("rmse", "r2", "search")
+
+
+class Retrainer:
+    """Debounced background refits of the model at `model_path`."""
+
+    def __init__(self, model_path, base_data=RETRAIN_BASE_DATA, debounce=RETRAIN_DEBOUNCE_S,
+                 min_interval=RETRAIN_MIN_INTERVAL_S, on_published=None):
+        self.model_path = model_path
+        self.base_data = base_data
+        self.debounce = float(debounce)
+        self.min_interval = float(min_interval)
+        self.on_published = on_published
+        self.features = list(train_model.DEFAULT_FEATURES)
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self._base = None
+        self._seen_version = None
+        self._pending = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        """Schedule a refit; returns immediately."""
+        self._pending.set()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="retrainer", daemon=True)
+                self._thread.start()
+
+    def watch(self, version):
+        """notify() if the dive log `version` changed since the last call
+        (e.g. dives logged through another worker process)."""
+        if self._seen_version is not None and version != self._seen_version:
+            self.notify()
+        self._seen_version = version
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            # Debounce: keep waiting while new edits arrive
+            while True:
+                self._pending.clear()
+                time.sleep(self.debounce)
+                if not self._pending.is_set():
+                    break
+            if self.last_run is not None:
+                remaining = self.min_interval - (time.time() - self.last_run)
+                if remaining > 0:
+                    time.sleep(remaining)
+            self.retrain_once()
+
+    def _base_rows(self):
+        """Bootstrap training rows, read once (empty if the CSV is missing)."""
+        if self._base is None:
+            if self.base_data and os.path.exists(self.base_data):
+                df = pd.read_csv(self.base_data)
+                missing = [c for c in self.features + ["visibility"] if c not in df.columns]
+                if missing:
+                    print(f"Warning: Retrain base data {self.base_data} lacks columns {missing}; ignoring it")
+                    df = pd.DataFrame(columns=self.features + ["visibility"])
+            else:
+                df = pd.DataFrame(columns=self.features + ["visibility"])
+            self._base = (df[self.features].to_numpy(dtype=float), df["visibility"].to_numpy(dtype=float))
+        return self._base
+
+    def _meta(self):
+        """The published model's .meta.json ({} if missing or unreadable)."""
+        meta_path = os.path.splitext(self.model_path)[0] + ".meta.json"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        return meta if isinstance(meta, dict) else {}
+
+    def retrain_once(self):
+        """Refit on base + dive rows and publish; returns a summary (None if skipped)."""
+        start = time.perf_counter()
+        self.last_run = time.time()
+        try:
+            X_base, y_base = self._base_rows()
+            dives, estimated = export_training_data.build_dive_training_frame()
+            X_dives = dives[self.features].to_numpy(dtype=float)
+            y_dives = dives["visibility"].to_numpy(dtype=float)
+            X = np.vstack([X_base, X_dives])
+            y = np.concatenate([y_base, y_dives])
+            if len(y) < RETRAIN_MIN_ROWS:
+                self.last_result = {"skipped": f"only {len(y)} training rows"}
+                return None
+
+            meta = self._meta()
+            params = dict(meta["params"]) if isinstance(meta.get("params"), dict) else {}
+            pipeline = train_model.build_pipeline(**{**params, "n_jobs": 1})
+            pipeline.fit(X, y)
+            pipeline[-1].set_params(n_jobs=None)
+
+            train_model.ensure_out_dir(self.model_path)
+            train_model.save_pipeline(pipeline, self.model_path)
+            train_model.export_compiled(pipeline, self.model_path)
+            summary = {
+                "n_base_rows": int(len(y_base)),
+                "n_dive_rows": int(len(y_dives)),
+                "n_estimated_conditions": int(estimated),
+                "fit_s": round(time.perf_counter() - start, 3),
+                "trained_at": datetime.now(timezone.utc).isoformat(),
+            }
+            train_model.write_meta(self.model_path, {
+                **{k: v for k, v in meta.items() if k not in STALE_META_KEYS},
+                "features": self.features,
+                "n_samples": int(len(y)),
+                "region": None,
+                "params": params,
+                "incremental": summary,
+            })
+            self.last_result = summary
+            self.last_error = None
+            if self.on_published is not None:
+                self.on_published()
+            print(f"Retrained model on {len(y)} rows ({len(y_dives)} from dives) in {summary['fit_s']}s")
+            return summary
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Warning: Incremental retraining failed: {e}")
+            return None
+
+    def describe(self):
+        return {
+            "enabled": RETRAIN_ENABLED,
+            "pending": self._pending.is_set(),
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
@@ -1,19 +1,145 @@
 import os
-import requests
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json
 try:
-    from . import database_client
+    from . import database_client, http_client, metrics
+    from .ttl_cache import TTLCache
 except ImportError:
     import database_client
+    import http_client
+    import metrics
+    from ttl_cache import TTLCache
 
 API_KEY = os.environ.get("STORMGLASS_API_KEY")
-API_ROOT = "https://api.stormglass.io/v2"
+API_ROOT = os.environ.get("STORMGLASS_API_ROOT", "https://api.stormglass.io/v2")
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-CACHE_DIR = os.path.join(os.path.dirname(APP_ROOT), "data", "stormglass_cache")
+CACHE_DIR = os.environ.get("STORMGLASS_CACHE_DIR") or os.path.join(os.path.dirname(APP_ROOT), "data", "stormglass_cache")
+WEATHER_PARAMS = [
+    "airTemperature", "cloudCover", "rain", "swellDirection",
+    "swellHeight", "swellPeriod", "waterTemperature", "waveDirection",
+    "waveHeight", "wavePeriod", "windSpeed", "windDirection", "seaLevel"
+]
+# Stormglass serves up to 10 days of hourly forecast
+MAX_FORECAST_DAYS = 10
+# A cached forecast window whose end falls more than this many hours short of
+# now + days is fetched again (a new fetch per hour would exhaust the quota)
+FORECAST_MAX_SHORTFALL_H = float(os.environ.get("STORMGLASS_FORECAST_MAX_SHORTFALL", "6"))
+
+# In-memory cache in front of the file cache/API, keyed on rounded lat/lon and hour
+CACHE_TTL_S = float(os.environ.get("STORMGLASS_CACHE_TTL", "3600"))
+CACHE_SIZE = int(os.environ.get("STORMGLASS_CACHE_SIZE", "512"))
+memory_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL_S)
+
+FILE_CACHE_LOOKUPS = metrics.Counter(
+    "visibility_stormglass_file_cache_total",
+    "Stormglass daily file cache lookups.",
+    ["kind", "result"],
+)
+metrics.Gauge(
+    "visibility_stormglass_memory_cache_lookups",
+    "Stormglass in-memory cache lookups since start (hit, miss, coalesced).",
+    lambda: {
+        ("hit",): memory_cache.hits,
+        ("miss",): memory_cache.misses,
+        ("coalesced",): memory_cache.coalesced,
+    },
+    ["result"],
+)
+metrics.Gauge(
+    "visibility_stormglass_memory_cache_hit_ratio",
+    "Share of Stormglass lookups served without a new fetch (hits + coalesced).",
+    lambda: (memory_cache.hits + memory_cache.coalesced)
+    / max(1, memory_cache.hits + memory_cache.coalesced + memory_cache.misses),
+)
+
+
+def _cache_key(kind: str, lat: float, lon: float, *extra):
+    hour = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H")
+    return (kind, round(float(lat), 2), round(float(lon), 2), hour) + extra
 
 
 def get_weather_and_tide(lat: float, lon: float):
+    """
+    Returns current weather and tide data for a location. Concurrent and repeated
+    calls within the same hour are served from memory (see `memory_cache`).
+    """
+    return memory_cache.get_or_load(
+        _cache_key("weather", lat, lon), lambda: _fetch_weather_and_tide(lat, lon)
+    )
+
+
+def get_forecast(lat: float, lon: float, days: int = 7):
+    """Returns an hourly forecast window for a location, cached in memory per hour."""
+    days = max(1, min(int(days), MAX_FORECAST_DAYS))
+    return memory_cache.get_or_load(
+        _cache_key("forecast", lat, lon, days), lambda: _fetch_forecast(lat, lon, days)
+    )
+
+
+def get_stored_forecast(lat: float, lon: float, days: int = 7):
+    """
+    Returns the forecast window for a location without calling Stormglass: this
+    hour's in-memory copy, else the hours from now to now + days stored by
+    earlier fetches (e.g. the cache warmer). None if nothing is stored.
+    """
+    days = max(1, min(int(days), MAX_FORECAST_DAYS))
+    cached = memory_cache.get(_cache_key("forecast", lat, lon, days))
+    if cached is not None:
+        return cached
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    records = database_client.get_stormglass_window(
+        lat, lon, now.isoformat(), (now + timedelta(days=days)).isoformat()
+    )
+    if not records:
+        return None
+    return {"hours": [_record_to_response(r, "database")["hours"][0] for r in records], "meta": {"source": "database"}}
+
+
+def get_stored_hour(lat: float, lon: float, when: datetime):
+    """Returns the stored conditions for the UTC hour `when` (shaped like an API
+    response with one hour), or None if that hour was never fetched."""
+    record = database_client.get_stormglass_hour(
+        lat, lon, when.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0).isoformat()
+    )
+    return _record_to_response(record, "database") if record else None
+
+
+def get_bio_data(lat: float, lon: float):
+    """Returns bio/chlorophyll data for a location (or None), cached in memory per hour."""
+    return memory_cache.get_or_load(
+        _cache_key("bio", lat, lon), lambda: _fetch_bio_data(lat, lon)
+    )
+
+
+# Columns a stored hour needs to stand in for a live weather response
+REQUIRED_COLUMNS = ("swell_height", "swell_period", "wind_speed", "wind_direction", "tide_height")
+
+
+def _record_to_response(record, source):
+    """Convert a stormglass_data row (dict) to a response shaped like the API's."""
+    hour = {"time": record["timestamp"]}
+    for column, param in database_client.STORMGLASS_FIELDS.items():
+        hour[param] = {"sg": record.get(column)}
+    return {"hours": [hour], "meta": {"source": source}}
+
+
+def _hour_time(hour):
+    return datetime.fromisoformat(str(hour["time"]).replace("Z", "+00:00"))
+
+
+def _current_window(data, start, days):
+    """
+    `data` with the hours before `start` dropped, or None if what remains
+    ends more than FORECAST_MAX_SHORTFALL_H hours short of start + days.
+    """
+    hours = [h for h in (data or {}).get("hours") or [] if h.get("time") and _hour_time(h) >= start]
+    wanted_end = start + timedelta(days=days) - timedelta(hours=FORECAST_MAX_SHORTFALL_H)
+    if not hours or _hour_time(hours[-1]) < wanted_end:
+        return None
+    return {**data, "hours": hours}
+
+
+def _fetch_weather_and_tide(lat: float, lon: float):
     """
     Fetches weather and tide data from Stormglass.io, with daily caching.
     See: https://documentation.stormglass.io/
@@ -21,29 +147,7 @@ def get_weather_and_tide(lat: float, lon: float):
     if not API_KEY:
         record = database_client.get_latest_stormglass_data(lat, lon)
         if record:
-            # Convert the sqlite3.Row object to a dict that mimics the API response
-            return {
-                "hours": [{
-                    "time": record["timestamp"],
-                    "airTemperature": {"sg": record.get("air_temperature")},
-                    "cloudCover": {"sg": record.get("cloud_cover")},
-                    "rain": {"sg": record.get("rain")},
-                    "swellDirection": {"sg": record.get("swell_direction")},
-                    "swellHeight": {"sg": record["swell_height"]},
-                    "swellPeriod": {"sg": record["swell_period"]},
-                    "waterTemperature": {"sg": record["water_temperature"]},
-                    "waveDirection": {"sg": record.get("wave_direction")},
-                    "waveHeight": {"sg": record.get("wave_height")},
-                    "wavePeriod": {"sg": record.get("wave_period")},
-                    "windSpeed": {"sg": record["wind_speed"]},
-                    "windDirection": {"sg": record["wind_direction"]},
-                    "seaLevel": {"sg": record["tide_height"]},
-                    "chlorophyll": {"sg": record.get("chlorophyll")},
-                }],
-                "meta": {
-                    "source": "database-fallback"
-                }
-            }
+            return _record_to_response(record, "database-fallback")
         else:
             raise ValueError("STORMGLASS_API_KEY not set and no fallback data available in the database.")
 
@@ -62,26 +166,32 @@ def get_weather_and_tide(lat: float, lon: float):
                 data = json.load(f)
                 # Also save to DB for long-term storage
                 database_client.save_stormglass_data(lat, lon, data)
+                FILE_CACHE_LOOKUPS.inc(kind="weather", result="hit")
                 return data
         except (json.JSONDecodeError, IOError):
             # Invalid cache file, proceed to fetch
             pass
+    FILE_CACHE_LOOKUPS.inc(kind="weather", result="miss")
 
-    start_time = now.isoformat()
-    params = [
-        "airTemperature", "cloudCover", "rain", "swellDirection",
-        "swellHeight", "swellPeriod", "waterTemperature", "waveDirection",
-        "waveHeight", "wavePeriod", "windSpeed", "windDirection", "seaLevel"
-    ]
+    # This hour may already be stored from an earlier forecast window
+    record = database_client.get_stormglass_hour(
+        lat, lon, now.replace(minute=0, second=0, microsecond=0).isoformat()
+    )
+    if record and all(record.get(c) is not None for c in REQUIRED_COLUMNS):
+        data = _record_to_response(record, "database")
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return data
 
+    start_time = now.isoformat()
     headers = {"Authorization": API_KEY}
     url = f"{API_ROOT}/weather/point"
-    res = requests.get(
+    res = http_client.get(
         url,
         params={
             "lat": lat,
             "lng": lon,
-            "params": ",".join(params),
+            "params": ",".join(WEATHER_PARAMS),
             "start": start_time,
             "end": start_time,
             "source": "sg",
@@ -103,7 +213,64 @@ def get_weather_and_tide(lat: float, lon: float):
     return data
 
 
-def get_bio_data(lat: float, lon: float):
+def _fetch_forecast(lat: float, lon: float, days: int = 7):
+    """
+    Fetches an hourly weather/tide forecast window from Stormglass.io in a single
+    range request (start = current hour, end = start + days), with daily caching.
+    Cached windows are served from the current hour on, and fetched again once
+    they end too far short of now + days (see _current_window).
+    """
+    days = max(1, min(int(days), MAX_FORECAST_DAYS))
+    if not API_KEY:
+        raise ValueError("STORMGLASS_API_KEY not set; forecasts require the Stormglass API.")
+
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    date_str = now.strftime("%Y-%m-%d")
+    lat_str = f"{lat:.2f}".replace(".", "_")
+    lon_str = f"{lon:.2f}".replace(".", "_")
+    cache_file = os.path.join(CACHE_DIR, f"sg_forecast_cache_{lat_str}_{lon_str}_{date_str}_{days}d.json")
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                data = _current_window(json.load(f), now, days)
+            if data is not None:
+                FILE_CACHE_LOOKUPS.inc(kind="forecast", result="hit")
+                return data
+        except (json.JSONDecodeError, IOError, KeyError, ValueError):
+            pass
+    FILE_CACHE_LOOKUPS.inc(kind="forecast", result="miss")
+
+    headers = {"Authorization": API_KEY}
+    url = f"{API_ROOT}/weather/point"
+    res = http_client.get(
+        url,
+        params={
+            "lat": lat,
+            "lng": lon,
+            "params": ",".join(WEATHER_PARAMS),
+            "start": now.isoformat(),
+            "end": (now + timedelta(days=days)).isoformat(),
+            "source": "sg",
+        },
+        headers=headers,
+        proxies={},
+        verify=False,
+    )
+    res.raise_for_status()
+    data = res.json()
+
+    with open(cache_file, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    database_client.save_stormglass_data(lat, lon, data)
+
+    return data
+
+
+def _fetch_bio_data(lat: float, lon: float):
     """
     Fetches biological/chlorophyll data from Stormglass.io bio endpoint.
     See: https://documentation.stormglass.io/
@@ -136,16 +303,18 @@ def get_bio_data(lat: float, lon: float):
         try:
             with open(cache_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
+                FILE_CACHE_LOOKUPS.inc(kind="bio", result="hit")
                 return data
         except (json.JSONDecodeError, IOError):
             pass
+    FILE_CACHE_LOOKUPS.inc(kind="bio", result="miss")
 
     start_time = now.isoformat()
     headers = {"Authorization": API_KEY}
     url = f"{API_ROOT}/bio/point"
     
     try:
-        res = requests.get(
+        res = http_client.get(
             url,
             params={
                 "lat": lat,
@@ -8,24 +8,42 @@ Examples:
 
     # UK-specific model (expects a 'region' column with value 'UK')
     python src/train_model.py --data data/visibility_uk.csv --region UK --out model/uk_visibility_model.pkl
+
+    # Cross-validated hyperparameter search on all cores, best model is saved
+    python src/train_model.py --data data/visibility.csv --search --folds 5
+    python src/train_model.py --data data/visibility.csv --search --grid grid.json --workers 8
+
+    # Columnar exports (export_training_data.py --format npy|parquet) load only
+    # the feature and target columns
+    python src/train_model.py --data data/dive_training_data --out model/dive_visibility_model.pkl
 """
 from __future__ import annotations
 
 import argparse
+import itertools
 import json
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional, Sequence
 
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
 from sklearn.impute import SimpleImputer
 from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import KFold, train_test_split
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
 
+try:
+    from . import columnar, compiled_model
+except ImportError:
+    import columnar
+    import compiled_model
+
 
 DEFAULT_FEATURES = [
     "swell_height",
@@ -37,6 +55,23 @@ DEFAULT_FEATURES = [
     "chlorophyll",
 ]
 
+# Tree ensembles the search may choose from; all of them compile to the
+# array-backed predictor (see compiled_model.py).
+ESTIMATORS = {
+    "random_forest": RandomForestRegressor,
+    "extra_trees": ExtraTreesRegressor,
+}
+
+# Default search space: every combination is one candidate. Override with
+# --grid (a JSON object, or a path to a JSON file, of the same shape).
+DEFAULT_SEARCH_GRID = {
+    "estimator": ["random_forest", "extra_trees"],
+    "n_estimators": [100, 300],
+    "max_depth": [None, 12],
+    "min_samples_leaf": [1, 3],
+    "max_features": [1.0, 0.5],
+}
+
 
 def ensure_out_dir(path: str) -> None:
     """Create output directory if needed. If path has no directory, use current dir."""
@@ -50,13 +85,155 @@ def validate_columns(df: pd.DataFrame, required: Sequence[str]) -> None:
         raise ValueError(f"Missing required columns in data: {missing}")
 
 
-def train(data_path: str, out_path: str, region: Optional[str] = None, features: Optional[Sequence[str]] = None) -> None:
-    features = list(features or DEFAULT_FEATURES)
+def _write_atomic(path: str, write) -> None:
+    """Call write(fh) on a uniquely named temp file next to `path`, then move it
+    into place: readers never see a partial file and concurrent writers (the CLI
+    and the app's retrainer) never share a temp file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_pipeline(pipeline, out_path: str) -> None:
+    """Dump the pipeline atomically so a running app never loads a partial pickle."""
+    _write_atomic(out_path, lambda fh: joblib.dump(pipeline, fh))
+
+
+def export_compiled(pipeline, out_path: str) -> Optional[str]:
+    """Write the array-backed predictor used by the app next to the pickle."""
+    compiled_path = compiled_model.compiled_path_for(out_path)
+    try:
+        compiled_model.save_compiled(compiled_model.compile_pipeline(pipeline), compiled_path)
+    except ValueError as e:
+        print(f"Warning: Could not export compiled model: {e}")
+        return None
+    print(f"Saved compiled model to {compiled_path}")
+    return compiled_path
+
+
+def build_pipeline(estimator: str = "random_forest", **params):
+    """Imputer -> scaler -> tree ensemble; params go to the estimator."""
+    params.setdefault("random_state", 42)
+    return make_pipeline(
+        SimpleImputer(strategy="median"),
+        StandardScaler(),
+        ESTIMATORS[estimator](**params),
+    )
+
+
+def expand_grid(grid: dict) -> list:
+    """{"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}]"""
+    keys = list(grid)
+    values = [v if isinstance(v, list) else [v] for v in grid.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def load_grid(spec: Optional[str]) -> dict:
+    """Search grid from a JSON string or a path to a JSON file (default grid if None)."""
+    if not spec:
+        return dict(DEFAULT_SEARCH_GRID)
+    if os.path.exists(spec):
+        with open(spec, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    return json.loads(spec)
+
+
+# Training data shared with search workers once per process (see _init_worker)
+_worker_data = {}
+
+
+def _init_worker(X, y):
+    _worker_data["X"] = X
+    _worker_data["y"] = y
+
 
+def _evaluate_fold(index: int, params: dict, train_idx, test_idx) -> dict:
+    """Fit one candidate on one fold (single-threaded; the pool provides parallelism)."""
+    X, y = _worker_data["X"], _worker_data["y"]
+    pipeline = build_pipeline(**{**params, "n_jobs": 1})
+    start = time.perf_counter()
+    pipeline.fit(X[train_idx], y[train_idx])
+    fit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    preds = pipeline.predict(X[test_idx])
+    predict_s = time.perf_counter() - start
+    return {
+        "candidate": index,
+        "rmse": float(np.sqrt(mean_squared_error(y[test_idx], preds))),
+        "r2": float(r2_score(y[test_idx], preds)),
+        "fit_s": fit_s,
+        "predict_s": predict_s,
+        "n_test": int(len(test_idx)),
+    }
+
+
+def search(X: np.ndarray, y: np.ndarray, grid: dict, folds: int = 5, workers: Optional[int] = None) -> dict:
+    """
+    k-fold cross-validation of every candidate in `grid`. Each (candidate, fold)
+    fit is a separate task on a process pool, so all cores stay busy. Returns
+    per-candidate mean/std RMSE and R2 with mean fit/predict timings, sorted
+    by mean RMSE (best first).
+    """
+    candidates = expand_grid(grid)
+    for params in candidates:
+        if params.get("estimator", "random_forest") not in ESTIMATORS:
+            raise ValueError(f"Unknown estimator '{params.get('estimator')}'; choose from {list(ESTIMATORS)}")
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=42).split(X))
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y)) as pool:
+        futures = [
+            pool.submit(_evaluate_fold, i, params, train_idx, test_idx)
+            for i, params in enumerate(candidates)
+            for train_idx, test_idx in splits
+        ]
+        fold_results = [f.result() for f in futures]
+    wall_s = time.perf_counter() - start
+
+    results = []
+    for i, params in enumerate(candidates):
+        rows = [r for r in fold_results if r["candidate"] == i]
+        rmse = np.array([r["rmse"] for r in rows])
+        r2 = np.array([r["r2"] for r in rows])
+        n_test = sum(r["n_test"] for r in rows)
+        results.append({
+            "params": params,
+            "rmse_mean": float(rmse.mean()),
+            "rmse_std": float(rmse.std()),
+            "r2_mean": float(r2.mean()),
+            "r2_std": float(r2.std()),
+            "fit_s_mean": float(np.mean([r["fit_s"] for r in rows])),
+            "predict_s_mean": float(np.mean([r["predict_s"] for r in rows])),
+            "predict_us_per_row": float(1e6 * sum(r["predict_s"] for r in rows) / max(1, n_test)),
+        })
+    results.sort(key=lambda r: r["rmse_mean"])
+    return {"folds": folds, "workers": workers, "wall_s": wall_s, "candidates": results}
+
+
+def load_training_data(data_path: str, region: Optional[str], features: Sequence[str]):
+    """
+    Read the feature, target and (if filtering) region columns from a CSV or
+    a columnar export, apply the optional region filter and return (X, y) frames.
+    """
     if not os.path.exists(data_path):
         raise FileNotFoundError(f"Data file not found: {data_path}")
 
-    df = pd.read_csv(data_path)
+    available = columnar.list_columns(data_path)
+    wanted = [c for c in list(features) + ["visibility"] if c in available]
+    if region and "region" in available:
+        wanted.append("region")
+    if columnar.detect_format(data_path) == "csv":
+        df = pd.read_csv(data_path, usecols=wanted)
+    else:
+        df = pd.DataFrame(columnar.read_columns(data_path, wanted))
     if region:
         if "region" in df.columns:
             df = df[df["region"].astype(str).str.upper() == str(region).upper()]
@@ -73,15 +250,64 @@ def train(data_path: str, out_path: str, region: Optional[str] = None, features:
     # Validate features
     validate_columns(df, features)
 
-    X = df[list(features)].copy()
-    y = df["visibility"].copy()
+    return df[list(features)].copy(), df["visibility"].copy()
+
+
+def write_meta(out_path: str, meta: dict) -> str:
+    meta_path = os.path.splitext(out_path)[0] + ".meta.json"
+    _write_atomic(meta_path, lambda fh: fh.write(json.dumps(meta, indent=2).encode("utf-8")))
+    return meta_path
+
+
+def train_search(data_path: str, out_path: str, region: Optional[str] = None,
+                 features: Optional[Sequence[str]] = None, grid: Optional[dict] = None,
+                 folds: int = 5, workers: Optional[int] = None) -> dict:
+    """
+    Cross-validated search over `grid`, then refit the best candidate on all
+    rows and save it like train(). The search report goes into the .meta.json.
+    """
+    features = list(features or DEFAULT_FEATURES)
+    X, y = load_training_data(data_path, region, features)
+    if len(X) < 2 * folds:
+        print(f"Warning: Only {len(X)} samples, too few for {folds}-fold search. Training the default model.")
+        train(data_path, out_path, region, features)
+        return {}
+
+    report = search(X.to_numpy(dtype=float), y.to_numpy(dtype=float), grid or DEFAULT_SEARCH_GRID, folds, workers)
+    best = report["candidates"][0]
+    print(f"Searched {len(report['candidates'])} candidates x {folds} folds on {report['workers']} workers "
+          f"in {report['wall_s']:.1f}s")
+    for c in report["candidates"]:
+        print(f"  RMSE {c['rmse_mean']:.3f} +/- {c['rmse_std']:.3f}  R2 {c['r2_mean']:.3f}  "
+              f"fit {c['fit_s_mean']:.2f}s  predict {c['predict_us_per_row']:.1f}us/row  {c['params']}")
+
+    ensure_out_dir(out_path)
+    pipeline = build_pipeline(**{**best["params"], "n_jobs": -1})
+    pipeline.fit(X, y)
+    pipeline[-1].set_params(n_jobs=None)  # serve single-threaded like the default model
+    save_pipeline(pipeline, out_path)
+    export_compiled(pipeline, out_path)
+    meta_path = write_meta(out_path, {
+        "features": features,
+        "n_samples": int(len(X)),
+        "region": region,
+        "params": best["params"],
+        "rmse": best["rmse_mean"],
+        "r2": best["r2_mean"],
+        "search": report,
+    })
+    print(f"Saved model to {out_path}")
+    print(f"Saved metadata to {meta_path}")
+    print(f"Best CV RMSE: {best['rmse_mean']:.3f}, R2: {best['r2_mean']:.3f} with {best['params']}")
+    return report
+
+
+def train(data_path: str, out_path: str, region: Optional[str] = None, features: Optional[Sequence[str]] = None) -> None:
+    features = list(features or DEFAULT_FEATURES)
+    X, y = load_training_data(data_path, region, features)
 
     # Build pipeline
-    pipeline = make_pipeline(
-        SimpleImputer(strategy="median"),
-        StandardScaler(),
-        RandomForestRegressor(n_estimators=100, random_state=42),
-    )
+    pipeline = build_pipeline("random_forest", n_estimators=100)
 
     ensure_out_dir(out_path)
 
@@ -89,11 +315,10 @@ def train(data_path: str, out_path: str, region: Optional[str] = None, features:
     if len(X) < 5:
         print(f"Warning: Only {len(X)} samples. Training on all data without test split.")
         pipeline.fit(X, y)
-        joblib.dump(pipeline, out_path)
+        save_pipeline(pipeline, out_path)
+        export_compiled(pipeline, out_path)
         # Save metadata (feature list)
-        meta_path = os.path.splitext(out_path)[0] + ".meta.json"
-        with open(meta_path, "w", encoding="utf-8") as fh:
-            json.dump({"features": features, "n_samples": int(len(X)), "region": region}, fh, indent=2)
+        meta_path = write_meta(out_path, {"features": features, "n_samples": int(len(X)), "region": region})
         print(f"Saved model to {out_path}")
         print(f"Saved metadata to {meta_path}")
         print("Note: Add more dive logs with visibility measurements to improve model accuracy.")
@@ -108,10 +333,9 @@ def train(data_path: str, out_path: str, region: Optional[str] = None, features:
     rmse = float(np.sqrt(mse))
     r2 = r2_score(y_test, preds)
 
-    joblib.dump(pipeline, out_path)
-    meta_path = os.path.splitext(out_path)[0] + ".meta.json"
-    with open(meta_path, "w", encoding="utf-8") as fh:
-        json.dump({"features": features, "n_samples": int(len(X)), "region": region, "rmse": rmse, "r2": r2}, fh, indent=2)
+    save_pipeline(pipeline, out_path)
+    export_compiled(pipeline, out_path)
+    meta_path = write_meta(out_path, {"features": features, "n_samples": int(len(X)), "region": region, "rmse": rmse, "r2": r2})
 
     print(f"Saved model to {out_path}")
     print(f"Saved metadata to {meta_path}")
@@ -124,6 +348,10 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--out", default="model/visibility_model.pkl", help="Output path for the trained model (pkl)")
     p.add_argument("--region", default=None, help="Optional region filter (e.g., UK)")
     p.add_argument("--features", default=None, help="Comma-separated feature names to use (overrides defaults)")
+    p.add_argument("--search", action="store_true", help="Cross-validated hyperparameter search; saves the best model")
+    p.add_argument("--grid", default=None, help="Search grid as JSON or a path to a JSON file (default: DEFAULT_SEARCH_GRID)")
+    p.add_argument("--folds", type=int, default=5, help="Cross-validation folds for --search")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes for --search (default: all cores)")
     return p.parse_args()
 
 
@@ -138,4 +366,7 @@ if __name__ == "__main__":
         out_path = f"model/{str(args.region).lower()}_visibility_model.pkl"
         print(f"Auto-adjusting output path for region '{args.region}': {out_path}")
 
-    train(args.data, out_path, args.region, features)
\ No newline at end of file
+    if args.search:
+        train_search(args.data, out_path, args.region, features, load_grid(args.grid), args.folds, args.workers)
+    else:
+        train(args.data, out_path, args.region, features)
\ No newline at end of file
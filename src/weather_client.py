@@ -1,8 +1,13 @@
 import os
 import typing as t
-import requests
+try:
+    from . import features, http_client
+except ImportError:
+    import features
+    import http_client
 
-KNOT_TO_MS = 0.514444
+KNOT_TO_MS = features.KNOT_TO_MS
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
 
 Proxies = t.Dict[str, str]
 
@@ -47,8 +52,8 @@ def get_current_weather(lat: float, lon: float, timeout: int = 15) -> dict:
     # Bypass proxy - use empty dict to force direct connection
     proxies = {}
     verify = _get_verify()
-    r = requests.get(
-        "https://api.open-meteo.com/v1/forecast",
+    r = http_client.get(
+        OPEN_METEO_URL,
         params=params,
         timeout=timeout,
         proxies=proxies,
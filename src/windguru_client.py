@@ -1,9 +1,13 @@
 import os
 import typing as t
 
-import requests
+try:
+    from . import features, http_client
+except ImportError:
+    import features
+    import http_client
 
-KNOT_TO_MS = 0.514444
+KNOT_TO_MS = features.KNOT_TO_MS
 
 Proxies = t.Dict[str, str]
 
@@ -26,7 +30,7 @@ def fetch_windguru_json(url: str, timeout: int = 15) -> dict:
     Corporate environments can set SSL_CERT_FILE/REQUESTS_CA_BUNDLE and HTTP(S)_PROXY.
     """
     proxies = _get_proxies()
-    resp = requests.get(url, timeout=timeout, proxies=proxies)
+    resp = http_client.get(url, timeout=timeout, proxies=proxies)
     resp.raise_for_status()
     return resp.json()
 
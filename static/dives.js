@@ -1,105 +1,161 @@
 // --- Dive map and table ---
-async function fetchAndRenderDives(map) {
+const DIVES_PAGE_SIZE = 500;
+
+// Dives in the visible map area, one GET /dives page at a time; the browser
+// revalidates each page with If-None-Match, so an unchanged log is answered
+// with 304s. More pages are fetched from the "Load more" button.
+const diveView = { map: null, cursor: null, dives: [], generation: 0 };
+
+function diveQuery(cursor) {
+  const params = new URLSearchParams({ limit: DIVES_PAGE_SIZE });
+  if (diveView.map) {
+    const b = diveView.map.getBounds();
+    const lon = (v) => Math.min(Math.max(v, -180), 180);
+    params.set('bbox', [lon(b.getWest()), b.getSouth(), lon(b.getEast()), b.getNorth()].map((v) => v.toFixed(6)).join(','));
+  }
+  if (cursor) params.set('cursor', cursor);
+  return '/dives?' + params.toString();
+}
+
+function diveRow(d) {
+  const tr = document.createElement('tr');
+  const date = d.date ? d.date.split('T')[0] : '';
+  tr.innerHTML = `<td>${date}</td><td>${d.lat.toFixed(4)}</td><td>${d.lon.toFixed(4)}</td><td>${d.depth===undefined||d.depth===null? '': d.depth}</td><td>${d.breath_hold_time===undefined||d.breath_hold_time===null? '': d.breath_hold_time}</td><td>${d.tide_height===undefined||d.tide_height===null? '': d.tide_height}</td><td>${d.visibility===undefined||d.visibility===null? '': d.visibility}</td><td>${d.water_temp===undefined||d.water_temp===null? '': d.water_temp}</td><td>${d.outside_temp===undefined||d.outside_temp===null? '': d.outside_temp}</td><td>${(d.notes||'').replace(/</g,'&lt;')}</td><td><button class="edit-dive-btn" data-dive-id="${d.id}">Edit</button></td>`;
+  return tr;
+}
+
+function addDiveMarker(d) {
+  const map = diveView.map;
+  if (!map || typeof L === 'undefined') return;
   try {
-    const r = await fetch('/dives');
-    const dives = await r.json();
-    const tbody = document.querySelector('#dives-table tbody');
-    const statusEl = document.getElementById('dive-status');
-    tbody.innerHTML = '';
-    if (!Array.isArray(dives)) {
+    const date = d.date ? d.date.split('T')[0] : '';
+    const popupText = `<strong>${date}</strong><br>Depth: ${d.depth||'N/A'}m<br>Breath hold: ${d.breath_hold_time||'N/A'}s<br>Tide: ${d.tide_height||'N/A'}m<br>Visibility: ${d.visibility||'N/A'}m<br>Water temp: ${d.water_temp||'N/A'}°C<br>Air temp: ${d.outside_temp||'N/A'}°C<br>${(d.notes||'').replace(/</g,'&lt;')}`;
+    const m = L.marker([d.lat, d.lon]).bindPopup(popupText);
+    if (window._diveMarkerLayer && typeof window._diveMarkerLayer.addLayer === 'function') {
+      window._diveMarkerLayer.addLayer(m);
+    } else {
+      m.addTo(map);
+    }
+  } catch (e) {}
+}
+
+function updateDiveStatus() {
+  const statusEl = document.getElementById('dive-status');
+  const more = document.getElementById('dives-more');
+  if (more) more.style.display = diveView.cursor ? '' : 'none';
+  if (!statusEl) return;
+  const n = diveView.dives.length;
+  if (n === 0) {
+    statusEl.textContent = 'No dives in this area.';
+  } else {
+    statusEl.textContent = `Showing ${n} dive(s) in this area` + (diveView.cursor ? ' (more available)' : '');
+  }
+}
+
+// Fetches one page and appends it to the table and the map. With `reset`
+// the view starts over from the first page (after a move or an edit).
+async function loadDivePage(reset) {
+  const tbody = document.querySelector('#dives-table tbody');
+  const statusEl = document.getElementById('dive-status');
+  if (reset) {
+    diveView.generation += 1;
+    diveView.cursor = null;
+  } else if (!diveView.cursor) {
+    return;
+  }
+  const generation = diveView.generation;
+  if (statusEl) statusEl.textContent = 'Loading dives...';
+  try {
+    const r = await fetch(diveQuery(reset ? null : diveView.cursor));
+    const page = await r.json();
+    // A newer reload started while this page was in flight
+    if (generation !== diveView.generation) return;
+    if (!page || !Array.isArray(page.dives)) {
       if (statusEl) statusEl.textContent = 'Unexpected response from /dives';
       return;
     }
-    if (dives.length === 0) {
-      if (statusEl) statusEl.textContent = 'No dives recorded yet.';
-      tbody.innerHTML = '<tr><td colspan="11" style="text-align:center; padding:2rem;"><div class="empty-state"><div class="empty-state-icon">🤿</div><div>No dives logged yet. Click on the map to add your first dive!</div></div></td></tr>';
-    } else {
-      if (statusEl) statusEl.textContent = `Loaded ${dives.length} dive(s)`;
+    if (reset) {
+      diveView.dives = [];
+      tbody.innerHTML = '';
+      if (window._diveMarkerLayer && typeof window._diveMarkerLayer.clearLayers === 'function') {
+        window._diveMarkerLayer.clearLayers();
+      }
     }
+    diveView.dives.push(...page.dives);
+    diveView.cursor = page.next_cursor;
 
-    // If we have a Leaflet marker layer, clear it
-    if (map && window._diveMarkerLayer && typeof window._diveMarkerLayer.clearLayers === 'function') {
-      window._diveMarkerLayer.clearLayers();
+    if (diveView.dives.length === 0) {
+      tbody.innerHTML = '<tr><td colspan="11" style="text-align:center; padding:2rem;"><div class="empty-state"><div class="empty-state-icon">🤿</div><div>No dives logged here yet. Click on the map to add a dive!</div></div></td></tr>';
     }
-
-    for (const d of dives.slice().reverse()) {
-      const tr = document.createElement('tr');
-      const date = d.date ? d.date.split('T')[0] : '';
-      tr.innerHTML = `<td>${date}</td><td>${d.lat.toFixed(4)}</td><td>${d.lon.toFixed(4)}</td><td>${d.depth===undefined||d.depth===null? '': d.depth}</td><td>${d.breath_hold_time===undefined||d.breath_hold_time===null? '': d.breath_hold_time}</td><td>${d.tide_height===undefined||d.tide_height===null? '': d.tide_height}</td><td>${d.visibility===undefined||d.visibility===null? '': d.visibility}</td><td>${d.water_temp===undefined||d.water_temp===null? '': d.water_temp}</td><td>${d.outside_temp===undefined||d.outside_temp===null? '': d.outside_temp}</td><td>${(d.notes||'').replace(/</g,'&lt;')}</td><td><button class="edit-dive-btn" data-dive-id="${d.id}">Edit</button></td>`;
-      tbody.appendChild(tr);
-      if (map && typeof L !== 'undefined') {
-        try {
-          const popupText = `<strong>${date}</strong><br>Depth: ${d.depth||'N/A'}m<br>Breath hold: ${d.breath_hold_time||'N/A'}s<br>Tide: ${d.tide_height||'N/A'}m<br>Visibility: ${d.visibility||'N/A'}m<br>Water temp: ${d.water_temp||'N/A'}°C<br>Air temp: ${d.outside_temp||'N/A'}°C<br>${(d.notes||'')}`;
-          const m = L.marker([d.lat, d.lon]).bindPopup(popupText);
-          if (window._diveMarkerLayer && typeof window._diveMarkerLayer.addLayer === 'function') {
-            window._diveMarkerLayer.addLayer(m);
-          } else {
-            m.addTo(map);
-          }
-        } catch (e) {}
-      }
+    // Build rows off-DOM and attach them in one go
+    const rows = document.createDocumentFragment();
+    for (const d of page.dives) {
+      rows.appendChild(diveRow(d));
+      addDiveMarker(d);
     }
-    
-    // Add event listeners to edit buttons
-    document.querySelectorAll('.edit-dive-btn').forEach(btn => {
-      btn.addEventListener('click', async (e) => {
-        const diveId = e.target.getAttribute('data-dive-id');
-        const dive = dives.find(d => d.id === diveId);
-        if (!dive) return;
-        
-        const date = prompt('Date (YYYY-MM-DD)', dive.date ? dive.date.split('T')[0] : '');
-        if (date === null) return;
-        const depth = prompt('Depth (m)', dive.depth || '');
-        if (depth === null) return;
-        const breathHold = prompt('Breath hold (s)', dive.breath_hold_time || '');
-        if (breathHold === null) return;
-        const tideHeight = prompt('Tide height (m)', dive.tide_height || '');
-        if (tideHeight === null) return;
-        const visibility = prompt('Visibility (m)', dive.visibility || '');
-        if (visibility === null) return;
-        const waterTemp = prompt('Water temperature (°C)', dive.water_temp || '');
-        if (waterTemp === null) return;
-        const outsideTemp = prompt('Air temperature (°C)', dive.outside_temp || '');
-        if (outsideTemp === null) return;
-        const notes = prompt('Notes', dive.notes || '');
-        if (notes === null) return;
-        
-        const payload = {
-          date: date || undefined,
-          depth: depth || undefined,
-          breath_hold_time: breathHold || undefined,
-          tide_height: tideHeight || undefined,
-          visibility: visibility || undefined,
-          water_temp: waterTemp || undefined,
-          outside_temp: outsideTemp || undefined,
-          notes: notes || undefined
-        };
-        
-        try {
-          const r = await fetch(`/dives/${diveId}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload)
-          });
-          if (r.ok) {
-            await fetchAndRenderDives(map);
-            alert('Dive updated successfully! 🎉');
-          } else {
-            const j = await r.json();
-            alert('Failed to update dive: ' + (j.error || JSON.stringify(j)));
-          }
-        } catch (err) {
-          alert('Request failed: ' + err);
-        }
-      });
-    });
+    tbody.appendChild(rows);
+    updateDiveStatus();
   } catch (err) {
     console.warn('Failed to load dives', err);
-    const statusEl = document.getElementById('dive-status');
     if (statusEl) statusEl.textContent = 'Failed to load dives: ' + err;
   }
 }
 
+async function fetchAndRenderDives(map) {
+  if (map) diveView.map = map;
+  await loadDivePage(true);
+}
+
+async function editDive(diveId) {
+  const dive = diveView.dives.find(d => d.id === diveId);
+  if (!dive) return;
+
+  const date = prompt('Date (YYYY-MM-DD)', dive.date ? dive.date.split('T')[0] : '');
+  if (date === null) return;
+  const depth = prompt('Depth (m)', dive.depth || '');
+  if (depth === null) return;
+  const breathHold = prompt('Breath hold (s)', dive.breath_hold_time || '');
+  if (breathHold === null) return;
+  const tideHeight = prompt('Tide height (m)', dive.tide_height || '');
+  if (tideHeight === null) return;
+  const visibility = prompt('Visibility (m)', dive.visibility || '');
+  if (visibility === null) return;
+  const waterTemp = prompt('Water temperature (°C)', dive.water_temp || '');
+  if (waterTemp === null) return;
+  const outsideTemp = prompt('Air temperature (°C)', dive.outside_temp || '');
+  if (outsideTemp === null) return;
+  const notes = prompt('Notes', dive.notes || '');
+  if (notes === null) return;
+
+  const payload = {
+    date: date || undefined,
+    depth: depth || undefined,
+    breath_hold_time: breathHold || undefined,
+    tide_height: tideHeight || undefined,
+    visibility: visibility || undefined,
+    water_temp: waterTemp || undefined,
+    outside_temp: outsideTemp || undefined,
+    notes: notes || undefined
+  };
+
+  try {
+    const r = await fetch(`/dives/${diveId}`, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(payload)
+    });
+    if (r.ok) {
+      await fetchAndRenderDives();
+      alert('Dive updated successfully! 🎉');
+    } else {
+      const j = await r.json();
+      alert('Failed to update dive: ' + (j.error || JSON.stringify(j)));
+    }
+  } catch (err) {
+    alert('Request failed: ' + err);
+  }
+}
+
 function initDiveMap() {
   if (typeof L === 'undefined') return null;
   const mapEl = document.getElementById('dive-map');
@@ -118,8 +174,9 @@ function initDiveMap() {
 
   if (statusEl) statusEl.textContent = 'Map initialized. Click to add dives.';
 
-  // Load and render existing dives
+  // Load the dives in view, and again whenever the map is moved or zoomed
   fetchAndRenderDives(map);
+  map.on('moveend', () => loadDivePage(true));
 
   map.on('click', async (ev) => {
     const lat = ev.latlng.lat;
@@ -157,10 +214,6 @@ function initDiveMap() {
         method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload)
       });
       if (r.status === 201) {
-        // re-render
-        if (window._diveMarkerLayer && typeof window._diveMarkerLayer.clearLayers === 'function') {
-          window._diveMarkerLayer.clearLayers();
-        }
         await fetchAndRenderDives(map);
         alert('Dive saved successfully! 🎉');
       } else {
@@ -176,6 +229,15 @@ function initDiveMap() {
 }
 
 document.addEventListener('DOMContentLoaded', () => {
+  const tbody = document.querySelector('#dives-table tbody');
+  if (tbody) {
+    tbody.addEventListener('click', (e) => {
+      const btn = e.target.closest('.edit-dive-btn');
+      if (btn) editDive(btn.getAttribute('data-dive-id'));
+    });
+  }
+  const more = document.getElementById('dives-more');
+  if (more) more.addEventListener('click', () => loadDivePage(false));
   try {
     window._diveMap = initDiveMap();
   } catch (e) {
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app modules are flat files in src/ (run as `python src/app.py`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import compiled_model
+import train_model
+
+
+def _fitted(estimator):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, len(train_model.DEFAULT_FEATURES)))
+    y = 2 * X[:, 0] - X[:, 2] + rng.normal(scale=0.3, size=len(X))
+    # Missing values at fit time give the imputer medians to learn
+    X[rng.random(X.shape) < 0.05] = np.nan
+    pipeline = train_model.build_pipeline(estimator, n_estimators=25, max_depth=8, n_jobs=1)
+    return pipeline.fit(X, y)
+
+
+def _inputs(n_rows):
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(n_rows, len(train_model.DEFAULT_FEATURES)))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    return X
+
+
+@pytest.mark.parametrize("estimator", sorted(train_model.ESTIMATORS))
+def test_batch_matches_sklearn(estimator):
+    pipeline = _fitted(estimator)
+    X = _inputs(200)
+
+    compiled = compiled_model.CompiledForest.from_pipeline(pipeline)
+
+    assert len(X) > compiled.SCALAR_ROWS
+    np.testing.assert_array_equal(compiled.predict(X), pipeline.predict(X))
+
+
+@pytest.mark.parametrize("estimator", sorted(train_model.ESTIMATORS))
+def test_scalar_rows_match_sklearn(estimator):
+    pipeline = _fitted(estimator)
+    compiled = compiled_model.CompiledForest.from_pipeline(pipeline)
+
+    for row in _inputs(20):
+        np.testing.assert_array_equal(compiled.predict(row), pipeline.predict(row.reshape(1, -1)))
+    X = _inputs(compiled.SCALAR_ROWS)
+    np.testing.assert_array_equal(compiled.predict(X), pipeline.predict(X))
+
+
+def test_all_nan_row_uses_imputed_medians():
+    pipeline = _fitted("random_forest")
+    compiled = compiled_model.CompiledForest.from_pipeline(pipeline)
+    row = np.full((1, len(train_model.DEFAULT_FEATURES)), np.nan)
+
+    np.testing.assert_array_equal(compiled.predict(row), pipeline.predict(row))
+
+
+def test_saved_model_matches_sklearn(tmp_path):
+    pipeline = _fitted("extra_trees")
+    path = str(tmp_path / "model.compiled.npz")
+    compiled_model.save_compiled(compiled_model.compile_pipeline(pipeline), path)
+    X = _inputs(50)
+
+    np.testing.assert_array_equal(compiled_model.CompiledForest.load(path).predict(X), pipeline.predict(X))
+
+
+def test_wrong_feature_count_is_rejected():
+    compiled = compiled_model.CompiledForest.from_pipeline(_fitted("random_forest"))
+
+    with pytest.raises(ValueError):
+        compiled.predict(np.zeros((2, 3)))
@@ -0,0 +1,115 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def flask_app(tmp_path_factory):
+    root = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("VISIBILITY_DB_PATH", str(root / "import.db"))
+        mp.setenv("BACKGROUND_JOBS", "false")
+        mp.setenv("HEATMAP_DIR", str(root / "heatmap"))
+        # app.py opens a legacy sqlite file relative to the working directory
+        mp.chdir(root)
+        import app
+    return app.app
+
+
+@pytest.fixture
+def client(flask_app, tmp_path, monkeypatch):
+    import database_client
+
+    database_client.close_pool()
+    monkeypatch.setattr(database_client, "DB_PATH", str(tmp_path / "visibility.db"))
+    monkeypatch.setattr(database_client, "_initialized", False)
+    yield flask_app.test_client()
+    database_client.close_pool()
+
+
+def _add_dives(client, n, **fields):
+    ids = []
+    for i in range(n):
+        payload = {"lat": 49.2 + i * 0.001, "lon": -2.1, "date": f"2024-05-{1 + i % 28:02d}T10:00:00", **fields}
+        r = client.post("/dives", json=payload)
+        assert r.status_code == 201
+        ids.append(r.get_json()["id"])
+    return ids
+
+
+def test_cursor_pages_cover_every_dive_once(client):
+    ids = _add_dives(client, 7)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        query = "/dives?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(query).get_json()
+        seen += [d["id"] for d in page["dives"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == ids
+    assert pages == 3
+
+
+def test_unpaged_request_returns_a_plain_array(client):
+    ids = _add_dives(client, 2)
+
+    body = client.get("/dives").get_json()
+
+    assert [d["id"] for d in body] == ids
+
+
+def test_etag_revalidates_until_the_log_changes(client):
+    _add_dives(client, 2)
+
+    first = client.get("/dives?limit=10")
+    etag = first.headers["ETag"]
+    again = client.get("/dives?limit=10", headers={"If-None-Match": etag})
+
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.data == b""
+
+    _add_dives(client, 1)
+    changed = client.get("/dives?limit=10", headers={"If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.get_json()["dives"]) == 3
+
+
+def test_etag_changes_on_update_and_differs_per_query(client):
+    (dive_id,) = _add_dives(client, 1)
+    etag = client.get("/dives?limit=10").headers["ETag"]
+
+    assert client.get("/dives?limit=5").headers["ETag"] != etag
+
+    assert client.put(f"/dives/{dive_id}", json={"notes": "edited"}).status_code == 200
+    assert client.get("/dives?limit=10", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_changes_when_sites_change(client):
+    import database_client
+
+    _add_dives(client, 1)
+    etag = client.get("/dives?limit=10").headers["ETag"]
+
+    database_client.add_sites([("Test Reef", 49.2, -2.1)])
+
+    assert client.get("/dives?limit=10", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_filters_apply_to_pages(client):
+    _add_dives(client, 4, visibility="3")
+    _add_dives(client, 2, visibility="12")
+
+    page = client.get("/dives?limit=10&min_visibility=10").get_json()
+
+    assert [float(d["visibility"]) for d in page["dives"]] == [12.0, 12.0]
+    assert page["next_cursor"] is None
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/dives?limit=2&cursor=abc").status_code == 400
+
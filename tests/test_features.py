@@ -0,0 +1,53 @@
+import numpy as np
+
+import features
+
+
+def test_manual_row_matrix():
+    columns = features.manual_columns([{
+        "swell_height": "1.5",
+        "swell_period": 9,
+        "wind_speed": 20,  # knots
+        "wind_dir": 270,
+        "tide_height": -0.4,
+    }])
+    X, errors = features.build_matrix(columns, 1)
+
+    wind_ms = 20 * features.KNOT_TO_MS
+    turbidity = 1.0 + 0.15 * (wind_ms - 5.0) + 0.5
+    expected = [1.5, 9.0, wind_ms, 270.0, -0.4, turbidity, 0.5]
+    assert errors == [None]
+    np.testing.assert_allclose(X[0], expected)
+
+
+def test_stormglass_hour_matrix():
+    hour = {
+        "swellHeight": {"sg": 0.8},
+        "swellPeriod": {"sg": 11.0},
+        "windSpeed": {"sg": 4.0},
+        "windDirection": {"sg": 90.0},
+        "seaLevel": {"sg": 0.3},
+    }
+    X, errors = features.build_matrix(features.stormglass_columns([hour]), 1)
+
+    assert errors == [None]
+    np.testing.assert_allclose(X[0], [0.8, 11.0, 4.0, 90.0, 0.3, 1.0, 0.5])
+
+
+def test_blank_value_is_missing_not_the_previous_row():
+    rows = [
+        {"swell_height": 2.0, "swell_period": 8, "wind_speed": 10, "tide_height": 0.0, "wind_dir": 45},
+        {"swell_height": 2.0, "swell_period": 8, "wind_speed": 10, "tide_height": 0.0, "wind_dir": ""},
+    ]
+    X, errors = features.build_matrix(features.manual_columns(rows), 2)
+
+    wind_dir = features.FEATURES.index("wind_dir")
+    assert errors == [None, None]
+    assert X[1, wind_dir] == features.DEFAULTS["wind_dir"]
+
+
+def test_missing_and_invalid_values_are_reported():
+    rows = [{"swell_height": "abc", "swell_period": 8, "wind_speed": 10}]
+    _, errors = features.build_matrix(features.manual_columns(rows), 1)
+
+    assert errors == ["invalid swell_height, missing tide_height"]
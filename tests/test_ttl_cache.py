@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from ttl_cache import TTLCache
+
+
+def _run_concurrently(n, target):
+    barrier = threading.Barrier(n)
+    results, errors = [None] * n, [None] * n
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    return results, errors
+
+
+def test_concurrent_misses_call_the_loader_once():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"hours": [1, 2, 3]}
+
+    results, errors = _run_concurrently(8, lambda: cache.get_or_load("k", loader))
+
+    assert errors == [None] * 8
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert cache.misses == 1 and cache.coalesced == 7
+    assert cache.get_or_load("k", loader) is results[0]
+    assert cache.hits == 1
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    results, errors = _run_concurrently(4, lambda: cache.get_or_load("k", failing))
+
+    assert len(calls) == 1
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: "ok") == "ok"
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(ttl=0.05)
+    cache.set("k", 1)
+    assert cache.get("k") == 1
+
+    time.sleep(0.1)
+
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: 2) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_other_keys_do_not_wait_for_a_slow_loader():
+    cache = TTLCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    t = threading.Thread(target=cache.get_or_load, args=("slow", slow))
+    t.start()
+    assert started.wait(5)
+    try:
+        assert cache.get_or_load("fast", lambda: "fast") == "fast"
+    finally:
+        release.set()
+        t.join()
+    assert cache.get("slow") == "slow"
+
+
+@pytest.mark.parametrize("n", [1, 16])
+def test_cached_value_is_returned_without_loading(n):
+    cache = TTLCache(ttl=60)
+    cache.set("k", "cached")
+
+    def loader():
+        raise AssertionError("loader called for a cached key")
+
+    results, errors = _run_concurrently(n, lambda: cache.get_or_load("k", loader))
+
+    assert errors == [None] * n
+    assert results == ["cached"] * n